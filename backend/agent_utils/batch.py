@@ -0,0 +1,107 @@
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Any, Awaitable, Callable, Optional
+
+from redis_utils.redis_stream import publish_message
+
+from .job_context import current_batch_id
+
+logger = logging.getLogger(__name__)
+
+
+def batch_stream_id(batch_id: str) -> str:
+    """Stream carrying a batch's progress events, served by /api/events like a job stream."""
+    return f"batch-{batch_id}"
+
+
+class StageMemo:
+    """
+    Results of identical agent calls shared by the jobs of one batch. The first job to ask computes the result;
+    jobs asking for the same key meanwhile wait for it instead of calling the agent again. A failed or empty
+    result is not shared: waiting jobs then compute their own.
+
+    The agent's intermediate events only reach the stream of the job that ran it; `on_shared` is called with that
+    job's ID whenever a result is reused, so the reusing job can tell its own clients where the result came from.
+    """
+
+    def __init__(self):
+        self._results: dict[str, asyncio.Future] = {}
+        self._owners: dict[str, Optional[str]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(kind: str, parts: Any) -> str:
+        digest = hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        return f"{kind}:{digest}"
+
+    async def run(
+        self,
+        kind: str,
+        parts: Any,
+        fn: Callable[[], Awaitable[Any]],
+        owner: Optional[str] = None,
+        on_shared: Optional[Callable[[Optional[str]], Awaitable[None]]] = None,
+    ) -> Any:
+        key = self.key(kind, parts)
+        shared = self._results.get(key)
+        if shared is not None:
+            result = await asyncio.shield(shared)
+            if result is not None:
+                self.hits += 1
+                if on_shared is not None:
+                    await on_shared(self._owners.get(key))
+                return result
+            return await fn()
+        self.misses += 1
+        self._owners[key] = owner
+        shared = self._results[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await fn()
+        except BaseException:
+            self._results.pop(key, None)
+            self._owners.pop(key, None)
+            shared.set_result(None)
+            raise
+        if result is None:
+            self._results.pop(key, None)
+            self._owners.pop(key, None)
+        shared.set_result(result)
+        return result
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+_memos: dict[str, StageMemo] = {}
+
+
+def get_stage_memo(batch_id: str) -> StageMemo:
+    memo = _memos.get(batch_id)
+    if memo is None:
+        memo = _memos[batch_id] = StageMemo()
+    return memo
+
+
+def forget_batch(batch_id: str) -> Optional[StageMemo]:
+    return _memos.pop(batch_id, None)
+
+
+async def memoized(kind: str, parts: Any, fn: Callable[[], Awaitable[Any]], stream_id: Optional[str] = None) -> Any:
+    """
+    Run `fn`, sharing its result with identical calls of the same batch; outside a batch just run it.
+    When `stream_id` gets a result computed for another job, a "shared" event naming that job is published to it.
+    """
+    batch_id = current_batch_id.get()
+    if batch_id is None:
+        return await fn()
+
+    async def announce(owner: Optional[str]) -> None:
+        data = json.dumps({"stage": kind, "sharedFrom": owner})
+        await publish_message(stream_id, f"Reusing the {kind} result of job {owner}", event="shared", data=data)
+
+    return await get_stage_memo(batch_id).run(
+        kind, parts, fn, owner=stream_id, on_shared=announce if stream_id is not None else None
+    )
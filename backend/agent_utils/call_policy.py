@@ -0,0 +1,185 @@
+import asyncio
+import logging
+import os
+import random
+from dataclasses import dataclass, replace
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from google.genai import errors as genai_errors
+
+from redis_utils.job_state import JobCancelledError
+from .metrics import RouteMetrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+@dataclass(frozen=True)
+class AgentCallPolicy:
+    timeout: float = 180.0      # seconds per attempt
+    retries: int = 2            # extra attempts after a transient error
+    backoff_base: float = 1.0
+    backoff_max: float = 20.0
+    hedge: bool = False         # start a duplicate attempt once the agent's p95 latency has passed
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+DEFAULT_POLICY = AgentCallPolicy(
+    timeout=_env_float("AGENT_TIMEOUT_SECONDS", 180),
+    retries=int(os.getenv("AGENT_MAX_RETRIES", "2")),
+    hedge=os.getenv("AGENT_HEDGING", "false").lower() in ("1", "true", "yes"),
+)
+
+# Default timeouts per agent; AGENT_TIMEOUT_<AGENT NAME> overrides them
+AGENT_TIMEOUTS = {
+    "JobInterpreterAgent": 60,
+    "SimpleDeckArchitectAgent": 120,
+    "data_analyst_agent_light": 120,
+    "data_analyst_agent": 240,
+}
+
+
+def policy_for(agent_name: str) -> AgentCallPolicy:
+    default = AGENT_TIMEOUTS.get(agent_name, DEFAULT_POLICY.timeout)
+    return replace(DEFAULT_POLICY, timeout=_env_float(f"AGENT_TIMEOUT_{agent_name.upper()}", default))
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Errors worth retrying: timeouts, dropped connections, rate limits and 5xx responses."""
+    if isinstance(exc, JobCancelledError):
+        return False
+    if isinstance(exc, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    if isinstance(exc, genai_errors.APIError):
+        return exc.code in TRANSIENT_STATUS_CODES
+    return False
+
+
+def backoff_delay(attempt: int, policy: AgentCallPolicy) -> float:
+    # Exponential backoff with full jitter
+    return random.uniform(0, min(policy.backoff_max, policy.backoff_base * 2 ** attempt))
+
+
+class HedgeBudget:
+    """
+    Caps duplicate (hedged) attempts at `ratio` of all agent calls, and counts which attempt won.
+    """
+
+    def __init__(self, ratio: float):
+        self.ratio = ratio
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.primary_wins = 0
+        self.denied = 0
+
+    def note_call(self) -> None:
+        self.calls += 1
+
+    def try_spend(self) -> bool:
+        if self.hedges + 1 > self.ratio * self.calls:
+            self.denied += 1
+            return False
+        self.hedges += 1
+        return True
+
+    def record_winner(self, hedge_won: bool) -> None:
+        if hedge_won:
+            self.hedge_wins += 1
+        else:
+            self.primary_wins += 1
+
+    def snapshot(self) -> dict:
+        return {
+            "calls": self.calls,
+            "hedges": self.hedges,
+            "hedgeWins": self.hedge_wins,
+            "primaryWins": self.primary_wins,
+            "denied": self.denied,
+            "budget": self.ratio,
+        }
+
+
+# Latency and success of every agent attempt by agent name; their p95 is the hedging delay
+agent_call_metrics = RouteMetrics()
+hedge_budget = HedgeBudget(_env_float("AGENT_HEDGE_BUDGET", 0.1))
+# Samples needed before an agent's p95 is trusted as hedging delay
+HEDGE_MIN_SAMPLES = int(os.getenv("AGENT_HEDGE_MIN_SAMPLES", "20"))
+
+
+async def call_with_policy(
+    name: str,
+    attempt: Callable[[bool], Awaitable[T]],
+    policy: AgentCallPolicy,
+    metrics: RouteMetrics = agent_call_metrics,
+    budget: HedgeBudget = hedge_budget,
+) -> T:
+    """
+    Run `attempt(primary)` with a timeout per attempt, jittered exponential retries on transient errors and,
+    if the policy allows it, a hedged duplicate attempt (primary=False) once the p95 latency has passed.
+    """
+    for retry in range(policy.retries + 1):
+        try:
+            return await _hedged(name, attempt, policy, metrics, budget)
+        except Exception as e:
+            if retry == policy.retries or not is_transient(e):
+                raise
+            delay = backoff_delay(retry, policy)
+            logger.warning(f"Transient error from {name} ({type(e).__name__}: {e}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+async def _timed(name: str, attempt: Callable[[bool], Awaitable[T]], primary: bool, timeout: float, metrics: RouteMetrics) -> T:
+    started = asyncio.get_running_loop().time()
+    try:
+        result = await asyncio.wait_for(attempt(primary), timeout)
+    except asyncio.TimeoutError:
+        metrics.record(name, timeout, success=False)
+        raise TimeoutError(f"{name} did not answer within {timeout:.0f}s")
+    except Exception:
+        metrics.record(name, asyncio.get_running_loop().time() - started, success=False)
+        raise
+    metrics.record(name, asyncio.get_running_loop().time() - started, success=True)
+    return result
+
+
+async def _hedged(
+    name: str,
+    attempt: Callable[[bool], Awaitable[T]],
+    policy: AgentCallPolicy,
+    metrics: RouteMetrics,
+    budget: HedgeBudget,
+) -> T:
+    budget.note_call()
+    hedge_after = metrics.latency_percentile(name, 0.95, HEDGE_MIN_SAMPLES) if policy.hedge else None
+    primary = asyncio.create_task(_timed(name, attempt, True, policy.timeout, metrics))
+    hedge: Optional[asyncio.Task] = None
+    try:
+        if hedge_after is None or hedge_after >= policy.timeout:
+            return await primary
+        done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+        if done or not budget.try_spend():
+            return await primary
+        logger.info(f"{name} slower than its p95 ({hedge_after:.1f}s), starting a hedged request")
+        hedge = asyncio.create_task(_timed(name, attempt, False, policy.timeout, metrics))
+        pending = {primary, hedge}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    budget.record_winner(task is hedge)
+                    return task.result()
+        # Both attempts failed; surface the primary's error
+        return primary.result()
+    finally:
+        losers = [task for task in (primary, hedge) if task is not None and not task.done()]
+        for task in losers:
+            task.cancel()
+        # Let the losing attempt unwind (and close its model stream) before the caller moves on
+        await asyncio.gather(*losers, return_exceptions=True)
@@ -0,0 +1,191 @@
+import logging
+import os
+import re
+import threading
+from decimal import Decimal
+from typing import Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Prompt token budgets per agent (instructions, messages and tool results together); AGENT_CONTEXT_BUDGET_<NAME>
+# overrides them. Far below the model limits: long prompts are slow and costly well before they fail.
+DEFAULT_CONTEXT_BUDGET = int(os.getenv("AGENT_CONTEXT_BUDGET", "32000"))
+AGENT_CONTEXT_BUDGETS = {
+    "JobInterpreterAgent": 16000,
+    "SimpleDeckArchitectAgent": 32000,
+    "data_analyst_agent_light": 32000,
+    "data_analyst_agent": 64000,
+    "format_text_to_xml": 32000,
+}
+# Shares of an agent's budget for the schema doc in its instructions and for the messages and state it is started with
+SCHEMA_SHARE = float(os.getenv("CONTEXT_SCHEMA_SHARE", "0.3"))
+MESSAGE_SHARE = float(os.getenv("CONTEXT_MESSAGE_SHARE", "0.3"))
+# Tokens one SQL tool result may take
+TOOL_RESULT_TOKENS = int(os.getenv("TOOL_RESULT_TOKENS", "4000"))
+# Sections are never cut below this
+MIN_SECTION_TOKENS = 64
+
+# Words, numbers and single punctuation marks: roughly how SentencePiece/BPE tokenizers split XML, SQL and prose
+_PIECE_RE = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Local estimate of the tokens `text` costs: long words and numbers count one token per ~4 characters."""
+    return sum(1 + (len(piece) - 1) // 4 for piece in _PIECE_RE.findall(text))
+
+
+def budget_for(agent_name: str) -> int:
+    default = AGENT_CONTEXT_BUDGETS.get(agent_name, DEFAULT_CONTEXT_BUDGET)
+    return int(os.getenv(f"AGENT_CONTEXT_BUDGET_{agent_name.upper()}", default))
+
+
+class ContextBudgetMetrics:
+    """How often and by how much each agent's prompt sections were trimmed."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._agents: dict[str, dict] = {}
+
+    def record(self, agent: str, section: str, before: int, after: int) -> None:
+        with self._lock:
+            stats = self._agents.setdefault(agent, {"trims": 0, "tokensRemoved": 0, "sections": {}})
+            stats["trims"] += 1
+            stats["tokensRemoved"] += before - after
+            stats["sections"][section] = stats["sections"].get(section, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {agent: {**stats, "sections": dict(stats["sections"])} for agent, stats in self._agents.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._agents.clear()
+
+
+context_budget_metrics = ContextBudgetMetrics()
+
+
+def _record_trim(agent: str, section: str, before: int, after: int) -> None:
+    context_budget_metrics.record(agent, section, before, after)
+    logger.info(f"Trimmed {section} for {agent} from ~{before} to ~{after} tokens to fit its context budget")
+
+
+def trim_text(text: str, max_tokens: int) -> str:
+    """
+    Cut `text` to about `max_tokens`, keeping its beginning and end (on line boundaries where possible) around a
+    marker that says how much was left out.
+    """
+    tokens = estimate_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    chars_per_token = len(text) / tokens
+    target = max_tokens - 20  # the marker
+    while True:
+        keep = max(0, int(target * chars_per_token))
+        head_end = keep * 2 // 3
+        tail_start = len(text) - (keep - head_end)
+        newline = text.rfind("\n", 0, head_end)
+        if newline > head_end // 2:
+            head_end = newline
+        newline = text.find("\n", tail_start)
+        if 0 <= newline < tail_start + (len(text) - tail_start) // 2:
+            tail_start = newline
+        omitted = estimate_tokens(text[head_end:tail_start])
+        trimmed = f"{text[:head_end]}\n[... about {omitted} tokens omitted to fit the context budget ...]\n{text[tail_start:]}"
+        # Token density varies along the text; shrink until the estimate fits
+        over = estimate_tokens(trimmed) - max_tokens
+        if over <= 0 or keep == 0:
+            return trimmed
+        target -= over
+
+
+def fit_sections(
+    sections: dict[str, str], budget: int, agent: str, trimmable: Optional[Iterable[str]] = None
+) -> dict[str, str]:
+    """
+    Fit named prompt sections into `budget` tokens. The largest trimmable section is cut first, and only as far
+    as needed, then the next largest; sections outside `trimmable` (default: all) are kept whole.
+    """
+    sizes = {name: estimate_tokens(text) for name, text in sections.items()}
+    excess = sum(sizes.values()) - budget
+    if excess <= 0:
+        return sections
+    allowed = set(sections if trimmable is None else trimmable)
+    fitted = dict(sections)
+    for name in sorted(sizes, key=sizes.get, reverse=True):
+        if excess <= 0:
+            break
+        if name not in allowed:
+            continue
+        target = max(MIN_SECTION_TOKENS, sizes[name] - excess)
+        if target >= sizes[name]:
+            continue
+        fitted[name] = trim_text(sections[name], target)
+        after = estimate_tokens(fitted[name])
+        excess -= sizes[name] - after
+        _record_trim(agent, name, sizes[name], after)
+    if excess > 0:
+        logger.warning(f"Prompt for {agent} is still ~{excess} tokens over its budget of {budget} after trimming")
+    return fitted
+
+
+def fit_prompt(agent: str, message_parts: list[str], initial_state: dict) -> tuple[list[str], dict]:
+    """
+    Fit the messages and text state an agent is started with into its MESSAGE_SHARE of the budget. A state value
+    that repeats a message (the slide XML is both) is counted once and trimmed like that message.
+    """
+    sections = {f"message[{index}]": part for index, part in enumerate(message_parts)}
+    names = {}
+    for key, value in initial_state.items():
+        if isinstance(value, str):
+            index = next((i for i, part in enumerate(message_parts) if part == value), None)
+            names[key] = f"message[{index}]" if index is not None else f"state.{key}"
+            sections.setdefault(names[key], value)
+    fitted = fit_sections(sections, int(budget_for(agent) * MESSAGE_SHARE), agent)
+    if fitted is sections:
+        return message_parts, initial_state
+    parts = [fitted[f"message[{index}]"] for index in range(len(message_parts))]
+    state = {key: fitted[names[key]] if key in names else value for key, value in initial_state.items()}
+    return parts, state
+
+
+def fit_schema_doc(schema_doc: str, agent: str) -> str:
+    """The data source's schema doc, trimmed to the agent's SCHEMA_SHARE of the budget."""
+    return fit_sections({"schema": schema_doc}, int(budget_for(agent) * SCHEMA_SHARE), agent)["schema"]
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float, Decimal)) and not isinstance(value, bool)
+
+
+def _summarize(records: list[dict], shown: int) -> str:
+    summary = [f"{len(records) - shown} more rows omitted to fit the context budget, {len(records)} rows in total"]
+    for column in records[0]:
+        values = [record[column] for record in records if _is_number(record.get(column))]
+        if values and len(values) == len(records):
+            summary.append(f"{column}: min {min(values)}, max {max(values)}, sum {sum(values)}")
+    summary.append("aggregate or filter in SQL to see the rest")
+    return "[" + "; ".join(summary) + "]"
+
+
+def fit_records(records: list[dict], tool: str, max_tokens: int = TOOL_RESULT_TOKENS) -> str:
+    """
+    A SQL tool result as the agent sees it: the rows as a list of dicts, or, when that exceeds `max_tokens`,
+    the first rows that fit plus a summary of the rest (row count and min/max/sum of numeric columns).
+    """
+    text = str(records)
+    tokens = estimate_tokens(text)
+    if tokens <= max_tokens or not records:
+        return text
+    # Leave room for the summary line
+    remaining = max_tokens - 32 - 8 * len(records[0])
+    shown = 0
+    for record in records:
+        cost = estimate_tokens(str(record)) + 1
+        if cost > remaining:
+            break
+        remaining -= cost
+        shown += 1
+    fitted = f"{records[:shown]} {_summarize(records, shown)}"
+    _record_trim(tool, "result", tokens, estimate_tokens(fitted))
+    return fitted
@@ -0,0 +1,19 @@
+from contextvars import ContextVar
+from typing import Optional
+
+# Job the current task is working for. Set once by the workflow and inherited by agent tool calls,
+# which run in the same task (or in tasks/threads that copy its context).
+current_job_id: ContextVar[Optional[str]] = ContextVar("current_job_id", default=None)
+
+# Slide the current task is building (its SlideId), used to attribute token usage per slide.
+current_slide_id: ContextVar[Optional[str]] = ContextVar("current_slide_id", default=None)
+
+# Name of the data source (see agents.services.datasources) the current job queries.
+current_datasource: ContextVar[Optional[str]] = ContextVar("current_datasource", default=None)
+
+# Tenant and priority class (agent_utils.scheduler.Priority) of the current job, used to schedule its slides.
+current_tenant: ContextVar[Optional[str]] = ContextVar("current_tenant", default=None)
+current_priority: ContextVar[Optional[str]] = ContextVar("current_priority", default=None)
+
+# Batch (POST /api/jobs:batch) the current job belongs to; its jobs share agent results and query caches.
+current_batch_id: ContextVar[Optional[str]] = ContextVar("current_batch_id", default=None)
@@ -0,0 +1,157 @@
+import atexit
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from typing import Callable, Optional, Union
+
+from .job_context import current_job_id, current_slide_id
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "text" for humans, "json" for one structured object per line
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+# Payloads (XML documents, agent events) longer than this are logged as a prefix plus length and hash
+LOG_PAYLOAD_LIMIT = int(os.getenv("LOG_PAYLOAD_LIMIT", "500"))
+# Log whole payloads instead of truncating them; also switchable at runtime via POST /api/logging
+LOG_FULL_PAYLOADS = os.getenv("LOG_FULL_PAYLOADS", "false").lower() in ("1", "true", "yes")
+# Share of records below WARNING kept per logger (prefix), e.g. {"agent_utils.run_ai_agent": 0.1}
+LOG_SAMPLE_RATES: dict[str, float] = json.loads(os.getenv("LOG_SAMPLE_RATES", "{}"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(job_id)s] %(message)s"
+
+
+class Payload:
+    """
+    A large log argument rendered only when the record is written (on the logging thread). Unless full payloads
+    are switched on it is cut to LOG_PAYLOAD_LIMIT characters with its length and hash, so identical documents
+    can still be matched across log lines. `value` may be a callable producing the text, for payloads that are
+    themselves expensive to build (pretty-printed XML).
+    """
+
+    full = LOG_FULL_PAYLOADS
+
+    __slots__ = ("_value", "limit")
+
+    def __init__(self, value: Union[str, Callable[[], str], object], limit: int = LOG_PAYLOAD_LIMIT):
+        self._value = value
+        self.limit = limit
+
+    def __str__(self) -> str:
+        text = self._value() if callable(self._value) else str(self._value)
+        if Payload.full or len(text) <= self.limit:
+            return text
+        digest = hashlib.sha1(text.encode("utf-8", "replace")).hexdigest()[:12]
+        return f"{text[:self.limit]}... [{len(text)} chars, sha1 {digest}]"
+
+
+def payload(value, limit: int = LOG_PAYLOAD_LIMIT) -> Payload:
+    return Payload(value, limit)
+
+
+class ContextFilter(logging.Filter):
+    """Tags records with the job and slide of the coroutine that logged them and samples chatty loggers."""
+
+    def __init__(self, sample_rates: Optional[dict[str, float]] = None):
+        super().__init__()
+        self.sample_rates = sample_rates if sample_rates is not None else LOG_SAMPLE_RATES
+
+    def _rate(self, name: str) -> float:
+        best, rate = -1, 1.0
+        for prefix, value in self.sample_rates.items():
+            if (name == prefix or name.startswith(prefix + ".")) and len(prefix) > best:
+                best, rate = len(prefix), value
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING and self.sample_rates:
+            rate = self._rate(record.name)
+            if rate < 1.0 and random.random() >= rate:
+                return False
+        record.job_id = current_job_id.get() or "-"
+        record.slide_id = current_slide_id.get()
+        return True
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the logging thread without formatting them, so message interpolation and payload rendering
+    happen off the event loop. Arguments must therefore not be mutated after logging. A full queue drops the
+    record rather than blocking the caller.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info and not record.exc_text:
+            # The traceback is rendered now, while its frames are still the ones that failed
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "jobId": getattr(record, "job_id", None),
+        }
+        if getattr(record, "slide_id", None):
+            entry["slideId"] = record.slide_id
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, stream=None) -> None:
+    """
+    Route all logging through a queue to a writer thread. Replaces any handlers already on the root logger.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+    records: queue.Queue = queue.Queue(LOG_QUEUE_SIZE)
+    handler = LazyQueueHandler(records)
+    handler.addFilter(ContextFilter())
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+    _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging() -> None:
+    """Write out queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def set_logging(levels: Optional[dict[str, str]] = None, full_payloads: Optional[bool] = None) -> dict:
+    """Change logger levels and the full-payload switch at runtime; returns the resulting settings."""
+    for name, level in (levels or {}).items():
+        logging.getLogger(name or None).setLevel(level.upper())
+    if full_payloads is not None:
+        Payload.full = full_payloads
+    return {"rootLevel": logging.getLevelName(logging.getLogger().level), "fullPayloads": Payload.full}
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,147 @@
+import asyncio
+import bisect
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+LOOP_MONITOR = os.getenv("LOOP_MONITOR", "true").lower() in ("1", "true", "yes")
+# How often the heartbeat task runs; its lateness is the loop lag
+LOOP_MONITOR_INTERVAL = float(os.getenv("LOOP_MONITOR_INTERVAL", "0.1"))
+# A loop blocked for longer than this gets the blocking call's stack captured
+LOOP_LAG_THRESHOLD = float(os.getenv("LOOP_LAG_THRESHOLD", "0.25"))
+MAX_STALLS = 20
+# Upper bounds of the lag histogram buckets, in seconds
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class LagHistogram:
+    """Cumulative histogram of loop lag samples, in the bucket layout Prometheus uses."""
+
+    def __init__(self, buckets: tuple[float, ...] = LAG_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts = [0] * (len(self.buckets) + 1)
+            self.count = 0
+            self.total = 0.0
+            self.max = 0.0
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            cumulative, buckets = 0, {}
+            for bound, count in zip(self.buckets, self._counts):
+                cumulative += count
+                buckets[str(bound)] = cumulative
+            buckets["+Inf"] = self.count
+            return {
+                "count": self.count,
+                "sum": round(self.total, 6),
+                "max": round(self.max, 6),
+                "buckets": buckets,
+            }
+
+
+class LoopMonitor:
+    """
+    Watches an event loop for blocking calls.
+
+    A heartbeat task sleeps for `interval` and records how late it wakes up as loop lag. A watchdog thread checks
+    the time of the last heartbeat; once the loop has not run it for `threshold` seconds, something is blocking
+    it right now, so the watchdog takes the stack of the loop's thread at that moment and keeps it (one per
+    stall) with how long the stall lasted in the end.
+    """
+
+    def __init__(self, interval: float = LOOP_MONITOR_INTERVAL, threshold: float = LOOP_LAG_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self.lag = LagHistogram()
+        self.stalls: deque[dict] = deque(maxlen=MAX_STALLS)
+        self._last_beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._current_stall: Optional[dict] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        """Start monitoring the running loop; call from a coroutine on that loop."""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join(self.interval * 2)
+            self._watchdog = None
+
+    async def _heartbeat(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self.lag.record(lag)
+            self._last_beat = now
+            stall = self._current_stall
+            if stall is not None:
+                self._current_stall = None
+                stall["lagSeconds"] = round(lag, 3)
+                logger.warning(f"Event loop blocked for {lag:.3f}s in:\n{stall['stack']}")
+
+    def _watch(self) -> None:
+        while not self._stopped.wait(min(self.interval, self.threshold) / 2):
+            blocked = time.monotonic() - self._last_beat - self.interval
+            if blocked > self.threshold and self._current_stall is None:
+                self._capture(blocked)
+
+    def _capture(self, blocked: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+        stall = {
+            "at": time.time(),
+            "blockedAtCapture": round(blocked, 3),
+            "lagSeconds": None,
+            "stack": "".join(traceback.format_stack(frame)),
+        }
+        self.stalls.append(stall)
+        self._current_stall = stall
+
+    def snapshot(self) -> dict:
+        return {
+            "running": self._task is not None,
+            "intervalSeconds": self.interval,
+            "thresholdSeconds": self.threshold,
+            "lag": self.lag.snapshot(),
+            "stalls": list(self.stalls),
+        }
+
+
+loop_monitor = LoopMonitor()
@@ -0,0 +1,65 @@
+import threading
+from collections import deque
+from typing import Optional
+
+
+class RouteMetrics:
+    """
+    In-process latency and outcome counters keyed by route name. Latency percentiles are computed over the
+    last `window` calls of each route.
+    """
+
+    def __init__(self, window: int = 500):
+        self.window = window
+        self._lock = threading.Lock()
+        self._routes: dict[str, dict] = {}
+
+    def record(self, route: str, seconds: float, success: bool, escalated: bool = False) -> None:
+        with self._lock:
+            stats = self._routes.get(route)
+            if stats is None:
+                stats = self._routes[route] = {
+                    "calls": 0, "successes": 0, "escalations": 0, "latencies": deque(maxlen=self.window)
+                }
+            stats["calls"] += 1
+            stats["successes"] += int(success)
+            stats["escalations"] += int(escalated)
+            stats["latencies"].append(seconds)
+
+    def latency_percentile(self, route: str, q: float, min_samples: int = 1) -> Optional[float]:
+        """Latency percentile of a route's recent calls, or None with fewer than `min_samples` calls recorded."""
+        with self._lock:
+            stats = self._routes.get(route)
+            if stats is None or len(stats["latencies"]) < min_samples:
+                return None
+            return _percentile(sorted(stats["latencies"]), q)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {route: self._summary(stats) for route, stats in self._routes.items()}
+
+    @staticmethod
+    def _summary(stats: dict) -> dict:
+        latencies = sorted(stats["latencies"])
+        return {
+            "calls": stats["calls"],
+            "successRate": stats["successes"] / stats["calls"],
+            "escalations": stats["escalations"],
+            "latencyMean": sum(latencies) / len(latencies),
+            "latencyP50": _percentile(latencies, 0.5),
+            "latencyP95": _percentile(latencies, 0.95),
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._routes.clear()
+
+
+def _percentile(ordered: list[float], q: float) -> Optional[float]:
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+# Outcomes of the slide router (template / light / full), used to tune its thresholds
+slide_route_metrics = RouteMetrics()
@@ -0,0 +1,139 @@
+import cProfile
+import json
+import logging
+import marshal
+import pstats
+import time
+import tracemalloc
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from redis_utils.redis_client import redis_binary_client
+
+logger = logging.getLogger(__name__)
+
+PROFILE_TTL_SECONDS = 7 * 24 * 3600
+PROFILE_TOP_FUNCTIONS = 40
+PROFILE_TOP_ALLOCATIONS = 10
+# Frames kept per allocation; more show deeper call paths but make tracing slower
+PROFILE_TRACEBACK_FRAMES = 5
+
+
+def profile_key(job_id: str) -> str:
+    return f"profile:{job_id}"
+
+
+class JobProfiler:
+    """
+    Deterministic profile (cProfile) and allocation tracking (tracemalloc) of one job run.
+
+    cProfile traces the event loop thread, so coroutines of other jobs that run in between show up too: profile
+    a job while the server is otherwise quiet for a clean picture. tracemalloc is process-wide and only switched
+    on while a profiled job runs. One job is profiled at a time; a second flagged job runs unprofiled.
+    """
+
+    _active: Optional["JobProfiler"] = None
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.profile = cProfile.Profile()
+        self.stages: dict[str, dict] = {}
+        self._stage_starts: dict[str, tuple[float, tracemalloc.Snapshot]] = {}
+        self._owns_tracemalloc = False
+        self._started = 0.0
+
+    def start(self) -> bool:
+        if JobProfiler._active is not None:
+            logger.warning(f"Not profiling {self.job_id}: job {JobProfiler._active.job_id} is being profiled")
+            return False
+        JobProfiler._active = self
+        self._owns_tracemalloc = not tracemalloc.is_tracing()
+        if self._owns_tracemalloc:
+            tracemalloc.start(PROFILE_TRACEBACK_FRAMES)
+        tracemalloc.reset_peak()
+        self._started = time.perf_counter()
+        self.profile.enable()
+        return True
+
+    @staticmethod
+    def _snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+
+    def on_stage(self, stage: str, finished: bool) -> None:
+        """Workflow stage listener: a memory snapshot when a stage starts and the difference when it finishes."""
+        # Keep the snapshot work itself out of the profile
+        self.profile.disable()
+        try:
+            if not finished:
+                self._stage_starts[stage] = (time.perf_counter(), self._snapshot())
+                return
+            started, before = self._stage_starts.pop(stage, (self._started, None))
+            current, peak = tracemalloc.get_traced_memory()
+            entry = {"seconds": round(time.perf_counter() - started, 4), "tracedBytes": current, "peakBytes": peak}
+            if before is not None:
+                entry["topAllocations"] = [
+                    {"location": str(stat.traceback[0]), "sizeDiff": stat.size_diff, "countDiff": stat.count_diff}
+                    for stat in self._snapshot().compare_to(before, "lineno")[:PROFILE_TOP_ALLOCATIONS]
+                ]
+            self.stages[stage] = entry
+        finally:
+            self.profile.enable()
+
+    def stop(self) -> tuple[dict, bytes]:
+        """Stop profiling; returns the JSON summary and the raw stats in the format of pstats dump files."""
+        self.profile.disable()
+        _, peak = tracemalloc.get_traced_memory()
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+        JobProfiler._active = None
+        stats = pstats.Stats(self.profile)
+        functions = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+        summary = {
+            "jobId": self.job_id,
+            "seconds": round(time.perf_counter() - self._started, 4),
+            "peakTracedBytes": peak,
+            "stages": self.stages,
+            "topFunctions": [
+                {
+                    "function": f"{file}:{line}({name})",
+                    "calls": calls,
+                    "totalSeconds": round(total, 6),
+                    "cumulativeSeconds": round(cumulative, 6),
+                }
+                for (file, line, name), (_, calls, total, cumulative, _) in functions[:PROFILE_TOP_FUNCTIONS]
+            ],
+        }
+        return summary, marshal.dumps(stats.stats)
+
+
+async def save_profile(job_id: str, summary: dict, stats: bytes) -> None:
+    key = profile_key(job_id)
+    async with redis_binary_client.pipeline(transaction=True) as pipe:
+        pipe.hset(key, mapping={"summary": json.dumps(summary), "pstats": stats})
+        pipe.expire(key, PROFILE_TTL_SECONDS)
+        await pipe.execute()
+
+
+async def load_profile(job_id: str, field: str = "summary") -> Optional[bytes]:
+    """The stored JSON summary ("summary") or pstats file ("pstats") of a profiled job."""
+    return await redis_binary_client.hget(profile_key(job_id), field)
+
+
+@asynccontextmanager
+async def profile_job(job_id: str, enabled: bool) -> AsyncIterator[Optional[JobProfiler]]:
+    """Profile the body when `enabled` and store the result under the job ID; yields the profiler or None."""
+    profiler = JobProfiler(job_id) if enabled else None
+    if profiler is not None and not profiler.start():
+        profiler = None
+    if profiler is None:
+        yield None
+        return
+    try:
+        yield profiler
+    finally:
+        summary, stats = profiler.stop()
+        try:
+            await save_profile(job_id, summary, stats)
+            logger.info(f"Stored profile of {job_id}: {summary['seconds']}s, peak {summary['peakTracedBytes']} bytes traced")
+        except Exception as e:
+            logger.error(f"Failed to store profile of {job_id}: {e}")
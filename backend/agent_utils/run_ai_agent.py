@@ -7,6 +7,12 @@ from google.adk.runners import Runner
 from google.genai import types as genai_types
 from google.adk.agents import BaseAgent
 from redis_utils.redis_stream import publish_message
+from redis_utils.job_state import raise_if_cancelled
+from agent_utils.job_context import current_job_id, current_slide_id
+from agent_utils.log_config import payload
+from agent_utils.context_budget import fit_prompt
+from agent_utils.call_policy import AgentCallPolicy, call_with_policy, policy_for
+from agent_utils.usage import usage_from_metadata, usage_tracker
 
 logger = logging.getLogger(__name__)
 
@@ -16,11 +22,51 @@ async def run_ai_agent(
     initial_state: dict,
     message_parts: list[str],
     app_name: str,
-    output_key: Optional[str] = None
+    output_key: Optional[str] = None,
+    policy: Optional[AgentCallPolicy] = None,
 ):
     """
     Generic wrapper to run a Google ADK agent and return the result.
+
+    Each attempt is bounded by the agent's timeout, transient errors are retried with jittered backoff, and with
+    hedging enabled a slow attempt gets a duplicate whose result is used if it finishes first. The first attempt
+    streams its ADK events live; retries and hedged duplicates hold theirs back and publish them only if their
+    result is the one used, so they do not repeat events on the stream.
     """
+    job_id = current_job_id.get() or subject_id
+    await raise_if_cancelled(job_id)
+    usage_tracker.check_budget(job_id)
+    # Oversized messages and state (slide XML, tool output pasted into prompts) are trimmed to the agent's budget
+    message_parts, initial_state = fit_prompt(agent.name, message_parts, initial_state)
+
+    attempts = 0
+
+    async def attempt(primary: bool):
+        nonlocal attempts
+        attempts += 1
+        events: Optional[list[str]] = None if attempts == 1 else []
+        result = await _run_agent_once(agent, subject_id, initial_state, message_parts, app_name, job_id, events)
+        return result, events
+
+    try:
+        result, events = await call_with_policy(agent.name, attempt, policy or policy_for(agent.name))
+    finally:
+        await usage_tracker.flush(job_id)
+    for event in events or ():
+        await publish_message(job_id=subject_id, message=event)
+    return result
+
+
+async def _run_agent_once(
+    agent: BaseAgent,
+    subject_id: str,
+    initial_state: dict,
+    message_parts: list[str],
+    app_name: str,
+    job_id: str,
+    events: Optional[list[str]] = None,
+):
+    """One attempt of run_ai_agent. Events are published as they arrive, or collected in `events` if given."""
     USER_ID = subject_id
     SESSION_ID = subject_id
 
@@ -41,12 +87,23 @@ async def run_ai_agent(
 
     final_response_to_return = None
     async for event in runner.run_async(user_id=USER_ID, session_id=SESSION_ID, new_message=initial_message):
-        print('print1', event)
-        await publish_message(job_id=subject_id, message=str(event))
+        # Rendered only when debug logging is on for this module
+        logger.debug("ADK event for %s: %s", subject_id, payload(event))
+        if events is None:
+            await publish_message(job_id=subject_id, message=str(event))
+        else:
+            events.append(str(event))
+        function_calls = event.get_function_calls()
+        if event.usage_metadata is not None or function_calls:
+            usage = usage_from_metadata(event.usage_metadata, tool_calls=len(function_calls))
+            usage_tracker.record(job_id, agent.name, current_slide_id.get(), usage)
+        # Cooperative cancellation: stop spending LLM calls once the job is cancelled or over its token budget
+        await raise_if_cancelled(job_id)
+        usage_tracker.check_budget(job_id)
         if event.is_final_response():
             if event.content and event.content.parts:
                 final_response_to_return = event.content.parts[0].text
-                logger.info(f"Final response captured: {final_response_to_return}")
+                logger.info("Final response captured: %s", payload(final_response_to_return))
             elif event.actions and event.actions.escalate:
                 final_response_to_return = f"Agent escalated: {event.error_message or 'No specific message.'}"
                 logger.error(f"Agent escalation captured: {final_response_to_return}")
@@ -0,0 +1,252 @@
+import contextlib
+import logging
+import os
+import pwd
+import queue
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+from dataclasses import dataclass
+from multiprocessing.connection import Connection
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sandbox_worker.py")
+# Account the workers switch to when the backend runs as root
+SANDBOX_USER = os.getenv("SANDBOX_USER", "nobody")
+# Seconds a new worker may take to import numpy/pandas and report ready
+STARTUP_TIMEOUT = 30.0
+
+
+@dataclass
+class SandboxResult:
+    ok: bool
+    stdout: str = ""
+    error: Optional[str] = None
+
+    def __str__(self) -> str:
+        if self.ok:
+            return self.stdout or "Code executed successfully with no output."
+        return f"{self.stdout}\nError: {self.error}" if self.stdout else f"Error: {self.error}"
+
+
+def _sandbox_account() -> tuple[int, int]:
+    if os.geteuid() != 0:
+        return -1, -1
+    try:
+        entry = pwd.getpwnam(SANDBOX_USER)
+        return entry.pw_uid, entry.pw_gid
+    except KeyError:
+        logger.warning(f"Sandbox user {SANDBOX_USER} does not exist, workers keep the backend's user")
+        return -1, -1
+
+
+class _Worker:
+    """
+    A worker interpreter started from scratch with an empty environment, so none of the backend's secrets
+    (API keys, database credentials) are in its memory. It runs in its own scratch directory, which is removed on kill.
+    """
+
+    def __init__(self, uid: int, gid: int):
+        self.scratch = tempfile.mkdtemp(prefix="sandbox-")
+        if uid >= 0:
+            os.chown(self.scratch, uid, gid)
+        parent_sock, child_sock = socket.socketpair()
+        env = {
+            "PATH": "/usr/bin:/bin",
+            "HOME": self.scratch,
+            "TMPDIR": self.scratch,
+            "LANG": "C.UTF-8",
+            "OPENBLAS_NUM_THREADS": "1",
+            "OMP_NUM_THREADS": "1",
+            "MKL_NUM_THREADS": "1",
+        }
+        try:
+            self.process = subprocess.Popen(
+                [sys.executable, "-I", WORKER_SCRIPT, str(child_sock.fileno()), self.scratch, str(uid), str(gid)],
+                pass_fds=(child_sock.fileno(),),
+                env=env,
+                cwd=self.scratch,
+                stdin=subprocess.DEVNULL,
+                start_new_session=True,
+            )
+        except Exception:
+            parent_sock.close()
+            shutil.rmtree(self.scratch, ignore_errors=True)
+            raise
+        finally:
+            child_sock.close()
+        self.conn = Connection(parent_sock.detach())
+        self.runs = 0
+
+    def wait_ready(self, timeout: float) -> dict:
+        if not self.conn.poll(timeout):
+            raise TimeoutError(f"Sandbox worker {self.process.pid} did not start within {timeout}s")
+        return self.conn.recv()
+
+    def is_alive(self) -> bool:
+        return self.process.poll() is None
+
+    def kill(self) -> None:
+        with contextlib.suppress(Exception):
+            self.conn.close()
+        if self.is_alive():
+            self.process.kill()
+        with contextlib.suppress(subprocess.TimeoutExpired):
+            self.process.wait(timeout=1)
+        shutil.rmtree(self.scratch, ignore_errors=True)
+
+    def stop(self) -> None:
+        with contextlib.suppress(Exception):
+            self.conn.send(None)
+        with contextlib.suppress(subprocess.TimeoutExpired):
+            self.process.wait(timeout=1)
+        self.kill()
+
+
+class SandboxPool:
+    """
+    Pool of isolated Python worker processes with numpy/pandas already imported.
+
+    Code is sent over a socket and run with per-call CPU, memory and wall-clock limits.
+    A worker is recycled after `max_runs` executions or after any limit violation; replacements start in the
+    background, and a caller waits at most `acquire_timeout` seconds for an idle worker.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        max_runs: int = 50,
+        cpu_seconds: int = 10,
+        memory_mb: int = 512,
+        timeout: float = 15.0,
+        acquire_timeout: float = 30.0,
+    ):
+        self.size = size
+        self.max_runs = max_runs
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.timeout = timeout
+        self.acquire_timeout = acquire_timeout
+
+        self._uid, self._gid = _sandbox_account()
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._workers: set[_Worker] = set()
+        self._closed = False
+        for _ in range(size):
+            self._idle.put(self._spawn())
+
+    def _spawn(self) -> _Worker:
+        worker = _Worker(self._uid, self._gid)
+        try:
+            isolation = worker.wait_ready(STARTUP_TIMEOUT)
+        except Exception:
+            worker.kill()
+            raise
+        if isolation["network"] != "namespace" or isolation["user"].startswith("root"):
+            logger.warning(
+                f"Sandbox worker {worker.process.pid} is only partly isolated: "
+                f"network {isolation['network']}, user {isolation['user']}"
+            )
+        with self._lock:
+            self._workers.add(worker)
+        return worker
+
+    def _replenish(self) -> None:
+        try:
+            worker = self._spawn()
+        except Exception:
+            logger.exception("Failed to start a replacement sandbox worker")
+            return
+        if self._closed:
+            self._retire(worker)
+        else:
+            self._idle.put(worker)
+
+    def _retire(self, worker: _Worker) -> None:
+        with self._lock:
+            self._workers.discard(worker)
+        worker.kill()
+
+    def _release(self, worker: _Worker, recycle: bool) -> None:
+        if self._closed:
+            self._retire(worker)
+            return
+        if recycle or worker.runs >= self.max_runs or not worker.is_alive():
+            self._retire(worker)
+            # Starting an interpreter takes a moment; do it off the caller's thread
+            threading.Thread(target=self._replenish, name="sandbox-spawn", daemon=True).start()
+            return
+        self._idle.put(worker)
+
+    def run(
+        self,
+        code: str,
+        cpu_seconds: Optional[int] = None,
+        memory_mb: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> SandboxResult:
+        """
+        Execute code in an idle worker and return its captured stdout or error. Blocks the calling thread.
+        """
+        if self._closed:
+            raise RuntimeError("SandboxPool is closed")
+        cpu_seconds = self.cpu_seconds if cpu_seconds is None else cpu_seconds
+        memory_mb = self.memory_mb if memory_mb is None else memory_mb
+        timeout = self.timeout if timeout is None else timeout
+
+        try:
+            worker = self._idle.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            logger.warning(f"No sandbox worker became idle within {self.acquire_timeout}s")
+            return SandboxResult(ok=False, error=f"No sandbox worker available after {self.acquire_timeout} seconds")
+        worker.runs += 1
+        recycle = True
+        try:
+            worker.conn.send((code, cpu_seconds, memory_mb * 1024 * 1024))
+            if not worker.conn.poll(timeout):
+                logger.warning(f"Sandbox worker {worker.process.pid} timed out after {timeout}s, killing it")
+                return SandboxResult(ok=False, error=f"Execution timed out after {timeout} seconds")
+            reply = worker.conn.recv()
+            recycle = reply.get("fatal", False)
+            return SandboxResult(ok=reply["ok"], stdout=reply["stdout"], error=reply["error"])
+        except (EOFError, OSError) as e:
+            logger.warning(f"Sandbox worker {worker.process.pid} died: {e}")
+            return SandboxResult(ok=False, error="Sandbox worker crashed (possibly out of memory)")
+        finally:
+            self._release(worker, recycle)
+
+    def close(self) -> None:
+        self._closed = True
+        with self._lock:
+            workers = list(self._workers)
+            self._workers.clear()
+        for worker in workers:
+            worker.stop()
+
+
+_pool: Optional[SandboxPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_sandbox_pool() -> SandboxPool:
+    """
+    Return the process-wide sandbox pool, creating it from environment settings on first use.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SandboxPool(
+                size=int(os.getenv("SANDBOX_POOL_SIZE", "2")),
+                max_runs=int(os.getenv("SANDBOX_MAX_RUNS", "50")),
+                cpu_seconds=int(os.getenv("SANDBOX_CPU_SECONDS", "10")),
+                memory_mb=int(os.getenv("SANDBOX_MEMORY_MB", "512")),
+                timeout=float(os.getenv("SANDBOX_TIMEOUT_SECONDS", "15")),
+                acquire_timeout=float(os.getenv("SANDBOX_ACQUIRE_TIMEOUT_SECONDS", "30")),
+            )
+        return _pool
@@ -0,0 +1,160 @@
+"""
+Sandbox worker process, started by SandboxPool as `python -I sandbox_worker.py <fd> <scratch dir> <uid> <gid>`.
+
+Runs with an empty environment and only imports the standard library, numpy and pandas, so it does not depend on
+the backend package. Before accepting code it isolates itself: own network namespace (no interfaces but loopback),
+an unprivileged user when started as root, the scratch directory as working directory, and an audit hook that refuses network, process
+creation, native code loading and file access outside the scratch directory and the Python installation.
+"""
+import contextlib
+import ctypes
+import io
+import os
+import resource
+import signal
+import stat
+import sys
+import traceback
+from multiprocessing.connection import Connection
+
+CLONE_NEWNET = 0x40000000
+CLONE_NEWUSER = 0x10000000
+# Largest file the sandboxed code may write
+MAX_FILE_BYTES = 64 * 1024 * 1024
+# Read-only locations besides the Python installation (time zone data used by pandas)
+READABLE_PATHS = ("/usr/share/zoneinfo", "/etc/localtime", "/dev/null", "/dev/urandom")
+BLOCKED_EVENTS = (
+    "socket.", "subprocess.", "os.system", "os.exec", "os.posix_spawn", "os.spawn", "os.fork", "os.forkpty",
+    "os.kill", "os.putenv", "os.chmod", "os.chown", "ctypes.", "sys.addaudithook", "_posixsubprocess",
+    "pty.", "mmap.",
+)
+
+
+class SandboxCpuLimitExceeded(Exception):
+    pass
+
+
+def _on_sigxcpu(signum, frame):
+    raise SandboxCpuLimitExceeded("CPU time limit exceeded")
+
+
+def _isolate_network() -> str:
+    """Move into a network namespace of our own. Must run before any thread is started."""
+    libc = ctypes.CDLL(None, use_errno=True)
+    flags = CLONE_NEWNET if os.geteuid() == 0 else CLONE_NEWUSER | CLONE_NEWNET
+    if libc.unshare(flags) != 0:
+        return f"unavailable (errno {ctypes.get_errno()})"
+    return "namespace"
+
+
+def _world_readable(path: str) -> bool:
+    """Whether a user that is neither owner nor group member can read `path` (checked up to the root)."""
+    path = os.path.realpath(path)
+    if not os.stat(path).st_mode & stat.S_IROTH:
+        return False
+    while path != os.sep:
+        path = os.path.dirname(path)
+        if not os.stat(path).st_mode & stat.S_IXOTH:
+            return False
+    return True
+
+
+def _drop_privileges(uid: int, gid: int) -> str:
+    if os.geteuid() != 0 or uid < 0:
+        return "unprivileged"
+    if not _world_readable(sys.prefix):
+        # Lazy imports would fail after the switch; isolation then rests on the namespace, environment and audit hook
+        return f"root (python installation at {sys.prefix} is not readable by uid {uid})"
+    os.setgroups([])
+    os.setgid(gid)
+    os.setuid(uid)
+    return f"uid {uid}"
+
+
+def _audit_hook(scratch: str, readable: tuple[str, ...]):
+    def hook(event: str, args: tuple) -> None:
+        if event.startswith(BLOCKED_EVENTS):
+            raise PermissionError(f"{event} is not allowed in the sandbox")
+        if event == "open":
+            path, mode = args[0], args[1]
+            if isinstance(path, int) or path is None:
+                return
+            path = os.path.abspath(os.fsdecode(path))
+            if path == scratch or path.startswith(scratch + os.sep):
+                return
+            writing = mode is not None and any(flag in str(mode) for flag in "wax+")
+            if not writing and path.startswith(readable):
+                return
+            raise PermissionError(f"Access to {path} is not allowed in the sandbox")
+    return hook
+
+
+def _run(code: str, namespace_modules: dict) -> dict:
+    stdout = io.StringIO()
+    namespace = {"__name__": "__sandbox__", **namespace_modules}
+    try:
+        with contextlib.redirect_stdout(stdout):
+            exec(compile(code, "<sandbox>", "exec"), namespace)
+        return {"ok": True, "stdout": stdout.getvalue(), "error": None}
+    except MemoryError:
+        return {"ok": False, "stdout": stdout.getvalue(), "error": "Memory limit exceeded", "fatal": True}
+    except SandboxCpuLimitExceeded as e:
+        return {"ok": False, "stdout": stdout.getvalue(), "error": str(e), "fatal": True}
+    except BaseException:
+        return {"ok": False, "stdout": stdout.getvalue(), "error": traceback.format_exc(limit=-3)}
+
+
+def main(fd: int, scratch: str, uid: int, gid: int) -> None:
+    conn = Connection(fd)
+    os.chdir(scratch)
+    network = _isolate_network()
+
+    import numpy as np
+    import pandas as pd
+
+    user = _drop_privileges(uid, gid)
+
+    signal.signal(signal.SIGXCPU, _on_sigxcpu)
+    resource.setrlimit(resource.RLIMIT_FSIZE, (MAX_FILE_BYTES, MAX_FILE_BYTES))
+    _, cpu_hard = resource.getrlimit(resource.RLIMIT_CPU)
+    _, as_hard = resource.getrlimit(resource.RLIMIT_AS)
+    page_size = resource.getpagesize()
+    with open("/proc/self/statm") as statm:
+        statm_fd = os.dup(statm.fileno())
+
+    readable = tuple({sys.prefix, sys.base_prefix, sys.exec_prefix, *[p for p in sys.path if p]} | set(READABLE_PATHS))
+    sys.addaudithook(_audit_hook(os.path.realpath(scratch), readable))
+    conn.send({"ready": True, "network": network, "user": user})
+
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if request is None:
+            break
+        code, cpu_seconds, memory_bytes = request
+
+        # RLIMIT_CPU is cumulative for the process, so the budget is relative to what was already used
+        used = resource.getrusage(resource.RUSAGE_SELF)
+        cpu_used = int(used.ru_utime + used.ru_stime)
+        if cpu_seconds:
+            resource.setrlimit(resource.RLIMIT_CPU, (cpu_used + cpu_seconds, cpu_hard))
+        if memory_bytes:
+            address_space = int(os.pread(statm_fd, 64, 0).split()[0]) * page_size
+            resource.setrlimit(resource.RLIMIT_AS, (address_space + memory_bytes, as_hard))
+        try:
+            result = _run(code, {"np": np, "pd": pd})
+        finally:
+            resource.setrlimit(resource.RLIMIT_CPU, (cpu_hard, cpu_hard))
+            resource.setrlimit(resource.RLIMIT_AS, (as_hard, as_hard))
+
+        try:
+            conn.send(result)
+        except Exception:
+            # Output that cannot be pickled or a broken pipe; let the pool replace us
+            break
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]), sys.argv[2], int(sys.argv[3]), int(sys.argv[4]))
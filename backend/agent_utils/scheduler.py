@@ -0,0 +1,196 @@
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import AsyncIterator, Optional
+
+from .metrics import RouteMetrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TENANT = "anonymous"
+MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", "4"))
+MAX_CONCURRENT_SLIDES = int(os.getenv("MAX_CONCURRENT_SLIDES", "8"))
+# Slots batch work may never take, so interactive requests find one free even under a batch spike
+INTERACTIVE_RESERVE = int(os.getenv("SCHEDULER_INTERACTIVE_RESERVE", "1"))
+# Batch work waiting longer than this is served before newer interactive work
+BATCH_MAX_WAIT = float(os.getenv("SCHEDULER_BATCH_MAX_WAIT", "120"))
+# Relative shares per tenant, e.g. {"team-a": 2}; unlisted tenants weigh 1
+TENANT_WEIGHTS: dict[str, float] = json.loads(os.getenv("SCHEDULER_TENANT_WEIGHTS", "{}"))
+
+
+class Priority(str, Enum):
+    INTERACTIVE = "interactive"
+    BATCH = "batch"
+
+
+@dataclass(order=True)
+class _Waiter:
+    tag: float
+    seq: int
+    start: float = field(compare=False)
+    tenant: str = field(compare=False)
+    priority: Priority = field(compare=False)
+    enqueued_at: float = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    key: Optional[str] = field(default=None, compare=False)
+
+
+class FairScheduler:
+    """
+    Admission control for a shared resource with `capacity` concurrent slots.
+
+    Interactive work goes before batch work, and `interactive_reserve` slots are kept for it. Batch work that
+    waited longer than `batch_max_wait` seconds is served first so it cannot starve. Within a priority class,
+    tenants share slots by weighted fair queuing: every request gets a virtual finish tag of
+    max(virtual time, tenant's last tag) + cost / weight, and the smallest tag runs next, so a tenant with twenty
+    queued decks alternates with a tenant that has one.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        capacity: int,
+        interactive_reserve: int = INTERACTIVE_RESERVE,
+        batch_max_wait: float = BATCH_MAX_WAIT,
+        weights: Optional[dict[str, float]] = None,
+    ):
+        self.name = name
+        self.capacity = capacity
+        self.interactive_reserve = min(interactive_reserve, capacity - 1)
+        self.batch_max_wait = batch_max_wait
+        self.weights = weights if weights is not None else TENANT_WEIGHTS
+        self.wait_metrics = RouteMetrics()
+        self._queues: dict[Priority, list[_Waiter]] = {p: [] for p in Priority}
+        self._virtual_time = {p: 0.0 for p in Priority}
+        self._last_tag: dict[tuple[Priority, str], float] = {}
+        self._running = {p: 0 for p in Priority}
+        self._seq = itertools.count()
+        # Queued waiters by the key they were submitted with, so the work of a cancelled job can be withdrawn
+        self._keyed: dict[str, dict[int, _Waiter]] = {}
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        tenant: Optional[str] = None,
+        priority: Priority = Priority.INTERACTIVE,
+        cost: float = 1.0,
+        key: Optional[str] = None,
+    ) -> AsyncIterator[None]:
+        """
+        Wait for a slot, hold it for the body of the `async with`, then hand it to the next waiter.
+        While queued, a request submitted with a `key` can be dropped with withdraw().
+        """
+        waiter = self._enqueue(tenant or DEFAULT_TENANT, Priority(priority), cost, key)
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # The slot was granted just as the waiter was cancelled
+                self._release(waiter.priority)
+            raise
+        finally:
+            self._forget(waiter)
+        self.wait_metrics.record(waiter.priority.value, time.monotonic() - waiter.enqueued_at, True)
+        try:
+            yield
+        finally:
+            self._release(waiter.priority)
+
+    def _enqueue(self, tenant: str, priority: Priority, cost: float, key: Optional[str] = None) -> _Waiter:
+        tenant_key = (priority, tenant)
+        start = max(self._virtual_time[priority], self._last_tag.get(tenant_key, 0.0))
+        tag = start + cost / max(self.weights.get(tenant, 1.0), 1e-6)
+        self._last_tag[tenant_key] = tag
+        waiter = _Waiter(tag, next(self._seq), start, tenant, priority, time.monotonic(),
+                         asyncio.get_running_loop().create_future(), key)
+        heapq.heappush(self._queues[priority], waiter)
+        if key is not None:
+            self._keyed.setdefault(key, {})[waiter.seq] = waiter
+        return waiter
+
+    def _forget(self, waiter: _Waiter) -> None:
+        waiters = self._keyed.get(waiter.key) if waiter.key is not None else None
+        if waiters is not None:
+            waiters.pop(waiter.seq, None)
+            if not waiters:
+                del self._keyed[waiter.key]
+
+    def withdraw(self, key: str, exc: BaseException) -> int:
+        """
+        Remove the still queued requests submitted with `key`; their slot() raises `exc`. Requests already holding
+        a slot are not affected. Returns how many were removed.
+        """
+        withdrawn = 0
+        for waiter in list(self._keyed.get(key, {}).values()):
+            if waiter.future.done():
+                continue
+            queue = self._queues[waiter.priority]
+            queue.remove(waiter)
+            heapq.heapify(queue)
+            waiter.future.set_exception(exc)
+            withdrawn += 1
+        if withdrawn:
+            logger.info(f"Withdrew {withdrawn} queued {self.name} requests of {key}")
+        return withdrawn
+
+    def _head(self, priority: Priority) -> Optional[_Waiter]:
+        queue = self._queues[priority]
+        # Waiters cancelled while queued are dropped lazily
+        while queue and queue[0].future.done():
+            heapq.heappop(queue)
+        return queue[0] if queue else None
+
+    def _next(self) -> Optional[_Waiter]:
+        interactive = self._head(Priority.INTERACTIVE)
+        batch = self._head(Priority.BATCH)
+        batch_allowed = batch is not None and sum(self._running.values()) < self.capacity - self.interactive_reserve
+        if batch_allowed and (interactive is None or time.monotonic() - batch.enqueued_at > self.batch_max_wait):
+            return batch
+        return interactive
+
+    def _dispatch(self) -> None:
+        while sum(self._running.values()) < self.capacity:
+            waiter = self._next()
+            if waiter is None:
+                break
+            heapq.heappop(self._queues[waiter.priority])
+            self._virtual_time[waiter.priority] = max(self._virtual_time[waiter.priority], waiter.start)
+            self._running[waiter.priority] += 1
+            waiter.future.set_result(None)
+        for priority, queue in self._queues.items():
+            if not queue:
+                # Idle class: old finish tags no longer matter
+                self._last_tag = {k: v for k, v in self._last_tag.items() if k[0] != priority}
+
+    def _release(self, priority: Priority) -> None:
+        self._running[priority] -= 1
+        self._dispatch()
+
+    def snapshot(self) -> dict:
+        queued: dict[str, dict[str, int]] = {}
+        for priority, queue in self._queues.items():
+            for waiter in queue:
+                if not waiter.future.done():
+                    by_tenant = queued.setdefault(priority.value, {})
+                    by_tenant[waiter.tenant] = by_tenant.get(waiter.tenant, 0) + 1
+        return {
+            "capacity": self.capacity,
+            "running": {p.value: n for p, n in self._running.items()},
+            "queued": {p.value: sum(queued.get(p.value, {}).values()) for p in Priority},
+            "queuedByTenant": queued,
+            "wait": self.wait_metrics.snapshot(),
+        }
+
+
+# Whole workflows, admitted in create_job order subject to priority and tenant fairness
+job_scheduler = FairScheduler("jobs", MAX_CONCURRENT_JOBS)
+# Slide builds of all running jobs together, each holding LLM calls and database connections
+slide_scheduler = FairScheduler("slides", MAX_CONCURRENT_SLIDES)
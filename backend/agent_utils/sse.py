@@ -0,0 +1,145 @@
+import asyncio
+import os
+import threading
+import zlib
+from typing import AsyncIterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Compress event streams for clients that accept gzip or deflate
+SSE_COMPRESSION = os.getenv("SSE_COMPRESSION", "true").lower() in ("1", "true", "yes")
+SSE_COMPRESSION_LEVEL = int(os.getenv("SSE_COMPRESSION_LEVEL", "6"))
+# Messages arriving within this many seconds of each other are written as one chunk (0 disables batching)
+SSE_BATCH_WINDOW = float(os.getenv("SSE_BATCH_WINDOW", "0.02"))
+SSE_BATCH_MAX = int(os.getenv("SSE_BATCH_MAX", "50"))
+
+# wbits selecting the gzip container or the zlib stream HTTP calls "deflate"
+_WBITS = {"gzip": 16 + zlib.MAX_WBITS, "deflate": zlib.MAX_WBITS}
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick gzip or deflate from an Accept-Encoding header, honouring q=0; None for identity."""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[name.strip()] = q
+    for encoding in ("gzip", "deflate"):
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+class TransportMetrics:
+    """Bytes before and after compression and how many messages went out in how many chunks."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.raw_bytes = 0
+            self.sent_bytes = 0
+            self.messages = 0
+            self.chunks = 0
+
+    def record(self, raw: int, sent: int, messages: int) -> None:
+        with self._lock:
+            self.raw_bytes += raw
+            self.sent_bytes += sent
+            self.messages += messages
+            self.chunks += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "rawBytes": self.raw_bytes,
+                "sentBytes": self.sent_bytes,
+                "compressionRatio": round(self.sent_bytes / self.raw_bytes, 3) if self.raw_bytes else None,
+                "messages": self.messages,
+                "chunks": self.chunks,
+            }
+
+
+sse_metrics = TransportMetrics()
+
+
+class SSEEncoder:
+    """
+    Turns SSE text into response chunks. With an encoding, one compression stream spans the whole response and
+    every chunk ends with a sync flush, so the client can decode each frame as soon as it arrives while later
+    frames still reuse the dictionary built from earlier ones (repeated XML tags and event dumps compress well).
+    """
+
+    def __init__(self, encoding: Optional[str] = None, level: int = SSE_COMPRESSION_LEVEL, metrics: TransportMetrics = sse_metrics):
+        self.encoding = encoding
+        self.metrics = metrics
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, _WBITS[encoding]) if encoding else None
+
+    def encode(self, text: str, messages: int = 1) -> bytes:
+        raw = text.encode("utf-8")
+        data = raw if self._compressor is None else self._compressor.compress(raw) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        self.metrics.record(len(raw), len(data), messages)
+        return data
+
+    def close(self) -> bytes:
+        """The end of the compressed stream (gzip trailer); empty without compression."""
+        if self._compressor is None:
+            return b""
+        data, self._compressor = self._compressor.flush(zlib.Z_FINISH), None
+        return data
+
+
+async def batched(source: AsyncIterator[T], window: float = SSE_BATCH_WINDOW, max_batch: int = SSE_BATCH_MAX) -> AsyncIterator[list[T]]:
+    """
+    Group items of `source` into lists: a batch starts with the next item and collects whatever else arrives
+    within `window` seconds, up to `max_batch` items. A pump task keeps reading the source while the window is open.
+    """
+    if window <= 0:
+        async for item in source:
+            yield [item]
+        return
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max_batch * 4)
+    done = object()
+    errors: list[Exception] = []
+
+    async def pump() -> None:
+        try:
+            async for item in source:
+                await queue.put(item)
+        except Exception as e:
+            errors.append(e)
+        await queue.put(done)
+
+    task = asyncio.create_task(pump())
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            # Let the window fill up, then take what arrived
+            await asyncio.sleep(window)
+            batch, finished = [item], False
+            while len(batch) < max_batch and not queue.empty():
+                item = queue.get_nowait()
+                if item is done:
+                    finished = True
+                    break
+                batch.append(item)
+            yield batch
+            if finished:
+                break
+        if errors:
+            raise errors[0]
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
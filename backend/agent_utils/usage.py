@@ -0,0 +1,153 @@
+import threading
+from collections import defaultdict
+from dataclasses import dataclass, fields
+from typing import Optional
+
+from redis_utils.redis_client import redis_client
+
+USAGE_TTL_SECONDS = 7 * 24 * 3600
+
+
+class TokenBudgetExceeded(Exception):
+    """Raised when a job has used more tokens than its budget allows."""
+
+
+@dataclass
+class Usage:
+    promptTokens: int = 0
+    completionTokens: int = 0
+    cachedTokens: int = 0
+    toolCalls: int = 0
+    calls: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.promptTokens + self.completionTokens
+
+    def add(self, other: "Usage") -> None:
+        for field in fields(self):
+            setattr(self, field.name, getattr(self, field.name) + getattr(other, field.name))
+
+    def as_dict(self) -> dict:
+        return {field.name: getattr(self, field.name) for field in fields(self)}
+
+
+def usage_from_metadata(metadata, tool_calls: int = 0) -> Usage:
+    """
+    Convert Gemini usage metadata (google.genai or google.generativeai) into a Usage record for one model call.
+    """
+    return Usage(
+        promptTokens=getattr(metadata, "prompt_token_count", 0) or 0,
+        completionTokens=getattr(metadata, "candidates_token_count", 0) or 0,
+        cachedTokens=getattr(metadata, "cached_content_token_count", 0) or 0,
+        toolCalls=tool_calls,
+        calls=1 if metadata is not None else 0,
+    )
+
+
+def usage_key(job_id: str) -> str:
+    return f"usage:{job_id}"
+
+
+class _JobUsage:
+    def __init__(self):
+        self.total = Usage()
+        self.budget: Optional[int] = None
+        # Deltas per Redis field not written yet
+        self.pending: dict[str, int] = defaultdict(int)
+
+
+class UsageTracker:
+    """
+    Token usage per job, agent and slide. Recording is synchronous (tools call it from inside agent runs) and only
+    touches memory; `flush` writes the accumulated deltas to the Redis hash usage:{job_id} with HINCRBY.
+    """
+
+    def __init__(self, client=redis_client):
+        self.client = client
+        self._lock = threading.Lock()
+        self._jobs: dict[str, _JobUsage] = {}
+        self._agents: dict[str, Usage] = defaultdict(Usage)
+
+    def _job(self, job_id: str) -> _JobUsage:
+        job = self._jobs.get(job_id)
+        if job is None:
+            job = self._jobs[job_id] = _JobUsage()
+        return job
+
+    def set_budget(self, job_id: str, budget: Optional[int]) -> None:
+        with self._lock:
+            self._job(job_id).budget = budget
+
+    def record(self, job_id: str, agent: str, slide_id: Optional[str], usage: Usage) -> None:
+        scopes = ["total", f"agent:{agent}"]
+        if slide_id:
+            scopes.append(f"slide:{slide_id}")
+        with self._lock:
+            job = self._job(job_id)
+            job.total.add(usage)
+            self._agents[agent].add(usage)
+            for scope in scopes:
+                for name, value in usage.as_dict().items():
+                    if value:
+                        job.pending[f"{scope}:{name}"] += value
+
+    def over_budget(self, job_id: str) -> bool:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job is not None and job.budget is not None and job.total.total_tokens >= job.budget
+
+    def check_budget(self, job_id: str) -> None:
+        if self.over_budget(job_id):
+            job = self._jobs[job_id]
+            raise TokenBudgetExceeded(f"Job {job_id} used {job.total.total_tokens} of its {job.budget} token budget")
+
+    def job_total(self, job_id: str) -> Usage:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return Usage(**job.total.as_dict()) if job else Usage()
+
+    def agent_totals(self) -> dict:
+        """Process-wide usage per agent since start."""
+        with self._lock:
+            return {agent: usage.as_dict() for agent, usage in self._agents.items()}
+
+    async def flush(self, job_id: str) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or not job.pending:
+                return
+            pending, job.pending = job.pending, defaultdict(int)
+        key = usage_key(job_id)
+        async with self.client.pipeline(transaction=False) as pipe:
+            for field, value in pending.items():
+                pipe.hincrby(key, field, value)
+            pipe.expire(key, USAGE_TTL_SECONDS)
+            await pipe.execute()
+
+    def forget(self, job_id: str) -> None:
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+
+async def load_job_usage(job_id: str, client=redis_client) -> Optional[dict]:
+    """
+    Read a job's usage back from Redis as {"total": {...}, "agents": {name: {...}}, "slides": {id: {...}}}.
+    """
+    raw = await client.hgetall(usage_key(job_id))
+    if not raw:
+        return None
+    usage = {"total": Usage().as_dict(), "agents": {}, "slides": {}}
+    for field, value in raw.items():
+        scope, _, name = field.rpartition(":")
+        if scope == "total":
+            target = usage["total"]
+        else:
+            kind, _, scope_id = scope.partition(":")
+            group = usage["agents" if kind == "agent" else "slides"]
+            target = group.setdefault(scope_id, Usage().as_dict())
+        target[name] = int(value)
+    return usage
+
+
+usage_tracker = UsageTracker()
@@ -0,0 +1,195 @@
+import asyncio
+import json
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional
+
+from redis_utils.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_TTL_SECONDS = 7 * 24 * 3600
+INPUTS_FIELD = "__inputs__"
+
+
+class StageFailed(Exception):
+    pass
+
+
+class CheckpointStore:
+    """
+    Stage outputs of a job, stored as JSON in the Redis hash checkpoint:{job_id} (one field per stage).
+    """
+
+    def __init__(self, client=redis_client, ttl: int = CHECKPOINT_TTL_SECONDS):
+        self.client = client
+        self.ttl = ttl
+
+    @staticmethod
+    def key(job_id: str) -> str:
+        return f"checkpoint:{job_id}"
+
+    async def load(self, job_id: str) -> dict[str, Any]:
+        fields = await self.client.hgetall(self.key(job_id))
+        return {name: json.loads(value) for name, value in fields.items()}
+
+    async def get(self, job_id: str, name: str) -> Any:
+        value = await self.client.hget(self.key(job_id), name)
+        return None if value is None else json.loads(value)
+
+    async def save(self, job_id: str, name: str, value: Any) -> None:
+        key = self.key(job_id)
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.hset(key, name, json.dumps(value))
+            pipe.expire(key, self.ttl)
+            await pipe.execute()
+
+    async def delete(self, job_id: str, *names: str) -> None:
+        await self.client.hdel(self.key(job_id), *names)
+
+
+@dataclass
+class StageContext:
+    """Handed to every stage so it can keep finer-grained checkpoints of its own (e.g. one per slide)."""
+    job_id: str
+    stage: str
+    store: Optional[CheckpointStore]
+    checkpoints: dict[str, Any]
+
+    def _name(self, item: str) -> str:
+        return f"{self.stage}/{item}"
+
+    def get_checkpoint(self, item: str) -> Any:
+        return self.checkpoints.get(self._name(item))
+
+    async def save_checkpoint(self, item: str, value: Any) -> None:
+        self.checkpoints[self._name(item)] = value
+        if self.store is not None:
+            await self.store.save(self.job_id, self._name(item), value)
+
+
+@dataclass
+class Stage:
+    """
+    A workflow step. `fn(ctx, **inputs)` must return a dict containing every name in `outputs`.
+    """
+    name: str
+    fn: Callable[..., Awaitable[dict]]
+    inputs: tuple[str, ...] = ()
+    outputs: tuple[str, ...] = ()
+    checkpoint: bool = True
+
+
+class WorkflowDAG:
+    """
+    Runs stages as soon as their inputs are available, independent stages concurrently.
+
+    With a CheckpointStore every finished stage's outputs are saved under the job ID, and a later run of the
+    same job skips the stages that already completed. Stages with `checkpoint=False` (and the stages after them)
+    always run again; they can keep item checkpoints of their own through the StageContext.
+    """
+
+    def __init__(self, stages: list[Stage]):
+        self.stages = {stage.name: stage for stage in stages}
+        if len(self.stages) != len(stages):
+            raise ValueError("Stage names must be unique")
+        producers: dict[str, str] = {}
+        for stage in stages:
+            for output in stage.outputs:
+                if output in producers:
+                    raise ValueError(f"Output '{output}' produced by both {producers[output]} and {stage.name}")
+                producers[output] = stage.name
+        self._check_acyclic(producers)
+
+    def _check_acyclic(self, producers: dict[str, str]) -> None:
+        visiting, done = set(), set()
+
+        def visit(name: str) -> None:
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Workflow has a cycle through stage {name}")
+            visiting.add(name)
+            for input_name in self.stages[name].inputs:
+                if input_name in producers:
+                    visit(producers[input_name])
+            visiting.discard(name)
+            done.add(name)
+
+        for name in self.stages:
+            visit(name)
+
+    async def run(
+        self,
+        job_id: str,
+        inputs: dict[str, Any],
+        store: Optional[CheckpointStore] = None,
+        on_stage: Optional[Callable[[str, bool], None]] = None,
+    ) -> dict[str, Any]:
+        """
+        Execute the workflow and return all produced values (initial inputs included).
+        `on_stage(name, finished)` is called when a stage starts and when it finishes.
+        """
+        checkpoints = await store.load(job_id) if store is not None else {}
+        if store is not None and INPUTS_FIELD not in checkpoints:
+            await store.save(job_id, INPUTS_FIELD, inputs)
+
+        values = dict(inputs)
+        completed: set[str] = set()
+        producers = {output: stage.name for stage in self.stages.values() for output in stage.outputs}
+        restorable = {name for name, stage in self.stages.items() if stage.checkpoint and name in checkpoints}
+        # A stage that consumes the output of a stage running again runs again too, so it sees the new output
+        while True:
+            stale = {
+                name for name in restorable
+                if any(i in producers and producers[i] not in restorable for i in self.stages[name].inputs)
+            }
+            if not stale:
+                break
+            restorable -= stale
+        for name in self.stages:
+            if name in restorable:
+                values.update(checkpoints[name])
+                completed.add(name)
+                logger.info(f"Resuming {job_id}: stage {name} restored from checkpoint")
+
+        running: dict[asyncio.Task, Stage] = {}
+        try:
+            while len(completed) < len(self.stages):
+                running_names = {stage.name for stage in running.values()}
+                for name, stage in self.stages.items():
+                    if name in completed or name in running_names:
+                        continue
+                    if all(i in values for i in stage.inputs):
+                        ctx = StageContext(job_id, name, store, checkpoints)
+                        kwargs = {i: values[i] for i in stage.inputs}
+                        if on_stage is not None:
+                            on_stage(name, False)
+                        running[asyncio.create_task(stage.fn(ctx, **kwargs), name=f"{job_id}:{name}")] = stage
+                if not running:
+                    missing = sorted(set(self.stages) - completed)
+                    raise StageFailed(f"Stages {missing} cannot run: inputs are never produced")
+
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    stage = running.pop(task)
+                    outputs = task.result() or {}
+                    missing = [o for o in stage.outputs if o not in outputs]
+                    if missing:
+                        raise StageFailed(f"Stage {stage.name} did not produce {missing}")
+                    produced = {o: outputs[o] for o in stage.outputs}
+                    values.update(produced)
+                    completed.add(stage.name)
+                    if on_stage is not None:
+                        on_stage(stage.name, True)
+                    if store is not None and stage.checkpoint:
+                        await store.save(job_id, stage.name, produced)
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+        return values
+
+
+checkpoint_store = CheckpointStore()
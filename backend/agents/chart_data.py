@@ -0,0 +1,156 @@
+from typing import Any, Iterable, Optional, Union
+
+import numpy as np
+import pandas as pd
+from lxml import etree
+
+# Aggregations the chart tools accept, mapped to pandas names
+AGGREGATIONS = {"sum": "sum", "mean": "mean", "avg": "mean", "count": "count", "min": "min", "max": "max", "median": "median"}
+
+OTHER_LABEL = "Other"
+
+
+def to_frame(data: Union[pd.DataFrame, Iterable[dict], None]) -> pd.DataFrame:
+    """
+    Accept a DataFrame or a SQL result (list of row dicts) and return a DataFrame.
+    """
+    if isinstance(data, pd.DataFrame):
+        return data
+    return pd.DataFrame.from_records(list(data or []))
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling. Returns the indices of the points to keep.
+
+    `x` must be sorted ascending. The first and last points are always kept.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # Bucket boundaries for the interior points 1..n-2
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0] = 0
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = edges[i + 1], (edges[i + 2] if i + 2 < len(edges) else n)
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        areas = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+    selected[-1] = n - 1
+    return selected
+
+
+def aggregate_top_n(
+    df: pd.DataFrame,
+    category: str,
+    value: str,
+    aggregation: str = "sum",
+    top_n: Optional[int] = None,
+    other_label: str = OTHER_LABEL,
+) -> pd.DataFrame:
+    """
+    Group by `category`, aggregate `value`, keep the `top_n` largest groups and fold the rest into one "Other" bucket.
+    """
+    agg = AGGREGATIONS.get(aggregation.lower())
+    if agg is None:
+        raise ValueError(f"Unsupported aggregation '{aggregation}'. Use one of {sorted(AGGREGATIONS)}")
+
+    grouped = df.groupby(category, sort=False)[value].agg(agg).sort_values(ascending=False)
+    if top_n and len(grouped) > top_n:
+        kept = grouped.iloc[:top_n].copy()
+        rest = df.loc[~df[category].isin(kept.index), value]
+        # Re-aggregate the raw rows so mean/median/count of the bucket stay correct
+        kept.loc[other_label] = rest.agg(agg)
+        grouped = kept
+    return grouped.rename_axis(category).reset_index(name=value)
+
+
+def downsample_series(df: pd.DataFrame, x: str, y: str, max_points: int) -> pd.DataFrame:
+    """
+    Sort a time series (or any numeric x) and reduce it to at most `max_points` points with LTTB.
+    """
+    df = df[[x, y]].dropna()
+    x_values = df[x]
+    if not pd.api.types.is_numeric_dtype(x_values):
+        x_values = pd.to_datetime(x_values)
+    order = np.argsort(x_values.to_numpy(), kind="stable")
+    df = df.iloc[order]
+    x_numeric = x_values.iloc[order].to_numpy().astype("int64" if x_values.dtype.kind == "M" else float)
+    keep = lttb_indices(x_numeric, df[y].to_numpy(dtype=float), max_points)
+    return df.iloc[keep].reset_index(drop=True)
+
+
+def format_value(value: Any, precision: int = 2) -> str:
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return ""
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        return pd.Timestamp(value).isoformat()
+    if isinstance(value, (bool, np.bool_)):
+        return str(bool(value)).lower()
+    if isinstance(value, (int, np.integer)):
+        return str(int(value))
+    if isinstance(value, (float, np.floating)):
+        value = round(float(value), precision)
+        return str(int(value)) if value.is_integer() else str(value)
+    return str(value)
+
+
+def chart_xml(df: pd.DataFrame, chart_type: str = "bar", classes: Optional[str] = None, precision: int = 2) -> str:
+    """
+    Serialize a DataFrame as a slide `<Chart><Data><Row><Field name value/></Row></Data></Chart>` element.
+    """
+    chart = etree.Element("Chart", type=chart_type)
+    if classes:
+        chart.set("classes", classes)
+    data = etree.SubElement(chart, "Data")
+    columns = [str(c) for c in df.columns]
+    for row in df.itertuples(index=False, name=None):
+        row_elem = etree.SubElement(data, "Row")
+        for name, value in zip(columns, row):
+            etree.SubElement(row_elem, "Field", name=name, value=format_value(value, precision))
+    return etree.tostring(chart, encoding="unicode")
+
+
+def prepare_chart(
+    data: Union[pd.DataFrame, Iterable[dict]],
+    category: str,
+    value: str,
+    aggregation: str = "sum",
+    top_n: Optional[int] = 10,
+    max_points: Optional[int] = None,
+    time_series: bool = False,
+    chart_type: str = "bar",
+    classes: Optional[str] = "w-full h-96",
+) -> str:
+    """
+    Turn a query result into chart XML without sending every data point through an LLM.
+
+    Categorical data is aggregated with top-N + "Other" bucketing; time series are aggregated per
+    timestamp and downsampled with LTTB to `max_points`.
+    """
+    df = to_frame(data)
+    missing = [c for c in (category, value) if c not in df.columns]
+    if missing:
+        raise ValueError(f"Columns {missing} not in result columns {list(df.columns)}")
+    df = df.assign(**{value: pd.to_numeric(df[value], errors="coerce")})
+
+    if time_series:
+        df = aggregate_top_n(df, category, value, aggregation)
+        if max_points:
+            df = downsample_series(df, category, value, max_points)
+        else:
+            df = df.sort_values(category, kind="stable")
+    else:
+        df = aggregate_top_n(df, category, value, aggregation, top_n)
+    return chart_xml(df, chart_type=chart_type, classes=classes)
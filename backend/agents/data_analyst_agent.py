@@ -8,27 +8,19 @@ from google.adk.sessions import InMemorySessionService
 from google.adk.runners import Runner
 from google.genai import types
 import asyncio
-import psycopg2
-from psycopg2.extras import RealDictCursor
 from google.adk.tools import FunctionTool
-from .services.database_service import DatabaseService
+from .services.datasources import get_datasource
 
 from .visualizer import visualizer_tool
+from .chart_data import prepare_chart
+from .data_analyst_agent20 import run_job_query
 
 from .lib import load_xml_output_schema
-from crewai_tools import FileReadTool, DirectoryReadTool, FileWriterTool, CodeInterpreterTool
+from agent_utils.context_budget import fit_records
+from agent_utils.sandbox_pool import get_sandbox_pool
+from crewai_tools import FileReadTool, DirectoryReadTool, FileWriterTool
 from google.adk.tools.crewai_tool import CrewaiTool
 
-# Database connection parameters
-DB_PARAMS = {
-    'dbname': 'chinook',
-    'user': 'postgres',
-    'password': 'postgres',
-    'host': 'localhost', # Assuming your Docker DB is running on localhost
-    'port': 5432
-}
-
-
 # --- Step 1: Set up environment variables (Replace with your actual values) ---
 # Ensure you have authenticated with `gcloud auth application-default login`
 # if using Vertex AI. If using Google AI Studio API key, set GOOGLE_API_KEY.
@@ -55,32 +47,61 @@ FileWritingTool = CrewaiTool(
 # New async function for executing SQL queries using the global db_service
 async def execute_sql_query(query: str) -> str:
     """
-    Executes an SQL query against the Chinook database and returns the results as a string.
-    Manages database connection (connects and closes) for each execution using the global db_service.
+    Executes an SQL query against the job's database and returns the results as a string.
     Args:
         query: The SQL query string to be executed.
     Returns:
         A string representation of the query results or an error message.
     """
-    db_service = DatabaseService(DB_PARAMS)
     try:
-        # The global db_service instance is used here.
-        # async with will call db_service.__aenter__ (connect) and db_service.__aexit__ (close)
-        with db_service as active_db_service:
-            active_db_service.cursor.execute(query)
-            results = active_db_service.cursor.fetchall()
-            # Convert list of DictRow objects to a string for the LLM
-            return str([dict(row) for row in results])
+        # Pooled connection of the job's data source
+        results = await asyncio.to_thread(get_datasource().query_records, query)
+        return fit_records(results, "execute_sql_query")
     except Exception as e:
         return f"Error executing query \\'{query}\\': {str(e)}"
 
 
 
-CodeInterpreterTool = CrewaiTool(
-    tool=CodeInterpreterTool(),
-    name="CodeInterpreterTool",
-    description="Use this to run code.",
-)
+async def chart_data_tool(query: str, category_column: str, value_column: str, aggregation: str = "sum", top_n: int = 10, time_series: bool = False, max_points: int = 50) -> str:
+    """
+    Runs an SQL query and returns a finished `<Chart type="bar"><Data><Row><Field .../></Row></Data></Chart>` element.
+    Rows are grouped by `category_column` and `value_column` is aggregated (sum, mean, count, min, max, median);
+    the `top_n` largest categories are kept and the rest folded into "Other". Time series are downsampled to `max_points`.
+    Args:
+        query: The SQL query string to be executed.
+        category_column: Result column used for the chart categories (x axis).
+        value_column: Numeric result column used for the bar values.
+    Returns:
+        The Chart XML element or an error message.
+    """
+    try:
+        # Through the job's query cache, off the event loop
+        colnames, rows = await asyncio.to_thread(run_job_query, query)
+        return prepare_chart(
+            pd.DataFrame.from_records(rows, columns=colnames),
+            category=category_column,
+            value=value_column,
+            aggregation=aggregation,
+            top_n=top_n or None,
+            max_points=max_points or None,
+            time_series=time_series,
+        )
+    except Exception as e:
+        return f"Error preparing chart for query \\'{query}\\': {str(e)}"
+
+
+async def CodeInterpreterTool(code: str) -> str:
+    """
+    Use this to run Python code. numpy and pandas are already imported as `np` and `pd`.
+    Print anything you want returned; the captured stdout is the result.
+    Args:
+        code: The Python source to execute.
+    Returns:
+        The printed output of the code or an error message.
+    """
+    # Runs in a warm, resource-limited worker process instead of a fresh interpreter per call
+    result = await asyncio.to_thread(get_sandbox_pool().run, code)
+    return str(result)
 
 
 ########################################################
@@ -88,12 +109,7 @@ CodeInterpreterTool = CrewaiTool(
 ########################################################
 
 def get_data_analyst_instructions():
-    # service = DatabaseService(DB_PARAMS)
-    # with service as db:
-    #     schemas = db.get_table_schemas()
-    schema = os.path.join(os.path.dirname(__file__), "chinook.md")
-    with open(schema, 'r') as file:
-        schemas = file.read()
+    schemas = get_datasource().get_schema_doc()
 
     SCHEMA_RELATIVE_PATH = os.path.join("..", "..", "schemas", "single_slide_schema.xsd")
 
@@ -143,6 +159,7 @@ def get_script_instructions():
     You have the following tools at your disposal to accomplish your tasks:
     *   `execute_sql_query`: Use this tool to run SQL queries against the database. The analyst's instructions will often specify the exact queries or the data points required, which you'll translate into SQL queries using the schema names mentioned in the plan.
     *   `CodeInterpreterTool`: Use this tool to execute Python code. This is essential for any data manipulation, calculations, transformations, or formatting (e.g., preparing JSON for charts) that goes beyond simple SQL queries, as guided by the analyst's `InstructionsForContent`.
+    *   `chart_data_tool`: Use this tool for bar charts whenever the chart data comes straight from a query. Give it the SQL query, the category column and the value column; it returns the complete `<Chart>` element with inline `<Data><Row><Field/></Row></Data>`, which you embed as is.
     *   `visualizer_tool`: This tool generates the XML definition for charts. You will provide it with:
         1.  JSON data, prepared to logically represent rows and fields as an array of objects. This JSON must be self-contained with all necessary data values.
         2.  A visualization goal/description that **must explicitly state the required XML data structure: `<Data><Row><Field name=\"key\" value=\"value\"/></Row>...</Data>`. Crucially, this instruction must also specify that the chart data must be inline and the output XML from the tool MUST NOT contain any `<DataSource>` elements.**
@@ -200,7 +217,7 @@ def get_script_agent():
         model=MODEL_GEMINI_2_5_FLASH,
         description="An AI agent specialized in generating, running, and saving results from scripts, and using visualization tools.",
         instruction=get_script_instructions(),
-        tools=[FileWritingTool, CodeInterpreterTool, execute_sql_query, visualizer_tool],
+        tools=[FileWritingTool, CodeInterpreterTool, execute_sql_query, chart_data_tool, visualizer_tool],
     )
 
 def get_sequential_agent():
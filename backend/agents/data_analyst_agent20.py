@@ -1,10 +1,23 @@
 from google.adk.agents import Agent
+from google.adk.agents.readonly_context import ReadonlyContext
 from google.adk.tools import FunctionTool
-import psycopg2
+import asyncio
 import os
 import logging
 import google.generativeai as genai
+import hashlib
 import re
+from collections import OrderedDict
+
+import pandas as pd
+
+from agent_utils.job_context import current_batch_id, current_job_id, current_slide_id
+from agent_utils.context_budget import budget_for, fit_records, fit_schema_doc, fit_sections
+from agent_utils.log_config import payload
+from agent_utils.usage import usage_from_metadata, usage_tracker
+from .chart_data import prepare_chart
+from .services.datasources import get_datasource
+from .services.query_cache import get_query_cache
 
 logger = logging.getLogger(__name__)
 
@@ -20,60 +33,123 @@ except ValueError as e:
     # For now, we'll log and continue, but the XML formatting tool will fail.
 
 
+def run_job_query(query: str) -> tuple[list[str], list[tuple]]:
+    """Run a query on the job's data source (through its connection pool), answering from the job's query cache when possible."""
+    datasource = get_datasource()
+    # Repeated or subsumed queries within the same job (or all jobs of a batch) are answered from its query cache
+    cache = get_query_cache(current_batch_id.get() or current_job_id.get(), datasource.name)
+    if cache is None:
+        return datasource.query(query)
+    return cache.execute(query, datasource.query)
+
+
 def postgres_query_tool(query: str):
     """A tool to query the PostgreSQL database. Input is a SQL query string. Returns the query results as a list of dictionaries."""
     try:
-        conn = psycopg2.connect(
-            host="db",
-            database=os.getenv("POSTGRES_DB", "chinook"),
-            user=os.getenv("POSTGRES_USER", "postgres"),
-            password=os.getenv("POSTGRES_PASSWORD", "postgres")
-        )
-        cur = conn.cursor()
-        cur.execute(query)
-        # Fetch column names
-        colnames = [desc[0] for desc in cur.description]
-        rows = cur.fetchall()
-        cur.close()
-        conn.close()
+        colnames, rows = run_job_query(query)
 
         results = []
         for row in rows:
             results.append(dict(zip(colnames, row)))
         
-        return str(results)
+        # Large results are cut to the first rows plus a summary of the rest
+        return fit_records(results, "postgres_query_tool")
     except Exception as e:
         logger.error(f"Postgres query failed: {e}. Query: {query}")
         return f"Error connecting to or querying database: {e}"
 
 
+# Chart XML built by chart_data_tool, keyed by the marker the agent passes through format_text_to_xml_tool. The
+# markers stay in the agent's answer and are expanded afterwards, so the data points never go through the model.
+_prepared_charts: "OrderedDict[str, str]" = OrderedDict()
+MAX_PREPARED_CHARTS = 256
+CHART_MARKER_RE = re.compile(r"<Chart\s+ref=\"(chart-[0-9a-f]+)\"\s*/>|\[\[(chart-[0-9a-f]+)\]\]")
+
+
+def chart_data_tool(
+    query: str,
+    category_column: str,
+    value_column: str,
+    aggregation: str = "sum",
+    top_n: int = 10,
+    time_series: bool = False,
+    max_points: int = 50,
+) -> str:
+    """Runs a SQL query and builds the bar chart data for a slide directly from the result, without listing the data points yourself.
+    Groups rows by `category_column`, aggregates `value_column` (sum, mean, count, min, max, median), keeps the
+    `top_n` largest categories and folds the rest into "Other". For time series set `time_series` to true; the
+    series is sorted by `category_column` and downsampled to at most `max_points` points.
+    Returns a marker like [[chart-1a2b3c4d]] to place in the text given to format_text_to_xml_tool where the chart belongs."""
+    try:
+        colnames, rows = run_job_query(query)
+        xml = prepare_chart(
+            pd.DataFrame.from_records(rows, columns=colnames),
+            category=category_column,
+            value=value_column,
+            aggregation=aggregation,
+            top_n=top_n or None,
+            max_points=max_points or None,
+            time_series=time_series,
+        )
+    except Exception as e:
+        logger.error(f"Chart data preparation failed: {e}. Query: {query}")
+        return f"Error preparing chart data: {e}"
+
+    chart_id = "chart-" + hashlib.sha1(xml.encode("utf-8")).hexdigest()[:8]
+    _prepared_charts[chart_id] = xml
+    _prepared_charts.move_to_end(chart_id)
+    while len(_prepared_charts) > MAX_PREPARED_CHARTS:
+        _prepared_charts.popitem(last=False)
+    return f"Chart prepared with {xml.count('<Row>')} rows. Place the marker [[{chart_id}]] in the slide text where the chart belongs."
+
+
+def expand_chart_markers(xml: str) -> str:
+    """Replace chart markers in the analyst's final answer with the prepared Chart XML."""
+    def _replace(match):
+        chart_id = match.group(1) or match.group(2)
+        return _prepared_charts.get(chart_id, match.group(0))
+    return CHART_MARKER_RE.sub(_replace, xml)
+
+
 SLIDE_SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "slide_schema.xsd")
-DB_SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "chinook.md")
 
 slide_schema_content = ""
 try:
-    print(f"Reading slide schema from {SLIDE_SCHEMA_PATH}")
+    logger.debug(f"Reading slide schema from {SLIDE_SCHEMA_PATH}")
     with open(SLIDE_SCHEMA_PATH, 'r') as file:
         slide_schema_content = file.read()
-        print(f"Slide schema content: {slide_schema_content}")
+        logger.debug("Slide schema content: %s", payload(slide_schema_content))
 except Exception as e:
     logger.error(f"Error reading slide schema {SLIDE_SCHEMA_PATH}: {e}")
 
-db_schema_content = ""
-try:
-    with open(DB_SCHEMA_PATH, 'r') as file:
-        db_schema_content = file.read()
-except Exception as e:
-    logger.error(f"Error reading DB schema {DB_SCHEMA_PATH}: {e}")
+ANALYST_MODEL = "gemini-2.5-flash-preview-05-20"
+# Faster model used by the slide router for slides that need at most a single aggregate
+LIGHT_ANALYST_MODEL = os.getenv("SLIDE_LIGHT_MODEL", "gemini-2.0-flash-001")
+
 
-def format_text_to_xml_tool(text_to_format: str) -> str:
-    """Formats given text into a structured XML string suitable for a presentation slide. Input is the text to format."""
+def make_format_tool(model_name: str):
+    """Build the XML formatting tool on the given model. The agent sees the same tool name for every model."""
+    def format_text_to_xml_tool(text_to_format: str) -> str:
+        """Formats given text into a structured XML string suitable for a presentation slide. Input is the text to format."""
+        return _format_text_to_xml(text_to_format, model_name)
+    return format_text_to_xml_tool
+
+
+def _format_text_to_xml(text_to_format: str, model_name: str) -> str:
     if not slide_schema_content:
         return "Error: Slide schema not loaded. Cannot format XML."
+    job_id = current_job_id.get()
+    if job_id and usage_tracker.over_budget(job_id):
+        return "Error: the token budget of this job is used up. Cannot format XML."
     # if not genai.conf.api_key:
     #     return "Error: GOOGLE_API_KEY not configured. Cannot format XML."
 
-    model = genai.GenerativeModel('gemini-2.5-flash-preview-05-20')
+    # The schema is needed whole; the text to format gives way if both do not fit
+    text_to_format = fit_sections(
+        {"schema": slide_schema_content, "text": text_to_format}, budget_for("format_text_to_xml"),
+        "format_text_to_xml", trimmable=("text",)
+    )["text"]
+    model = genai.GenerativeModel(model_name)
     prompt = f"""
     Format the following text into an XML structure conforming to the slide XML schema provided below.
     The goal is to create a valid XML representation of a presentation slide based on the input text.
@@ -89,6 +165,8 @@ def format_text_to_xml_tool(text_to_format: str) -> str:
         </Row>
         <!-- Additional Row elements as needed -->
     </Data>
+    If the text contains chart markers like [[chart-1a2b3c4d]], do not invent data for them: output each one
+    exactly once as an empty element `<Chart ref="chart-1a2b3c4d"/>` at the place the chart belongs.
 
     Slide XML Schema:
     ```xml
@@ -104,6 +182,9 @@ def format_text_to_xml_tool(text_to_format: str) -> str:
     """
     try:
         response = model.generate_content(prompt)
+        if job_id:
+            usage_tracker.record(job_id, f"format_text_to_xml_tool:{model_name}", current_slide_id.get(),
+                                 usage_from_metadata(response.usage_metadata))
         raw_xml = response.text
         # Basic cleanup: remove markdown code fences if present
         cleaned_xml = re.sub(r"^```(?:xml)?\n", "", raw_xml, flags=re.MULTILINE)
@@ -111,26 +192,35 @@ def format_text_to_xml_tool(text_to_format: str) -> str:
         
         # TODO: Add more robust XML validation/parsing here if needed (e.g., using lxml)
         # For now, we assume the LLM produces reasonably well-formed XML
-        logger.info(f"Formatted XML: {cleaned_xml}")
+        logger.info("Formatted XML: %s", payload(cleaned_xml))
         return cleaned_xml
     except Exception as e:
         logger.error(f"Error formatting text to XML: {e}")
         return f"Error during XML formatting: {e}"
 
+
+format_text_to_xml_tool = make_format_tool(ANALYST_MODEL)
+
 # Instantiate tools
 postgres_tool_instance = FunctionTool(postgres_query_tool)
 xml_formatting_tool_instance = FunctionTool(format_text_to_xml_tool)
+chart_data_tool_instance = FunctionTool(chart_data_tool)
 
-INSTRUCTIONS = f"""
+INSTRUCTIONS = """
 As a data analyst, your primary goal is to extract relevant data from the PostgreSQL database using the `postgres_query_tool`,
 perform analysis on this data, and then synthesize your findings into clear, concise text summaries.
 
+When a slide needs a bar chart, use `chart_data_tool` with the SQL query, the category column and the value column
+instead of copying query results into the text. It returns a marker such as [[chart-1a2b3c4d]]; put that marker in
+the text you give to `format_text_to_xml_tool` where the chart should appear. The formatted XML then holds an empty
+`<Chart ref="chart-1a2b3c4d"/>` element; keep it exactly as is in your final XML, the chart data is filled in later.
+
 After generating the textual summary of your findings for a slide, you MUST use the `format_text_to_xml_tool`
 to convert your textual summary into a valid XML structure for the presentation slide.
 Present the final XML as your output for the slide content.
 
 DATABASE SCHEMA to help you write SQL queries:
-{db_schema_content}
+{db_schema}
 
 When using `format_text_to_xml_tool`, provide it with the complete textual content you want on the slide.
 The tool will handle the XML structure based on the provided text and the slide schema.
@@ -138,10 +228,29 @@ Do not attempt to generate XML directly. Rely on `format_text_to_xml_tool` for a
 In the end, return the XML string.
 """
 
+
+async def analyst_instructions(context: ReadonlyContext) -> str:
+    """Instruction provider: the analyst instructions with the schema doc of the job's data source."""
+    datasource = get_datasource()
+    # Introspecting a source without a schema doc hits the database, so keep it off the event loop
+    schema_doc = await asyncio.to_thread(datasource.get_schema_doc)
+    return INSTRUCTIONS.replace("{db_schema}", fit_schema_doc(schema_doc, context.agent_name))
+
 root_agent = Agent(
     name="data_analyst_agent",
-    model="gemini-2.5-flash-preview-05-20",
+    model=ANALYST_MODEL,
     description="An agent that connects to PostgreSQL, analyzes data, and formats findings into XML for presentation slides.",
-    instruction=INSTRUCTIONS,
-    tools=[postgres_tool_instance, xml_formatting_tool_instance],
+    instruction=analyst_instructions,
+    tools=[postgres_tool_instance, chart_data_tool_instance, xml_formatting_tool_instance],
+)
+
+# Same tools and instructions on the faster model
+light_xml_formatting_tool_instance = FunctionTool(make_format_tool(LIGHT_ANALYST_MODEL))
+
+light_agent = Agent(
+    name="data_analyst_agent_light",
+    model=LIGHT_ANALYST_MODEL,
+    description="A faster data analyst for slides that need no chart and at most a single aggregate.",
+    instruction=analyst_instructions,
+    tools=[postgres_tool_instance, chart_data_tool_instance, light_xml_formatting_tool_instance],
 )
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 # Standard library imports
+import asyncio
 import logging
 import json
 import os
@@ -10,6 +11,7 @@ from typing import Dict, Any, Optional, AsyncGenerator
 # Third-party imports
 from lxml import etree
 from google.adk.agents import LlmAgent
+from google.adk.agents.readonly_context import ReadonlyContext
 from google.adk.tools import FunctionTool, ToolContext
 from google.adk.sessions import InMemorySessionService
 from google.adk.runners import Runner
@@ -17,10 +19,10 @@ from google.genai import types as genai_types
 
 # Local imports
 from .services.database_service import DatabaseService
+from agent_utils.context_budget import fit_schema_doc
+from .services.datasources import get_datasource
 from .lib import load_xml_output_schema
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Constants and Configuration
@@ -31,14 +33,6 @@ class Config:
     USER_ID = "test_user_simple"
     SESSION_ID = "test_session_simple_001"
     
-    DB_CONFIG = {
-        "dbname": "chinook",  # Assuming you have a chinook DB for testing
-        "user": "postgres",    # Replace with your actual DB credentials
-        "password": "postgres",  # Replace with your actual DB credentials
-        "host": "localhost",
-        "port": 5432
-    }
-    
     # XML Configuration
     XML_NAMESPACE = {
         "ns": "http://www.complonkers-hackathon/slide_ideas"
@@ -50,10 +44,6 @@ class Config:
 
 
 
-schema = os.path.join(os.path.dirname(__file__), "chinook.md")
-with open(schema, 'r') as file:
-    schemas = file.read()
-
 # Agent Prompts
 DECK_ARCHITECT_PROMPT = f"""You are an AI assistant that generates business presentation slide outlines.
 
@@ -66,7 +56,7 @@ Your process is as follows:
 
 1.  **Analyze Database Schema (if `db_config` is provided and not a placeholder):**
    HERE IS THE DATABASE SCHEMA:
-{schemas}
+{{db_schema}}
     **Internally summarize these raw schemas in natural language for your own understanding.** Do NOT output this internal summary. This summary should describe the likely purpose of each table and its key columns based on their names and structure.
 
 2.  **Generate Slide Outline as XML:**
@@ -80,11 +70,18 @@ IMPORTANT: Output ONLY the raw XML string. Do not wrap it in code blocks, JSON,
 
 """
 
+
+async def deck_architect_instructions(context: ReadonlyContext) -> str:
+    """Instruction provider: the architect prompt with the schema doc of the job's data source."""
+    schema_doc = await asyncio.to_thread(get_datasource().get_schema_doc)
+    return DECK_ARCHITECT_PROMPT.replace("{db_schema}", fit_schema_doc(schema_doc, context.agent_name))
+
+
 # Initialize the agent
 deck_architect_agent = LlmAgent(
     name="SimpleDeckArchitectAgent",
     model=Config.MODEL_NAME,
-    instruction=DECK_ARCHITECT_PROMPT,
+    instruction=deck_architect_instructions,
     tools=[],
     output_key="simple_deck_slides_xml"
 )
@@ -119,7 +116,7 @@ async def run_architect_agent(initial_state: Dict[str, Any]) -> Optional[str]:
         Exception: If there's an error during the agent execution.
     """
     try:
-        initial_state["db_config"] = Config.DB_CONFIG
+        initial_state["db_config"] = get_datasource().connection_config()
 
         session_service = InMemorySessionService()
         session = await session_service.create_session(
@@ -0,0 +1,255 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Optional
+
+import psycopg2
+import psycopg2.pool
+
+from agent_utils.job_context import current_datasource
+from .snapshot import DataSnapshot, SnapshotLoader, SnapshotUnsupported
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATASOURCE = os.getenv("DEFAULT_DATASOURCE", "chinook")
+POOL_SIZE = int(os.getenv("DATASOURCE_POOL_SIZE", "8"))
+# Introspected schema docs are refreshed after this many seconds
+SCHEMA_TTL_SECONDS = float(os.getenv("DATASOURCE_SCHEMA_TTL", "3600"))
+# Answer read-only queries from an in-process Parquet snapshot (requires duckdb); per source via DATASOURCES
+SNAPSHOT_DEFAULT = os.getenv("DATASOURCE_SNAPSHOT", "false").lower() in ("1", "true", "yes")
+
+AGENTS_DIR = os.path.dirname(os.path.dirname(__file__))
+
+SCHEMA_QUERY = """
+    SELECT table_name, column_name, data_type
+    FROM information_schema.columns
+    WHERE table_schema = 'public'
+    ORDER BY table_name, ordinal_position
+"""
+
+
+class UnknownDataSource(KeyError):
+    pass
+
+
+@dataclass
+class DataSource:
+    """
+    A PostgreSQL database the agents can query, with its own connection pool and schema doc.
+
+    `schema_doc` is a markdown file describing the tables; without one the schema is introspected from
+    information_schema on first use and cached. With `snapshot` the tables are exported to Parquet and queries run
+    in-process, falling back to Postgres for SQL the embedded engine does not support.
+    """
+    name: str
+    dbname: str
+    host: str = "db"
+    port: int = 5432
+    user: str = "postgres"
+    password: str = field(default="postgres", repr=False)
+    description: str = ""
+    schema_doc: Optional[str] = None
+    pool_size: int = POOL_SIZE
+    snapshot: bool = SNAPSHOT_DEFAULT
+    _pool: Optional[psycopg2.pool.ThreadedConnectionPool] = field(default=None, init=False, repr=False)
+    _slots: threading.BoundedSemaphore = field(init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+    _schema: Optional[str] = field(default=None, init=False, repr=False)
+    _schema_loaded_at: float = field(default=0.0, init=False, repr=False)
+    _snapshot_loader: Optional[SnapshotLoader] = field(default=None, init=False, repr=False)
+    snapshot_queries: int = field(default=0, init=False, repr=False)
+    snapshot_fallbacks: int = field(default=0, init=False, repr=False)
+    _stats_lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def __post_init__(self):
+        self._slots = threading.BoundedSemaphore(self.pool_size)
+        if self.snapshot:
+            self._snapshot_loader = SnapshotLoader(DataSnapshot(self.name))
+
+    def connection_config(self) -> dict:
+        return {"dbname": self.dbname, "user": self.user, "password": self.password, "host": self.host, "port": self.port}
+
+    def _get_pool(self) -> psycopg2.pool.ThreadedConnectionPool:
+        with self._lock:
+            if self._pool is None:
+                self._pool = psycopg2.pool.ThreadedConnectionPool(0, self.pool_size, **self.connection_config())
+            return self._pool
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a pooled read-only connection. Blocks while all `pool_size` connections are in use.
+        """
+        with self._slots:
+            pool = self._get_pool()
+            conn = pool.getconn()
+            broken = False
+            try:
+                if not conn.autocommit:
+                    conn.set_session(readonly=True, autocommit=True)
+                yield conn
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                broken = True
+                raise
+            finally:
+                pool.putconn(conn, close=broken or conn.closed != 0)
+
+    def prepare_snapshot(self) -> None:
+        """Start exporting the snapshot in the background; a no-op without snapshot mode or duckdb."""
+        if self._snapshot_loader is not None:
+            self._snapshot_loader.start(self._query_postgres, self.connection)
+
+    def query(self, sql: str) -> tuple[list[str], list[tuple]]:
+        if self._snapshot_loader is not None:
+            self.prepare_snapshot()
+            snapshot = self._snapshot_loader.ready
+            if snapshot is not None:
+                try:
+                    result = snapshot.query(sql)
+                    with self._stats_lock:
+                        self.snapshot_queries += 1
+                    return result
+                except SnapshotUnsupported as e:
+                    with self._stats_lock:
+                        self.snapshot_fallbacks += 1
+                    logger.info(f"Snapshot of {self.name} cannot run query, using Postgres: {e}")
+        return self._query_postgres(sql)
+
+    def _query_postgres(self, sql: str, params: Optional[tuple] = None) -> tuple[list[str], list[tuple]]:
+        with self.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql, params)
+                colnames = [desc[0] for desc in cur.description] if cur.description else []
+                rows = cur.fetchall() if cur.description else []
+        return colnames, rows
+
+    def query_records(self, sql: str) -> list[dict]:
+        colnames, rows = self.query(sql)
+        return [dict(zip(colnames, row)) for row in rows]
+
+    def get_schema_doc(self) -> str:
+        """
+        The schema description given to the agents: the configured markdown file, or the introspected tables.
+        """
+        if self.schema_doc:
+            if self._schema is None:
+                with open(self.schema_doc, "r") as file:
+                    self._schema = file.read()
+            return self._schema
+        if self._schema is None or time.monotonic() - self._schema_loaded_at > SCHEMA_TTL_SECONDS:
+            self._schema = self._introspect()
+            self._schema_loaded_at = time.monotonic()
+        return self._schema
+
+    def _introspect(self) -> str:
+        _, rows = self._query_postgres(SCHEMA_QUERY)
+        lines = [f"# {self.name} database schema", ""]
+        if self.description:
+            lines += [self.description, ""]
+        current = None
+        for table, column, data_type in rows:
+            if table != current:
+                lines += ["", f"## {table}"] if current else [f"## {table}"]
+                current = table
+            lines.append(f"- {column}: {data_type}")
+        return "\n".join(lines)
+
+    def snapshot_status(self) -> Optional[dict]:
+        loader = self._snapshot_loader
+        if loader is None:
+            return None
+        ready = loader.ready
+        with self._stats_lock:
+            queries, fallbacks = self.snapshot_queries, self.snapshot_fallbacks
+        return {
+            "state": "ready" if ready else "failed" if loader.failed else "loading",
+            "tables": len(ready.tables) if ready else 0,
+            "exportedAt": ready.exported_at if ready else None,
+            "queries": queries,
+            "fallbacks": fallbacks,
+        }
+
+    def close(self) -> None:
+        if self._snapshot_loader is not None and self._snapshot_loader.ready is not None:
+            self._snapshot_loader.ready.close()
+        with self._lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+
+
+def _default_sources() -> dict[str, dict]:
+    common = {
+        "host": os.getenv("POSTGRES_HOST", "db"),
+        "port": int(os.getenv("POSTGRES_PORT", "5432")),
+        "user": os.getenv("POSTGRES_USER", "postgres"),
+        "password": os.getenv("POSTGRES_PASSWORD", "postgres"),
+    }
+    return {
+        "chinook": {
+            **common,
+            "dbname": os.getenv("POSTGRES_DB", "chinook"),
+            "description": "Digital music store: artists, albums, tracks, customers, invoices and employees.",
+            "schema_doc": os.path.join(AGENTS_DIR, "chinook.md"),
+        },
+        "nordic_startups": {
+            **common,
+            "dbname": "nordic_startups",
+            "description": "Nordic startup companies with location, founding year, size, industries and funding stage.",
+        },
+    }
+
+
+class DataSourceRegistry:
+    """
+    Named data sources. Defaults cover the databases seeded from db/seed_scripts; the DATASOURCES environment
+    variable (a JSON object of name -> DataSource fields) adds sources or overrides the defaults.
+    """
+
+    def __init__(self, configs: dict[str, dict], default: str = DEFAULT_DATASOURCE):
+        self._sources = {name: DataSource(name=name, **config) for name, config in configs.items()}
+        self.default = default
+
+    @classmethod
+    def from_env(cls) -> "DataSourceRegistry":
+        configs = _default_sources()
+        for name, config in json.loads(os.getenv("DATASOURCES", "{}")).items():
+            configs[name] = {**configs.get(name, {}), **config}
+        return cls(configs)
+
+    def get(self, name: Optional[str] = None) -> DataSource:
+        """The named source, else the current job's source, else the default one."""
+        name = name or current_datasource.get() or self.default
+        source = self._sources.get(name)
+        if source is None:
+            raise UnknownDataSource(name)
+        return source
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._sources
+
+    def describe(self) -> list[dict]:
+        return [
+            {
+                "name": source.name,
+                "description": source.description,
+                "default": source.name == self.default,
+                "snapshot": source.snapshot_status(),
+            }
+            for source in self._sources.values()
+        ]
+
+    def prepare_snapshots(self) -> None:
+        for source in self._sources.values():
+            source.prepare_snapshot()
+
+
+datasource_registry = DataSourceRegistry.from_env()
+
+
+def get_datasource(name: Optional[str] = None) -> DataSource:
+    return datasource_registry.get(name)
@@ -0,0 +1,384 @@
+import logging
+import numbers
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import date
+from decimal import Decimal
+from typing import Callable, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+QueryResult = tuple[list[str], list[tuple]]
+
+MAX_CACHED_JOBS = 32
+MAX_CACHED_ROWS = 100_000
+
+CLAUSES = ["select", "from", "where", "group by", "having", "order by", "limit", "offset"]
+AGGREGATE_RE = re.compile(r"\b(sum|count|avg|min|max|stddev|variance|array_agg|string_agg|bool_and|bool_or)\s*\(")
+PREDICATE_RE = re.compile(
+    r"^(?P<col>[a-z_][\w.]*|\"[^\"]+\")\s*"
+    r"(?:(?P<op><>|!=|<=|>=|=|<|>)\s*(?P<lit>.+)"
+    r"|(?P<neg>not\s+)?in\s*\((?P<list>.+)\)"
+    r"|is\s+(?P<isnot>not\s+)?null)$"
+)
+NUMBER_RE = re.compile(r"^-?\d+(\.\d+)?$")
+# Window functions see every row of the base query, so a narrower query's values cannot be taken from its result
+WINDOW_RE = re.compile(r"\bover\s*\(")
+
+
+def _scan(sql: str):
+    """Yield (index, char, depth, quoted) for each character of sql."""
+    depth = 0
+    quote = None
+    for i, ch in enumerate(sql):
+        if quote:
+            if ch == quote:
+                quote = None
+            yield i, ch, depth, True
+            continue
+        if ch in ("'", '"'):
+            quote = ch
+            yield i, ch, depth, True
+            continue
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        yield i, ch, depth, False
+
+
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace, lowercase everything outside quotes and drop trailing semicolons."""
+    out = []
+    prev_space = False
+    for _, ch, _, quoted in _scan(sql.strip().rstrip(";").strip()):
+        if quoted:
+            out.append(ch)
+            prev_space = False
+        elif ch.isspace():
+            if not prev_space:
+                out.append(" ")
+            prev_space = True
+        else:
+            out.append(ch.lower())
+            prev_space = False
+    return "".join(out).strip()
+
+
+def _split_top_level(sql: str, separator: str) -> list[str]:
+    """Split normalized sql on a separator that appears outside quotes and parentheses."""
+    parts, start = [], 0
+    n = len(separator)
+    for i, ch, depth, quoted in _scan(sql):
+        if quoted or depth or i < start:
+            continue
+        if sql.startswith(separator, i):
+            parts.append(sql[start:i].strip())
+            start = i + n
+    parts.append(sql[start:].strip())
+    return parts
+
+
+@dataclass
+class ParsedQuery:
+    clauses: dict[str, str]
+    conjuncts: frozenset[str] = field(default_factory=frozenset)
+
+    @classmethod
+    def parse(cls, sql: str) -> Optional["ParsedQuery"]:
+        """
+        Split a simple single SELECT into its top-level clauses. Returns None for anything more complex
+        (CTEs, set operations, subqueries in the WHERE clause), which can then only be matched exactly.
+        """
+        if not sql.startswith("select ") or re.search(r"\b(union|intersect|except)\b", sql):
+            return None
+        positions = []
+        for i, ch, depth, quoted in _scan(sql):
+            if quoted or depth or (i and sql[i - 1] != " "):
+                continue
+            for clause in CLAUSES:
+                if sql.startswith(clause + " ", i):
+                    positions.append((i, clause))
+                    break
+        names = [c for _, c in positions]
+        if len(names) != len(set(names)) or names != sorted(names, key=CLAUSES.index):
+            return None
+        clauses = {}
+        for k, (i, clause) in enumerate(positions):
+            end = positions[k + 1][0] if k + 1 < len(positions) else len(sql)
+            clauses[clause] = sql[i + len(clause):end].strip()
+        where = clauses.get("where")
+        if where and "select " in where:
+            return None
+        conjuncts = frozenset(_split_top_level(where, " and ")) if where else frozenset()
+        return cls(clauses=clauses, conjuncts=conjuncts)
+
+    def get(self, clause: str) -> Optional[str]:
+        return self.clauses.get(clause)
+
+
+def _parse_literal(text: str):
+    text = text.strip()
+    if text.startswith("'") and text.endswith("'") and len(text) >= 2:
+        inner = text[1:-1]
+        if "'" in inner.replace("''", ""):
+            raise ValueError(f"Unsupported literal {text!r}")
+        return inner.replace("''", "'")
+    if NUMBER_RE.match(text):
+        # Exact, like a Postgres numeric literal; _coerce turns it into a float for float columns
+        return Decimal(text) if "." in text else int(text)
+    if text in ("true", "false"):
+        return text == "true"
+    raise ValueError(f"Unsupported literal {text!r}")
+
+
+@dataclass
+class CacheEntry:
+    sql: str
+    parsed: Optional[ParsedQuery]
+    colnames: list[str]
+    rows: list[tuple]
+    _frame: Optional[pd.DataFrame] = None
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        if self._frame is None:
+            self._frame = pd.DataFrame.from_records(self.rows, columns=self.colnames)
+        return self._frame
+
+    def select_items(self) -> list[str]:
+        return _split_top_level(self.parsed.get("select"), ",")
+
+    def output_column(self, expr: str) -> Optional[str]:
+        """Map a column expression used in a predicate to the name it has in this result."""
+        items = self.select_items()
+        if len(items) != len(self.colnames) or any(item == "*" or item.endswith(".*") for item in items):
+            return None
+        for item, name in zip(items, self.colnames):
+            source = re.split(r"\s+as\s+", item)[0].strip()
+            if expr in (source, name) or source.endswith("." + expr):
+                return name
+        return None
+
+
+class JobQueryCache:
+    """
+    Records every SQL statement and result for one job and answers repeated or subsumed queries from memory.
+
+    A query is subsumed by a cached one when it has the same SELECT/FROM/GROUP BY/HAVING and only adds simple
+    `column op literal` filters (on group keys when the cached query aggregates) and ORDER BY/LIMIT; the result is then
+    computed from the cached rows with pandas.
+    """
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.exact_hits = 0
+        self.derived_hits = 0
+
+    @property
+    def saved(self) -> int:
+        return self.exact_hits + self.derived_hits
+
+    def stats(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "executed": self.executed,
+            "exact_hits": self.exact_hits,
+            "derived_hits": self.derived_hits,
+            "saved": self.saved,
+            "total": self.executed + self.saved,
+        }
+
+    def execute(self, query: str, run: Callable[[str], QueryResult]) -> QueryResult:
+        """Return the result of query, from the cache when possible, otherwise by calling run(query)."""
+        sql = normalize_sql(query)
+        if not sql.startswith(("select ", "with ")):
+            return run(query)
+
+        with self._lock:
+            entry = self._entries.get(sql)
+            if entry is not None:
+                self.exact_hits += 1
+                return entry.colnames, entry.rows
+            parsed = ParsedQuery.parse(sql)
+            if parsed is not None:
+                for candidate in reversed(self._entries.values()):
+                    derived = self._derive(parsed, candidate)
+                    if derived is not None:
+                        self.derived_hits += 1
+                        logger.info(f"Query for job {self.job_id} answered from cached result: {query}")
+                        return derived
+
+        colnames, rows = run(query)
+        with self._lock:
+            self.executed += 1
+            if len(rows) <= MAX_CACHED_ROWS:
+                self._entries[sql] = CacheEntry(sql, parsed, list(colnames), list(rows))
+        return colnames, rows
+
+    def _derive(self, query: ParsedQuery, entry: CacheEntry) -> Optional[QueryResult]:
+        base = entry.parsed
+        if base is None or base.get("limit") or base.get("offset"):
+            return None
+        for clause in ("select", "from", "group by", "having"):
+            if query.get(clause) != base.get(clause):
+                return None
+        if not base.conjuncts <= query.conjuncts:
+            return None
+
+        group_keys = set(_split_top_level(base.get("group by"), ",")) if base.get("group by") else None
+        if group_keys is None and AGGREGATE_RE.search(base.get("select")):
+            return None
+        if WINDOW_RE.search(entry.sql):
+            return None
+
+        try:
+            df = entry.frame
+            mask = pd.Series(True, index=df.index)
+            for conjunct in query.conjuncts - base.conjuncts:
+                mask &= self._predicate_mask(conjunct, entry, group_keys)
+            result = df[mask]
+
+            order_by = query.get("order by")
+            if order_by and order_by != base.get("order by"):
+                columns, ascending = [], []
+                for item in _split_top_level(order_by, ","):
+                    parts = item.split()
+                    name = entry.output_column(parts[0])
+                    if name is None or len(parts) > 2 or (len(parts) == 2 and parts[1] not in ("asc", "desc")):
+                        return None
+                    # Text is ordered by the database collation, which pandas cannot reproduce
+                    if not _orderable(result[name]):
+                        return None
+                    columns.append(name)
+                    ascending.append(len(parts) == 1 or parts[1] == "asc")
+                # Postgres puts NULLs last ascending and first descending; pandas takes one position for all keys
+                if len(set(ascending)) > 1 and result[columns].isna().any().any():
+                    return None
+                na_position = "last" if ascending[0] else "first"
+                result = result.sort_values(columns, ascending=ascending, kind="stable", na_position=na_position)
+
+            positions = list(result.index)
+            offset = int(query.get("offset") or 0)
+            limit = query.get("limit")
+            positions = positions[offset:offset + int(limit)] if limit and limit != "all" else positions[offset:]
+        except (ValueError, TypeError, KeyError) as e:
+            logger.debug(f"Cannot derive query from cached result: {e}")
+            return None
+        return entry.colnames, [entry.rows[i] for i in positions]
+
+    @staticmethod
+    def _predicate_mask(conjunct: str, entry: CacheEntry, group_keys: Optional[set[str]]) -> pd.Series:
+        match = PREDICATE_RE.match(_unwrap(conjunct))
+        if not match:
+            raise ValueError(f"Unsupported predicate {conjunct!r}")
+        col = match.group("col")
+        if group_keys is not None and col not in group_keys:
+            raise ValueError(f"Filter column {col!r} is not a group key")
+        name = entry.output_column(col)
+        if name is None:
+            raise ValueError(f"Filter column {col!r} not in cached result")
+        series = entry.frame[name]
+
+        if match.group("list") is not None:
+            values = [_parse_literal(v) for v in _split_top_level(match.group("list"), ",")]
+            mask = series.isin(_coerce(series, values))
+            return ~mask if match.group("neg") else mask
+        if match.group("op") is None:
+            return series.notna() if match.group("isnot") else series.isna()
+
+        value = _coerce(series, [_parse_literal(match.group("lit"))])[0]
+        op = match.group("op")
+        if op == "=":
+            return series == value
+        if op in ("<>", "!="):
+            return series != value
+        # Like ORDER BY: text compares by the database collation, which Python string comparison does not follow
+        if not _orderable(series):
+            raise ValueError(f"Range filter on non-numeric column {col!r}")
+        if op == "<":
+            return series < value
+        if op == "<=":
+            return series <= value
+        if op == ">":
+            return series > value
+        return series >= value
+
+
+def _unwrap(expr: str) -> str:
+    """Remove parentheses that enclose the whole expression."""
+    expr = expr.strip()
+    while expr.startswith("(") and expr.endswith(")"):
+        depths = [depth for _, _, depth, _ in _scan(expr)]
+        if min(depths[:-1]) == 0:
+            break
+        expr = expr[1:-1].strip()
+    return expr
+
+
+def _orderable(series: pd.Series) -> bool:
+    """Whether sorting the column in pandas gives the database's order: numbers and dates only."""
+    if pd.api.types.is_bool_dtype(series):
+        return False
+    if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+        return True
+    return all(
+        isinstance(value, (numbers.Number, date)) and not isinstance(value, bool) for value in series.dropna()
+    )
+
+
+def _coerce(series: pd.Series, values: list) -> list:
+    """Convert literals to the type of the column so comparisons against dates and numerics work."""
+    sample = series.dropna()
+    if sample.empty:
+        return values
+    first = sample.iloc[0]
+    if hasattr(first, "year") and hasattr(first, "month"):
+        return [type(first).fromisoformat(v) if isinstance(v, str) else v for v in values]
+    if isinstance(first, str) and any(not isinstance(v, str) for v in values):
+        raise TypeError("Comparing a text column with a non-text literal")
+    if isinstance(first, Decimal):
+        # NUMERIC columns come back as Decimal; a float literal would never equal them exactly
+        return [Decimal(v) if isinstance(v, int) and not isinstance(v, bool) else v for v in values]
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return [float(v) if isinstance(v, Decimal) else v for v in values]
+    return values
+
+
+_caches: "OrderedDict[str, JobQueryCache]" = OrderedDict()
+_caches_lock = threading.Lock()
+
+
+def _cache_key(job_id: str, datasource: Optional[str]) -> str:
+    return job_id if datasource is None else f"{datasource}:{job_id}"
+
+
+def get_query_cache(job_id: Optional[str], datasource: Optional[str] = None) -> Optional[JobQueryCache]:
+    """
+    Return the query cache for a job (and data source), creating it on first use. Caches of the most recent jobs
+    are kept so that follow-up work on a finished job can still reuse its results.
+    """
+    if job_id is None:
+        return None
+    key = _cache_key(job_id, datasource)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = _caches[key] = JobQueryCache(job_id)
+        _caches.move_to_end(key)
+        while len(_caches) > MAX_CACHED_JOBS:
+            _caches.popitem(last=False)
+        return cache
+
+
+def query_cache_stats(job_id: str, datasource: Optional[str] = None) -> Optional[dict]:
+    with _caches_lock:
+        cache = _caches.get(_cache_key(job_id, datasource))
+    return cache.stats() if cache else None
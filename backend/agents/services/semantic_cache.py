@@ -0,0 +1,273 @@
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from lxml import etree
+
+from redis_utils.redis_client import redis_client
+
+try:
+    import hnswlib
+except ImportError:  # optional: fall back to exact search with numpy
+    hnswlib = None
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DIM = int(os.getenv("SEMANTIC_CACHE_DIM", "512"))
+MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "5000"))
+# Cosine similarity above which a cached slide is handed to the analyst to adapt. A slide is only reused as is when
+# its idea has the same normalized text: bag-of-words similarity cannot tell "revenue, top 5" from "units, top 10".
+ADAPT_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_ADAPT_THRESHOLD", "0.8"))
+# Entries older than this are ignored and dropped: the data behind a cached slide changes
+ENTRY_TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL", str(24 * 3600)))
+# How often a process picks up entries added by other processes
+SYNC_INTERVAL = float(os.getenv("SEMANTIC_CACHE_SYNC_SECONDS", "30"))
+# Nearest neighbours checked per lookup, so slides of other data sources do not hide a match
+LOOKUP_CANDIDATES = 8
+
+ENTRIES_KEY = "semantic_cache:entries"
+ORDER_KEY = "semantic_cache:order"
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+class HashingEmbedder:
+    """
+    Local, model-free text embedding: hashed word unigrams and bigrams with sublinear term frequency, L2-normalized.
+    Near-duplicate wordings of the same slide idea land close together in cosine space.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+
+    def _features(self, text: str) -> list[str]:
+        words = TOKEN_RE.findall(text.lower())
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def embed(self, text: str) -> np.ndarray:
+        counts: dict[str, int] = {}
+        for feature in self._features(text):
+            counts[feature] = counts.get(feature, 0) + 1
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, count in counts.items():
+            digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+            sign = 1.0 if digest >> 63 else -1.0
+            vector[digest % self.dim] += sign * (1.0 + math.log(count))
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class _NumpyIndex:
+    """Exact cosine search over normalized vectors."""
+
+    def __init__(self, dim: int, max_elements: int):
+        self.dim = dim
+        self._vectors: dict[int, np.ndarray] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._labels: Optional[np.ndarray] = None
+
+    def add(self, label: int, vector: np.ndarray) -> None:
+        self._vectors[label] = vector
+        self._matrix = None
+
+    def remove(self, label: int) -> None:
+        if self._vectors.pop(label, None) is not None:
+            self._matrix = None
+
+    def search(self, vector: np.ndarray, k: int) -> list[tuple[int, float]]:
+        if not self._vectors:
+            return []
+        if self._matrix is None:
+            self._labels = np.fromiter(self._vectors.keys(), dtype=np.int64)
+            self._matrix = np.stack(list(self._vectors.values()))
+        scores = self._matrix @ vector
+        top = np.argsort(-scores)[:k]
+        return [(int(self._labels[i]), float(scores[i])) for i in top]
+
+
+class _HnswIndex:
+    """Approximate cosine search with hnswlib; evicted labels are marked deleted and their slots reused."""
+
+    def __init__(self, dim: int, max_elements: int):
+        self._index = hnswlib.Index(space="cosine", dim=dim)
+        self._index.init_index(max_elements=max_elements, ef_construction=200, M=16, allow_replace_deleted=True)
+        self._index.set_ef(64)
+        self._live: set[int] = set()
+
+    def add(self, label: int, vector: np.ndarray) -> None:
+        self._index.add_items(vector.reshape(1, -1), [label], replace_deleted=True)
+        self._live.add(label)
+
+    def remove(self, label: int) -> None:
+        if label in self._live:
+            self._index.mark_deleted(label)
+            self._live.discard(label)
+
+    def search(self, vector: np.ndarray, k: int) -> list[tuple[int, float]]:
+        k = min(k, len(self._live))
+        if k == 0:
+            return []
+        labels, distances = self._index.knn_query(vector.reshape(1, -1), k=k)
+        return [(int(label), 1.0 - float(distance)) for label, distance in zip(labels[0], distances[0])]
+
+
+@dataclass
+class CacheMatch:
+    entry_id: str
+    similarity: float
+    slide_xml: str
+    # The cached idea has the same normalized text, so the slide can be reused without an agent
+    exact: bool = False
+
+
+def normalize_idea_text(text: str) -> str:
+    return " ".join(TOKEN_RE.findall(text.lower()))
+
+
+def slide_idea_text(slide_idea) -> str:
+    parts = [slide_idea.findtext(f"{{*}}{name}") or "" for name in ("Title", "ContentDescription", "DataInsights")]
+    return "\n".join(part.strip() for part in parts)
+
+
+def retarget_slide(slide_xml: str, slide_id: str) -> str:
+    """Give a cached slide the SlideId of the idea it is reused for."""
+    slide = etree.fromstring(slide_xml.encode("utf-8"))
+    slide.set("id", slide_id)
+    return etree.tostring(slide, encoding="unicode")
+
+
+class SemanticSlideCache:
+    """
+    Cross-job cache of validated slide XML keyed by the embedding of its SlideIdea.
+
+    Entries live in Redis (hash semantic_cache:entries plus the insertion-ordered zset semantic_cache:order) and
+    are capped at `max_entries`, oldest evicted first, and expire after ENTRY_TTL_SECONDS. Every process keeps an in-memory vector index over them
+    (hnswlib when installed, exact numpy search otherwise), loaded lazily and topped up incrementally.
+    """
+
+    def __init__(self, client=redis_client, embedder=None, max_entries: int = MAX_ENTRIES, ttl: float = ENTRY_TTL_SECONDS):
+        self.client = client
+        self.embedder = embedder or HashingEmbedder()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        index_cls = _HnswIndex if hnswlib is not None else _NumpyIndex
+        self._index = index_cls(self.embedder.dim, max_entries)
+        self._labels: dict[str, int] = {}
+        self._entries: dict[int, dict] = {}
+        self._next_label = 0
+        self._synced_score = 0.0
+        self._last_sync = 0.0
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.adapts = 0
+        self.misses = 0
+
+    def _insert_local(self, entry: dict, vector: np.ndarray) -> None:
+        self._remove_local(entry["id"])
+        while len(self._entries) >= self.max_entries:
+            oldest = min(self._entries.values(), key=lambda e: e["createdAt"])
+            self._remove_local(oldest["id"])
+        label = self._next_label
+        self._next_label += 1
+        self._labels[entry["id"]] = label
+        self._entries[label] = entry
+        self._index.add(label, vector)
+
+    def _remove_local(self, entry_id: str) -> None:
+        label = self._labels.pop(entry_id, None)
+        if label is not None:
+            self._entries.pop(label, None)
+            self._index.remove(label)
+
+    async def _sync(self) -> None:
+        """Load entries other processes added since the last sync."""
+        if time.monotonic() - self._last_sync < SYNC_INTERVAL:
+            return
+        async with self._lock:
+            if time.monotonic() - self._last_sync < SYNC_INTERVAL:
+                return
+            self._last_sync = time.monotonic()
+            new = await self.client.zrangebyscore(ORDER_KEY, f"({self._synced_score}", "+inf", withscores=True)
+            if not new:
+                return
+            ids = [entry_id for entry_id, _ in new]
+            for raw in await self.client.hmget(ENTRIES_KEY, ids):
+                if raw is not None:
+                    entry = json.loads(raw)
+                    vector = np.frombuffer(base64.b64decode(entry.pop("vector")), dtype=np.float32)
+                    self._insert_local(entry, vector)
+            self._synced_score = max(score for _, score in new)
+
+    async def lookup(self, slide_idea, datasource: Optional[str] = None) -> Optional[CacheMatch]:
+        """
+        Return the most similar live cached slide above ADAPT_THRESHOLD, or None; `exact` is set when the cached
+        idea has the same normalized text. With `datasource` only slides built from that data source are considered.
+        """
+        await self._sync()
+        text = slide_idea_text(slide_idea)
+        vector = self.embedder.embed(text)
+        expires_before = time.time() - self.ttl
+        for label, similarity in self._index.search(vector, LOOKUP_CANDIDATES):
+            entry = self._entries.get(label)
+            if entry is not None and entry["createdAt"] < expires_before:
+                self._remove_local(entry["id"])
+                continue
+            if entry is None or entry.get("datasource") != datasource:
+                continue
+            if similarity >= ADAPT_THRESHOLD:
+                exact = normalize_idea_text(entry["text"]) == normalize_idea_text(text)
+                if exact:
+                    self.hits += 1
+                else:
+                    self.adapts += 1
+                return CacheMatch(entry["id"], similarity, entry["slide"], exact)
+            break
+        self.misses += 1
+        return None
+
+    async def add(self, slide_idea, slide_xml: str, datasource: Optional[str] = None) -> None:
+        """
+        Store a validated slide for its idea and evict the oldest entries beyond max_entries.
+        """
+        text = slide_idea_text(slide_idea)
+        vector = self.embedder.embed(text)
+        entry_id = hashlib.sha1(f"{datasource or ''}\n{text}".encode("utf-8")).hexdigest()
+        entry = {"id": entry_id, "text": text, "slide": slide_xml, "datasource": datasource, "createdAt": time.time()}
+        self._insert_local(entry, vector)
+        stored = {**entry, "vector": base64.b64encode(vector.astype(np.float32).tobytes()).decode("ascii")}
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.hset(ENTRIES_KEY, entry["id"], json.dumps(stored))
+            pipe.zadd(ORDER_KEY, {entry["id"]: entry["createdAt"]})
+            pipe.zcard(ORDER_KEY)
+            *_, size = await pipe.execute()
+        evicted = [entry_id for entry_id, _ in await self.client.zrangebyscore(
+            ORDER_KEY, "-inf", f"({entry['createdAt'] - self.ttl}", withscores=True
+        )]
+        if size - len(evicted) > self.max_entries:
+            evicted += [entry_id for entry_id, _ in await self.client.zpopmin(ORDER_KEY, size - len(evicted) - self.max_entries)]
+        if evicted:
+            await self.client.zrem(ORDER_KEY, *evicted)
+            await self.client.hdel(ENTRIES_KEY, *evicted)
+            for entry_id in evicted:
+                self._remove_local(entry_id)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "adapts": self.adapts,
+            "misses": self.misses,
+            "index": "hnswlib" if hnswlib is not None else "numpy",
+        }
+
+
+semantic_slide_cache = SemanticSlideCache()
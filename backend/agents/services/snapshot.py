@@ -0,0 +1,219 @@
+import fcntl
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from typing import Callable, Optional
+
+import pandas as pd
+
+try:
+    import duckdb
+except ImportError:  # optional: without it every query goes to Postgres
+    duckdb = None
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = os.getenv("DATASOURCE_SNAPSHOT_DIR", "/tmp/datasource_snapshots")
+# Snapshots older than this are exported again
+SNAPSHOT_TTL_SECONDS = float(os.getenv("DATASOURCE_SNAPSHOT_TTL", str(24 * 3600)))
+EXPORT_BATCH_ROWS = 100_000
+MANIFEST = "manifest.json"
+
+TABLES_QUERY = """
+    SELECT table_name FROM information_schema.tables
+    WHERE table_schema = 'public' AND table_type = 'BASE TABLE'
+    ORDER BY table_name
+"""
+COLUMNS_QUERY = """
+    SELECT column_name, data_type, numeric_precision, numeric_scale
+    FROM information_schema.columns
+    WHERE table_schema = 'public' AND table_name = %s
+    ORDER BY ordinal_position
+"""
+# Only plain reads are answered from the snapshot
+READ_ONLY_RE = re.compile(r"^\s*(?:select|with)\b", re.I)
+
+PG_TO_DUCKDB = {
+    "smallint": "SMALLINT",
+    "integer": "INTEGER",
+    "bigint": "BIGINT",
+    "real": "REAL",
+    "double precision": "DOUBLE",
+    "boolean": "BOOLEAN",
+    "date": "DATE",
+    "timestamp without time zone": "TIMESTAMP",
+    "timestamp with time zone": "TIMESTAMPTZ",
+}
+
+QueryResult = tuple[list[str], list[tuple]]
+
+
+class SnapshotUnsupported(Exception):
+    """The embedded engine cannot answer this query; run it on Postgres instead."""
+
+
+def _duckdb_type(data_type: str, precision: Optional[int], scale: Optional[int]) -> str:
+    if data_type == "numeric":
+        return f"DECIMAL({min(precision or 18, 38)},{scale or 0})" if precision else "DOUBLE"
+    if data_type == "ARRAY":
+        return "VARCHAR[]"
+    return PG_TO_DUCKDB.get(data_type, "VARCHAR")
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+class DataSnapshot:
+    """
+    Read-only copy of a data source's tables as Parquet files, queried in-process with DuckDB.
+
+    The files are exported once per TTL (under a file lock, so one worker exports and the others reuse them) and
+    attached as views; DuckDB reads them through the OS page cache, which every worker process shares. Queries
+    DuckDB cannot parse or bind raise SnapshotUnsupported so the caller can fall back to Postgres.
+    """
+
+    def __init__(self, name: str, directory: Optional[str] = None):
+        self.name = name
+        self.directory = directory or os.path.join(SNAPSHOT_DIR, name)
+        self._conn = None
+        self.tables: list[str] = []
+        self.exported_at = 0.0
+
+    def is_fresh(self) -> bool:
+        manifest = self._read_manifest()
+        return manifest is not None and time.time() - manifest["exportedAt"] < SNAPSHOT_TTL_SECONDS
+
+    def _read_manifest(self) -> Optional[dict]:
+        try:
+            with open(os.path.join(self.directory, MANIFEST), "r") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def export(self, query_postgres: Callable[..., QueryResult], connection) -> None:
+        """
+        Export every public table of the source to <directory>/<table>.parquet, unless a fresh export exists.
+        `query_postgres` runs catalogue queries; `connection` is a context manager lending a psycopg2 connection
+        for streaming the table rows.
+        """
+        os.makedirs(os.path.dirname(self.directory) or ".", exist_ok=True)
+        with open(f"{self.directory}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if self.is_fresh():
+                return
+            started = time.perf_counter()
+            staging = f"{self.directory}.tmp-{os.getpid()}"
+            shutil.rmtree(staging, ignore_errors=True)
+            os.makedirs(staging)
+            con = duckdb.connect(":memory:")
+            try:
+                tables = [row[0] for row in query_postgres(TABLES_QUERY)[1]]
+                for table in tables:
+                    self._export_table(con, query_postgres, connection, table, staging)
+            finally:
+                con.close()
+            with open(os.path.join(staging, MANIFEST), "w") as file:
+                json.dump({"tables": tables, "exportedAt": time.time()}, file)
+            shutil.rmtree(self.directory, ignore_errors=True)
+            os.replace(staging, self.directory)
+            logger.info(f"Exported {len(tables)} tables of {self.name} to {self.directory} in {time.perf_counter() - started:.1f}s")
+
+    def _export_table(self, con, query_postgres, connection, table: str, staging: str) -> None:
+        _, columns = query_postgres(COLUMNS_QUERY, (table,))
+        names = [column[0] for column in columns]
+        con.execute(f"CREATE TABLE {_quote(table)} ({', '.join(f'{_quote(n)} {_duckdb_type(*c[1:])}' for n, c in zip(names, columns))})")
+        with connection() as conn:
+            # Named (server-side) cursors only exist inside a transaction; pooled connections are in autocommit mode
+            autocommit = conn.autocommit
+            conn.autocommit = False
+            try:
+                # Named cursor: rows are streamed from the server in batches instead of loaded at once
+                with conn.cursor(name=f"snapshot_{table}") as cur:
+                    cur.itersize = EXPORT_BATCH_ROWS
+                    cur.execute(f"SELECT {', '.join(_quote(n) for n in names)} FROM {_quote(table)}")
+                    while True:
+                        rows = cur.fetchmany(EXPORT_BATCH_ROWS)
+                        if not rows:
+                            break
+                        batch = pd.DataFrame.from_records(rows, columns=names)
+                        con.register("batch", batch)
+                        con.execute(f"INSERT INTO {_quote(table)} SELECT * FROM batch")
+                        con.unregister("batch")
+            finally:
+                # Read-only export: nothing to commit
+                conn.rollback()
+                conn.autocommit = autocommit
+        path = os.path.join(staging, f"{table}.parquet")
+        con.execute(f"COPY {_quote(table)} TO '{path}' (FORMAT parquet, COMPRESSION zstd)")
+        con.execute(f"DROP TABLE {_quote(table)}")
+
+    def open(self) -> "DataSnapshot":
+        manifest = self._read_manifest()
+        if manifest is None:
+            raise FileNotFoundError(f"No snapshot of {self.name} in {self.directory}")
+        conn = duckdb.connect(":memory:")
+        # Postgres semantics for integer / integer
+        conn.execute("SET GLOBAL integer_division = true")
+        for table in manifest["tables"]:
+            path = os.path.join(self.directory, f"{table}.parquet")
+            conn.execute(f"CREATE VIEW {_quote(table)} AS SELECT * FROM read_parquet('{path}')")
+        self._conn, self.tables, self.exported_at = conn, manifest["tables"], manifest["exportedAt"]
+        return self
+
+    def query(self, sql: str) -> QueryResult:
+        if not READ_ONLY_RE.match(sql):
+            raise SnapshotUnsupported("not a read-only query")
+        # A cursor is an independent connection to the same database, safe to use from this thread
+        cur = self._conn.cursor()
+        try:
+            cur.execute(sql)
+            colnames = [desc[0] for desc in cur.description] if cur.description else []
+            return colnames, cur.fetchall() if cur.description else []
+        except duckdb.Error as e:
+            # Anything the embedded engine rejects or fails on (syntax, functions, casts) is retried on Postgres
+            raise SnapshotUnsupported(str(e)) from e
+        finally:
+            cur.close()
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class SnapshotLoader:
+    """Builds a source's snapshot in a background thread; until it is ready queries go to Postgres."""
+
+    def __init__(self, snapshot: DataSnapshot):
+        self.snapshot = snapshot
+        self.ready: Optional[DataSnapshot] = None
+        self.failed = False
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self, query_postgres, connection) -> None:
+        with self._lock:
+            if self._thread is not None or duckdb is None:
+                return
+            self._thread = threading.Thread(
+                target=self._build, args=(query_postgres, connection), name=f"snapshot-{self.snapshot.name}", daemon=True
+            )
+            self._thread.start()
+
+    def _build(self, query_postgres, connection) -> None:
+        try:
+            self.snapshot.export(query_postgres, connection)
+            self.ready = self.snapshot.open()
+        except Exception as e:
+            self.failed = True
+            logger.error(f"Snapshot of {self.snapshot.name} failed, queries stay on Postgres: {e}")
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[DataSnapshot]:
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.ready
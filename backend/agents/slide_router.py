@@ -0,0 +1,121 @@
+import logging
+import os
+import re
+from enum import Enum
+from pathlib import Path
+from typing import Optional
+
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+SLIDE_NAMESPACE = "http://www.complonkers-hackathon/slidedeck"
+SLIDE_SCHEMA_PATH = Path(__file__).parents[2] / "schemas" / "single_slide_schema.xsd"
+
+# A slide naming at most this many figures (and no chart) is handled by the light model
+LIGHT_MAX_METRICS = int(os.getenv("SLIDE_ROUTER_LIGHT_MAX_METRICS", "1"))
+
+
+class SlideRoute(str, Enum):
+    TEMPLATE = "template"  # no data needed, rendered deterministically
+    LIGHT = "light"        # a single aggregate, handled by the faster model
+    FULL = "full"          # charts or several queries, handled by the strong model
+
+
+# Where a slide goes when its route produced invalid XML
+ESCALATION = {
+    SlideRoute.TEMPLATE: SlideRoute.FULL,
+    SlideRoute.LIGHT: SlideRoute.FULL,
+    SlideRoute.FULL: None,
+}
+
+NO_DATA_RE = re.compile(r"^\s*(none|n/?a|no data( needed| required)?|not applicable|-)?\s*\.?\s*$", re.IGNORECASE)
+CHART_HINTS_RE = re.compile(
+    r"\b(chart|graph|plot|trend|over time|breakdown|distribution|compar\w*|versus|vs\.?|ranking|top \d+|"
+    r"by (month|year|quarter|week|day|country|genre|artist|customer|category|region)|per \w+|each \w+)\b",
+    re.IGNORECASE,
+)
+METRIC_HINTS_RE = re.compile(
+    r"\b(total|count|number of|average|mean|sum|median|maximum|minimum|highest|lowest|percentage|share|rate|"
+    r"revenue|sales|growth)\b",
+    re.IGNORECASE,
+)
+CLAUSE_SPLIT_RE = re.compile(r",|;|\band\b|\bas well as\b|\n", re.IGNORECASE)
+
+
+def count_metrics(insights: str) -> int:
+    """Number of separately listed figures, e.g. "total revenue, average invoice and customer count" -> 3."""
+    return sum(1 for clause in CLAUSE_SPLIT_RE.split(insights) if METRIC_HINTS_RE.search(clause))
+
+
+def classify_slide_idea(slide_idea) -> SlideRoute:
+    """
+    Pick a route for a SlideIdea from its DataInsights text, without calling a model.
+    """
+    insights = slide_idea.findtext("{*}DataInsights") or ""
+    if NO_DATA_RE.match(insights):
+        return SlideRoute.TEMPLATE
+    if CHART_HINTS_RE.search(insights):
+        return SlideRoute.FULL
+    if count_metrics(insights) <= LIGHT_MAX_METRICS:
+        return SlideRoute.LIGHT
+    return SlideRoute.FULL
+
+
+def render_template_slide(slide_idea, slide_id: str) -> str:
+    """
+    Build a title + description slide straight from the SlideIdea. `slide_id` is the id the workflow gives the
+    slide, which falls back to its position when the idea has no SlideId.
+    """
+    slide = etree.Element("Slide", id=slide_id, classes="bg-white p-8 flex flex-col justify-center")
+    parts = [
+        ("h1", "text-4xl font-bold mb-6 text-gray-800", slide_idea.findtext("{*}Title")),
+        ("p", "text-xl text-gray-600", slide_idea.findtext("{*}ContentDescription")),
+    ]
+    for tag, classes, text in parts:
+        if text and text.strip():
+            element = etree.SubElement(slide, "Text", mode="content", tag=tag, classes=classes)
+            etree.SubElement(element, "Content").text = text.strip()
+    return etree.tostring(slide, encoding="unicode", pretty_print=True)
+
+
+_slide_schema = None
+try:
+    _slide_schema = etree.XMLSchema(etree.parse(str(SLIDE_SCHEMA_PATH)))
+except (OSError, etree.XMLSchemaParseError, etree.XMLSyntaxError) as e:
+    logger.warning(f"Slide schema {SLIDE_SCHEMA_PATH} not available, validating structure only: {e}")
+
+SLIDE_RE = re.compile(r"<Slide\b.*</Slide>", re.DOTALL)
+
+
+def extract_valid_slide(result: Optional[str]) -> Optional[str]:
+    """
+    Return the Slide XML contained in an agent result, or None when there is none or it does not validate.
+    """
+    if not result:
+        return None
+    match = SLIDE_RE.search(result)
+    if match is None:
+        return None
+    xml = match.group(0)
+    try:
+        slide = etree.fromstring(xml.encode("utf-8"))
+    except etree.XMLSyntaxError:
+        return None
+    if not slide.get("id") or len(slide) == 0 or "[[chart-" in xml:
+        return None
+    if any(chart.get("ref") for chart in slide.iter("{*}Chart", "Chart")):
+        return None
+    if _slide_schema is not None and not _slide_schema.validate(_with_namespace(slide)):
+        logger.info(f"Slide failed schema validation: {_slide_schema.error_log.last_error}")
+        return None
+    return xml
+
+
+def _with_namespace(slide):
+    # Models usually omit the namespace, the schema requires it
+    slide = etree.fromstring(etree.tostring(slide))
+    for element in slide.iter():
+        if isinstance(element.tag, str) and not element.tag.startswith("{"):
+            element.tag = f"{{{SLIDE_NAMESPACE}}}{element.tag}"
+    return slide
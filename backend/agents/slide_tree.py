@@ -0,0 +1,159 @@
+import json
+import logging
+import re
+from typing import Any, Optional
+
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+NUMBER_RE = re.compile(r"^-?\d+(\.\d+)?$")
+# Attributes carried over as typed fields; `mode` is always "content" and is dropped
+COMPONENT_ATTRIBUTES = {
+    "Slide": ("id", "classes"),
+    "Text": ("id", "classes", "placeholder", "tag", "textComponentId"),
+    "Image": ("id", "classes", "placeholder", "alt", "width", "height"),
+    "List": ("id", "classes", "placeholder", "ordered"),
+    "Container": ("id", "classes", "placeholder"),
+    "Chart": ("id", "classes"),
+}
+CONTAINERS = ("Slide", "Container")
+
+
+def _local(tag) -> str:
+    return etree.QName(tag).localname if isinstance(tag, str) else ""
+
+
+def _typed(value: str):
+    if NUMBER_RE.match(value):
+        return float(value) if "." in value else int(value)
+    return value
+
+
+def _element_to_node(element) -> Optional[dict]:
+    kind = _local(element.tag)
+    if not kind:
+        return None  # comments and processing instructions
+    node: dict[str, Any] = {"type": kind}
+    for name in COMPONENT_ATTRIBUTES.get(kind, tuple(element.attrib)):
+        value = element.get(name)
+        if value is not None and name != "mode":
+            node[name] = value in ("true", "1") if name == "ordered" else value
+    if kind == "Chart":
+        node["chartType"] = element.get("type", "bar")
+        node["data"] = [
+            {field.get("name"): _typed(field.get("value", "")) for field in row.iterfind("{*}Field")}
+            for row in element.iterfind("{*}Data/{*}Row")
+        ]
+    elif kind in CONTAINERS:
+        node["children"] = [child for child in map(_element_to_node, element) if child is not None]
+    else:
+        content = element.find("{*}Content")
+        text = content.text if content is not None else element.text
+        node["content"] = (text or "").strip()
+    return node
+
+
+def slide_to_tree(slide_xml: str, slide_id: Optional[str] = None) -> dict:
+    """
+    Parse validated Slide XML into the JSON component tree sent to clients:
+    Slide -> Text / Image / List / Chart / Container nodes with typed fields and numeric chart values.
+    `slide_id` is the outline's SlideId, which the Slide's own id attribute does not always match.
+    """
+    root = etree.fromstring(slide_xml.encode("utf-8"))
+    tree = _element_to_node(root)
+    if slide_id is not None:
+        tree["slideId"] = slide_id
+    return tree
+
+
+def outline_to_json(slide_ideas, slide_id_of) -> list[dict]:
+    """The SlideIdeas outline as a list of plain objects; `slide_id_of(idea, index)` names each slide."""
+    return [
+        {
+            "slideId": slide_id_of(idea, index),
+            "title": idea.findtext("{*}Title"),
+            "contentDescription": idea.findtext("{*}ContentDescription"),
+            "dataInsights": idea.findtext("{*}DataInsights"),
+        }
+        for index, idea in enumerate(slide_ideas)
+    ]
+
+
+def _pointer(path: str, key) -> str:
+    return f"{path}/{str(key).replace('~', '~0').replace('/', '~1')}"
+
+
+def json_patch(old: Any, new: Any, path: str = "") -> list[dict]:
+    """
+    RFC 6902 operations that turn `old` into `new`. Objects are diffed per key and lists per index
+    (extra items added or removed at the end), so an edited text or chart row becomes a single replace.
+    """
+    if type(old) is not type(new):
+        return [{"op": "replace", "path": path, "value": new}]
+    if isinstance(old, dict):
+        ops = []
+        for key in old:
+            if key not in new:
+                ops.append({"op": "remove", "path": _pointer(path, key)})
+            else:
+                ops += json_patch(old[key], new[key], _pointer(path, key))
+        ops += [{"op": "add", "path": _pointer(path, key), "value": new[key]} for key in new if key not in old]
+        return ops
+    if isinstance(old, list):
+        ops = []
+        for index in range(min(len(old), len(new))):
+            ops += json_patch(old[index], new[index], _pointer(path, index))
+        ops += [{"op": "add", "path": _pointer(path, "-"), "value": item} for item in new[len(old):]]
+        # Remove from the end so earlier indexes stay valid
+        ops += [{"op": "remove", "path": _pointer(path, index)} for index in range(len(old) - 1, len(new) - 1, -1)]
+        return ops
+    return [] if old == new else [{"op": "replace", "path": path, "value": new}]
+
+
+def apply_patch(document: Any, patch: list[dict]) -> Any:
+    """Apply add/remove/replace operations (the subset json_patch emits) to a copy of `document`."""
+    document = json.loads(json.dumps(document))
+    for op in patch:
+        if op["path"] == "":
+            document = op.get("value")
+            continue
+        *parents, last = [p.replace("~1", "/").replace("~0", "~") for p in op["path"].split("/")[1:]]
+        target = document
+        for part in parents:
+            target = target[int(part)] if isinstance(target, list) else target[part]
+        if isinstance(target, list):
+            if op["op"] == "add":
+                target.insert(len(target) if last == "-" else int(last), op["value"])
+            elif op["op"] == "remove":
+                del target[int(last)]
+            else:
+                target[int(last)] = op["value"]
+        elif op["op"] == "remove":
+            del target[last]
+        else:
+            target[last] = op["value"]
+    return document
+
+
+def slide_event(slide_xml: str, slide_id: str, previous_xml: Optional[str] = None) -> tuple[str, Optional[str]]:
+    """
+    The typed event for a published slide: ("slide", full tree) or, when it replaces `previous_xml`,
+    ("slide-patch", JSON patch against the previous tree) if that is smaller. Data is None if the XML does not parse.
+    """
+    try:
+        tree = slide_to_tree(slide_xml, slide_id)
+    except etree.XMLSyntaxError as e:
+        logger.warning(f"Slide {slide_id} could not be converted to a component tree: {e}")
+        return "slide", None
+    full = json.dumps(tree, separators=(",", ":"), ensure_ascii=False)
+    if previous_xml is not None:
+        try:
+            patch = json_patch(slide_to_tree(previous_xml, slide_id), tree)
+        except etree.XMLSyntaxError:
+            patch = None
+        if patch is not None:
+            delta = json.dumps({"slideId": slide_id, "patch": patch}, separators=(",", ":"), ensure_ascii=False)
+            if len(delta) < len(full):
+                return "slide-patch", delta
+    return "slide", full
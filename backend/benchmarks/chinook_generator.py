@@ -0,0 +1,392 @@
+"""
+Scaled synthetic Chinook datasets for data-size benchmarks.
+
+Reference data, tracks and customers of the seed are kept and more are added modelled on them; invoices and
+invoice lines are drawn from the seed's distributions (invoice dates, lines per invoice, track prices). A scale-100
+database answers the same questions as the seed one, just over 100x the rows. Data is streamed into PostgreSQL with COPY;
+primary keys, foreign keys and indexes are created after the load.
+
+    python -m benchmarks.chinook_generator --scale 100
+    python -m benchmarks.chinook_generator --scale 10000 --dbname chinook_big --drop
+    python -m benchmarks.chinook_generator --scale 10 --out /tmp/chinook_x10
+
+Register the result as a data source with DATASOURCES='{"chinook_x100": {"dbname": "chinook_x100",
+"schema_doc": "/app/agents/chinook.md"}}'.
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass
+from itertools import islice
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+import psycopg2
+
+logger = logging.getLogger(__name__)
+
+SEED_SQL = os.getenv(
+    "CHINOOK_SEED_SQL",
+    os.path.join(os.path.dirname(__file__), "..", "..", "db", "seed_scripts", "02-chinook.sql"),
+)
+# Invoices (with their lines) generated per batch; batches are reproducible so both tables can be streamed
+CHUNK_SIZE = 50_000
+# Copies of a seed track only differ by a jitter on duration and size
+DURATION_SIGMA = 0.15
+
+INSERT_RE = re.compile(r"^INSERT INTO (\w+) \(([^)]*)\) VALUES$")
+VALUE_RE = re.compile(r"N?'((?:[^']|'')*)'|(NULL)|(-?\d+(?:\.\d+)?)")
+CREATE_TABLE_RE = re.compile(r"CREATE TABLE (\w+)\s*\((.*?)\);", re.S)
+PRIMARY_KEY_RE = re.compile(r",\s*CONSTRAINT (\w+) PRIMARY KEY\s*\(([^)]*)\)")
+POST_LOAD_RE = re.compile(r"^(?:ALTER TABLE \w+ ADD CONSTRAINT.*?;|CREATE INDEX .*?;)", re.S | re.M)
+
+# Multiplicative hashing spreads generated rows over the seed rows they are modelled on, without storing a mapping
+_KNUTH = 2654435761
+
+
+@dataclass
+class SeedTable:
+    columns: list[str]
+    rows: list[tuple]
+
+
+@dataclass
+class ChinookSeed:
+    tables: dict[str, SeedTable]
+    # CREATE TABLE statements without their primary keys, and what is deferred until after the load
+    create_statements: list[str]
+    post_load_statements: list[str]
+
+    def column(self, table: str, name: str) -> list:
+        index = self.tables[table].columns.index(name)
+        return [row[index] for row in self.tables[table].rows]
+
+
+def _parse_value(match: re.Match):
+    text, null, number = match.groups()
+    if null:
+        return None
+    if number is not None:
+        return float(number) if "." in number else int(number)
+    return text.replace("''", "'")
+
+
+def load_seed(path: str = SEED_SQL) -> ChinookSeed:
+    """
+    Parse the schema and rows of the Chinook seed script.
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        script = file.read()
+
+    tables: dict[str, SeedTable] = {}
+    current: Optional[SeedTable] = None
+    for line in script.splitlines():
+        insert = INSERT_RE.match(line)
+        if insert:
+            name, columns = insert.group(1), [c.strip() for c in insert.group(2).split(",")]
+            current = tables.setdefault(name, SeedTable(columns, []))
+            continue
+        stripped = line.strip()
+        if current is not None and stripped.startswith("("):
+            current.rows.append(tuple(_parse_value(m) for m in VALUE_RE.finditer(stripped[1:])))
+            if stripped.endswith(";"):
+                current = None
+
+    create_statements, primary_keys = [], []
+    for name, body in CREATE_TABLE_RE.findall(script):
+        pk = PRIMARY_KEY_RE.search(body)
+        if pk:
+            body = body[:pk.start()] + body[pk.end():]
+            primary_keys.append(f"ALTER TABLE {name} ADD CONSTRAINT {pk.group(1)} PRIMARY KEY ({pk.group(2).strip()});")
+        create_statements.append(f"CREATE TABLE {name}\n({body.rstrip()}\n);")
+    post_load = primary_keys + [" ".join(s.split()) for s in POST_LOAD_RE.findall(script)]
+    return ChinookSeed(tables, create_statements, post_load)
+
+
+@dataclass
+class Cardinalities:
+    """Row counts of the generated tables; the seed rows are included."""
+    tracks: int
+    customers: int
+    invoices: int
+
+    @classmethod
+    def for_scale(cls, seed: ChinookSeed, scale: float) -> "Cardinalities":
+        return cls(
+            tracks=max(1, round(len(seed.tables["track"].rows) * scale)),
+            customers=max(1, round(len(seed.tables["customer"].rows) * scale)),
+            invoices=max(1, round(len(seed.tables["invoice"].rows) * scale)),
+        )
+
+
+def _template(ids: np.ndarray, count: int) -> np.ndarray:
+    """The seed row index a generated row is modelled on."""
+    return (ids.astype(np.uint64) * _KNUTH % count).astype(np.int64)
+
+
+def _cents(value) -> int:
+    return int(round(value * 100))
+
+
+def _money(cents: int) -> str:
+    return f"{cents // 100}.{cents % 100:02d}"
+
+
+class ChinookGenerator:
+    """
+    Produces the rows of every Chinook table for the given cardinalities. Output only depends on `seed_value`.
+    Reference tables (genres, media types, artists, albums, employees, playlists) are copied from the seed.
+    """
+
+    REFERENCE_TABLES = ("genre", "media_type", "artist", "album", "employee")
+
+    def __init__(self, seed: ChinookSeed, cardinalities: Cardinalities, seed_value: int = 0):
+        self.seed = seed
+        self.cardinalities = cardinalities
+        self.seed_value = seed_value
+
+        self._seed_tracks = seed.tables["track"].rows
+        self._track_price_cents = np.array([_cents(p) for p in seed.column("track", "unit_price")], dtype=np.int64)
+        self._seed_customers = seed.tables["customer"].rows
+
+        invoice_dates = [_parse_date(d) for d in seed.column("invoice", "invoice_date")]
+        self._first_day = min(invoice_dates)
+        self._days = int((max(invoice_dates) - self._first_day).astype(int)) + 1
+        lines_per_invoice = np.bincount(np.array(seed.column("invoice_line", "invoice_id")))
+        counts = lines_per_invoice[lines_per_invoice > 0]
+        values, frequency = np.unique(counts, return_counts=True)
+        self._line_counts = values
+        self._line_count_p = frequency / frequency.sum()
+
+    def _rng(self, *stream: int) -> np.random.Generator:
+        return np.random.default_rng([self.seed_value, *stream])
+
+    def tables(self) -> Iterator[tuple[str, list[str], Iterable[tuple]]]:
+        """Yield (table, columns, rows) in an order that satisfies the foreign keys."""
+        for name in self.REFERENCE_TABLES:
+            yield name, self.seed.tables[name].columns, self.seed.tables[name].rows
+        yield "customer", self.seed.tables["customer"].columns, self.customers()
+        yield "track", self.seed.tables["track"].columns, self.tracks()
+        yield "playlist", self.seed.tables["playlist"].columns, self.seed.tables["playlist"].rows
+        playlist_track = self.seed.tables["playlist_track"]
+        yield "playlist_track", playlist_track.columns, [r for r in playlist_track.rows if r[1] <= self.cardinalities.tracks]
+        yield "invoice", self.seed.tables["invoice"].columns, self.invoices()
+        yield "invoice_line", self.seed.tables["invoice_line"].columns, self.invoice_lines()
+
+    def tracks(self) -> Iterator[tuple]:
+        n_seed = len(self._seed_tracks)
+        yield from self._seed_tracks[:self.cardinalities.tracks]
+        for start in range(n_seed + 1, self.cardinalities.tracks + 1, CHUNK_SIZE):
+            ids = np.arange(start, min(start + CHUNK_SIZE, self.cardinalities.tracks + 1))
+            templates = _template(ids, n_seed)
+            jitter = self._rng(1, start).lognormal(0.0, DURATION_SIGMA, len(ids))
+            for track_id, template, factor in zip(ids.tolist(), templates.tolist(), jitter.tolist()):
+                _, name, album_id, media_type_id, genre_id, composer, ms, size, price = self._seed_tracks[template]
+                yield (track_id, f"{name} ({track_id})"[:200], album_id, media_type_id, genre_id, composer,
+                       max(1000, int(ms * factor)), None if size is None else int(size * factor), price)
+
+    def customers(self) -> Iterator[tuple]:
+        n_seed = len(self._seed_customers)
+        yield from self._seed_customers[:self.cardinalities.customers]
+        first_names = [row[1] for row in self._seed_customers]
+        last_names = [row[2] for row in self._seed_customers]
+        for start in range(n_seed + 1, self.cardinalities.customers + 1, CHUNK_SIZE):
+            ids = np.arange(start, min(start + CHUNK_SIZE, self.cardinalities.customers + 1))
+            rng = self._rng(2, start)
+            firsts = rng.integers(0, n_seed, len(ids)).tolist()
+            lasts = rng.integers(0, n_seed, len(ids)).tolist()
+            for customer_id, template, first, last in zip(ids.tolist(), _template(ids, n_seed).tolist(), firsts, lasts):
+                row = self._seed_customers[template]
+                # Location, company and support rep follow the seed customer this one is modelled on
+                yield (customer_id, first_names[first], last_names[last], *row[3:11],
+                       f"customer{customer_id}@example.com", row[12])
+
+    def _invoice_chunk(self, start: int, stop: int):
+        """Customer, day, line count and track IDs of invoices start..stop-1; the same for both tables."""
+        rng = self._rng(3, start)
+        size = stop - start
+        customers = rng.integers(1, self.cardinalities.customers + 1, size)
+        days = np.sort(rng.integers(0, self._days, size))
+        line_counts = rng.choice(self._line_counts, size, p=self._line_count_p)
+        tracks = rng.integers(1, self.cardinalities.tracks + 1, int(line_counts.sum()))
+        return customers, days, line_counts, tracks
+
+    def _track_prices(self, tracks: np.ndarray) -> np.ndarray:
+        n_seed = len(self._seed_tracks)
+        templates = np.where(tracks <= n_seed, tracks - 1, _template(tracks, n_seed))
+        return self._track_price_cents[templates]
+
+    def _chunks(self):
+        for start in range(1, self.cardinalities.invoices + 1, CHUNK_SIZE):
+            stop = min(start + CHUNK_SIZE, self.cardinalities.invoices + 1)
+            yield start, stop, self._invoice_chunk(start, stop)
+
+    def invoices(self) -> Iterator[tuple]:
+        for start, stop, (customers, days, line_counts, tracks) in self._chunks():
+            offsets = np.concatenate(([0], np.cumsum(line_counts)[:-1]))
+            totals = np.add.reduceat(self._track_prices(tracks), offsets) if len(tracks) else np.zeros(0, dtype=np.int64)
+            dates = (self._first_day + days.astype("timedelta64[D]")).astype(str)
+            for invoice_id, customer_id, date, total in zip(range(start, stop), customers.tolist(), dates.tolist(), totals.tolist()):
+                customer = self._customer_location(customer_id)
+                yield (invoice_id, customer_id, f"{date} 00:00:00", *customer, _money(total))
+
+    def _customer_location(self, customer_id: int) -> tuple:
+        n_seed = len(self._seed_customers)
+        index = customer_id - 1 if customer_id <= n_seed else int(_template(np.array([customer_id]), n_seed)[0])
+        # address, city, state, country, postal_code
+        return self._seed_customers[index][4:9]
+
+    def invoice_lines(self) -> Iterator[tuple]:
+        line_id = 1
+        for start, stop, (_, _, line_counts, tracks) in self._chunks():
+            invoice_ids = np.repeat(np.arange(start, stop), line_counts).tolist()
+            for invoice_id, track_id, price in zip(invoice_ids, tracks.tolist(), self._track_prices(tracks).tolist()):
+                yield line_id, invoice_id, track_id, _money(price), 1
+                line_id += 1
+
+
+def _parse_date(value: str) -> np.datetime64:
+    year, month, day = (int(part) for part in value.split()[0].split("/"))
+    return np.datetime64(f"{year:04d}-{month:02d}-{day:02d}", "D")
+
+
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def format_copy_row(row: tuple) -> str:
+    """One line of PostgreSQL COPY text format."""
+    return "\t".join("\\N" if value is None else str(value).translate(_COPY_ESCAPES) for value in row) + "\n"
+
+
+class CopyStream:
+    """File-like reader over rows, encoded on demand so COPY never needs the whole table in memory."""
+
+    def __init__(self, rows: Iterable[tuple], batch: int = 2000):
+        self._lines = map(format_copy_row, rows)
+        self._batch = batch
+        self._buffer = b""
+        self.rows = 0
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self._buffer) < size:
+            lines = list(islice(self._lines, self._batch))
+            if not lines:
+                break
+            self.rows += len(lines)
+            self._buffer += "".join(lines).encode("utf-8")
+        if size < 0:
+            data, self._buffer = self._buffer, b""
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def readline(self, size: int = -1) -> bytes:
+        return self.read(size)
+
+
+def bulk_load(generator: ChinookGenerator, conninfo: dict, dbname: str, drop: bool = False) -> dict[str, float]:
+    """
+    Create `dbname` and fill it with COPY; keys and indexes are built afterwards. Returns seconds per step.
+    """
+    timings: dict[str, float] = {}
+    admin = psycopg2.connect(**{**conninfo, "dbname": "postgres"})
+    admin.autocommit = True
+    try:
+        with admin.cursor() as cur:
+            if drop:
+                cur.execute(f'DROP DATABASE IF EXISTS "{dbname}"')
+            cur.execute(f'CREATE DATABASE "{dbname}"')
+    finally:
+        admin.close()
+
+    conn = psycopg2.connect(**{**conninfo, "dbname": dbname})
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SET synchronous_commit = off")
+            cur.execute("SET maintenance_work_mem = '512MB'")
+            for statement in generator.seed.create_statements:
+                cur.execute(statement)
+            for table, columns, rows in generator.tables():
+                started = time.perf_counter()
+                stream = CopyStream(rows)
+                cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", stream)
+                timings[f"copy {table}"] = time.perf_counter() - started
+                logger.info(f"Loaded {stream.rows} rows into {table} in {timings[f'copy {table}']:.2f}s")
+            started = time.perf_counter()
+            for statement in generator.seed.post_load_statements:
+                cur.execute(statement)
+            timings["keys and indexes"] = time.perf_counter() - started
+        conn.commit()
+        conn.autocommit = True
+        started = time.perf_counter()
+        with conn.cursor() as cur:
+            cur.execute("ANALYZE")
+        timings["analyze"] = time.perf_counter() - started
+    finally:
+        conn.close()
+    return timings
+
+
+def write_tsv(generator: ChinookGenerator, out_dir: str) -> dict[str, int]:
+    """
+    Write schema.sql (tables, then keys and indexes) plus one COPY text file per table, for loading elsewhere.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    counts = {}
+    with open(os.path.join(out_dir, "schema.sql"), "w", encoding="utf-8") as file:
+        file.write("\n\n".join(generator.seed.create_statements) + "\n")
+    for table, columns, rows in generator.tables():
+        with open(os.path.join(out_dir, f"{table}.tsv"), "w", encoding="utf-8") as file:
+            counts[table] = 0
+            for row in rows:
+                file.write(format_copy_row(row))
+                counts[table] += 1
+    with open(os.path.join(out_dir, "post_load.sql"), "w", encoding="utf-8") as file:
+        file.write("\n".join(generator.seed.post_load_statements) + "\n")
+    return counts
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1], formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=10.0, help="multiplier for tracks, customers and invoices")
+    parser.add_argument("--tracks", type=int, help="override the number of tracks")
+    parser.add_argument("--customers", type=int, help="override the number of customers")
+    parser.add_argument("--invoices", type=int, help="override the number of invoices")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--seed-sql", default=SEED_SQL, help="Chinook seed script to model the data on")
+    parser.add_argument("--dbname", help="database to create (default chinook_x<scale>)")
+    parser.add_argument("--drop", action="store_true", help="drop the database first if it exists")
+    parser.add_argument("--out", help="write schema and COPY files to this directory instead of loading them")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    seed = load_seed(args.seed_sql)
+    cardinalities = Cardinalities.for_scale(seed, args.scale)
+    for name in ("tracks", "customers", "invoices"):
+        if getattr(args, name):
+            setattr(cardinalities, name, getattr(args, name))
+    generator = ChinookGenerator(seed, cardinalities, args.seed)
+    logger.info(f"Generating {cardinalities}")
+
+    started = time.perf_counter()
+    if args.out:
+        counts = write_tsv(generator, args.out)
+        logger.info(f"Wrote {sum(counts.values())} rows to {args.out} in {time.perf_counter() - started:.1f}s")
+        return
+    dbname = args.dbname or f"chinook_x{args.scale:g}".replace(".", "_")
+    conninfo = {
+        "host": os.getenv("POSTGRES_HOST", "localhost"),
+        "port": int(os.getenv("POSTGRES_PORT", "5432")),
+        "user": os.getenv("POSTGRES_USER", "postgres"),
+        "password": os.getenv("POSTGRES_PASSWORD", "postgres"),
+    }
+    timings = bulk_load(generator, conninfo, dbname, args.drop)
+    logger.info(f"Loaded {dbname} in {time.perf_counter() - started:.1f}s: " + json.dumps({k: round(v, 2) for k, v in timings.items()}))
+    logger.info(f'Register it with DATASOURCES=\'{{"{dbname}": {{"dbname": "{dbname}"}}}}\'')
+
+
+if __name__ == "__main__":
+    main()
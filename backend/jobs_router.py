@@ -1,13 +1,31 @@
 import uuid
 import json
 import logging
+import time
+from typing import Optional
 
 from fastapi import APIRouter, BackgroundTasks, Request, HTTPException
 from pydantic import BaseModel
-from starlette.responses import StreamingResponse
+from starlette.responses import JSONResponse, Response, StreamingResponse
 
-from redis_utils.redis_stream import publish_message, listen_stream
-from run_agent_workflow import run_agent_workflow
+from agent_utils.call_policy import agent_call_metrics, hedge_budget
+from agent_utils.context_budget import context_budget_metrics
+from agent_utils.log_config import payload, set_logging
+from agent_utils.loop_monitor import loop_monitor
+from agent_utils.metrics import slide_route_metrics
+from agent_utils.profiling import load_profile
+from agent_utils.scheduler import Priority, job_scheduler, slide_scheduler
+from agent_utils.sse import SSE_COMPRESSION, SSEEncoder, batched, negotiate_encoding, sse_metrics
+from agent_utils.usage import load_job_usage, usage_tracker
+from agents.services.datasources import datasource_registry
+from agents.services.semantic_cache import semantic_slide_cache
+from agent_utils.workflow_dag import INPUTS_FIELD, checkpoint_store
+from redis_utils.deck_store import load_deck
+from redis_utils.job_state import JobCancelledError, init_batch, init_job, get_batch_status, get_job_status, is_job_active, request_cancel
+from redis_utils.redis_stream import publish_message, flush_messages
+from redis_utils.stream_hub import stream_hub
+from agent_utils.batch import batch_stream_id
+from run_agent_workflow import run_agent_workflow, run_batch, find_slide_idea, regenerate_slide, variant_job_id
 
 logger = logging.getLogger(__name__)
 
@@ -17,10 +35,30 @@ router = APIRouter(prefix="/api")
 class JobCreateRequest(BaseModel):
     prompt: str
     audiences: list[str]
+    # Optional wall-clock budget; slides not started before it expires are skipped
+    deadlineSeconds: Optional[float] = None
+    # Build a separate deck per audience, sharing interpretation and query results
+    variantMode: bool = False
+    # Stop further agent tool loops once the job has used this many prompt + completion tokens
+    tokenBudget: Optional[int] = None
+    # Name of the database to analyse (see GET /api/datasources); the default source when omitted
+    datasource: Optional[str] = None
+    # User or team the job is scheduled for; tenants share capacity fairly
+    tenant: Optional[str] = None
+    # "interactive" jobs are admitted before "batch" ones and have reserved capacity
+    priority: Priority = Priority.INTERACTIVE
+    # Profile this job (cProfile plus tracemalloc per stage); see GET /api/jobs/{jobId}/profile
+    profile: bool = False
+
+
+class JobVariant(BaseModel):
+    audience: str
+    jobId: str
 
 
 class JobCreateResponse(BaseModel):
     jobId: str
+    variants: Optional[list[JobVariant]] = None
 
 
 @router.post("/jobs", response_model=JobCreateResponse)
@@ -28,38 +66,354 @@ async def create_job(request: JobCreateRequest, background_tasks: BackgroundTask
     """
     Create a new job for generating a presentation.
     """
-    print(f"request={request}")
+    logger.info("Creating job: %s", payload(request))
+    if request.datasource is not None and request.datasource not in datasource_registry:
+        raise HTTPException(status_code=400, detail=f"Unknown datasource {request.datasource}")
     job_id = str(uuid.uuid4())
+    deadline_at = time.time() + request.deadlineSeconds if request.deadlineSeconds else None
+    await init_job(job_id, deadline_at, request.tokenBudget)
     # Kick off multi-agent workflow in background using only request data
     background_tasks.add_task(
         run_agent_workflow,
         job_id,
         request.prompt,
-        request.audiences
+        request.audiences,
+        deadline_at,
+        request.variantMode,
+        request.tokenBudget,
+        request.datasource,
+        request.tenant,
+        request.priority.value,
+        request.profile
     )
+    if request.variantMode:
+        # Each variant streams on /api/events/{variant jobId} and is stored as its own deck
+        variants = [
+            {"audience": audience, "jobId": variant_job_id(job_id, index)}
+            for index, audience in enumerate(request.audiences)
+        ]
+        return {"jobId": job_id, "variants": variants}
     return {"jobId": job_id}
 
 
+class BatchCreateRequest(BaseModel):
+    jobs: list[JobCreateRequest]
+    # Applies to jobs without their own tenant
+    tenant: Optional[str] = None
+    # Priority of the jobs that do not set their own; batches yield to interactive jobs by default
+    priority: Priority = Priority.BATCH
+
+
+class BatchCreateResponse(BaseModel):
+    batchId: str
+    jobs: list[JobCreateResponse]
+    # SSE stream with a "batch-progress" event per finished job
+    events: str
+
+
+@router.post("/jobs:batch", response_model=BatchCreateResponse)
+async def create_batch(request: BatchCreateRequest, background_tasks: BackgroundTasks):
+    """
+    Create several jobs as one unit of work. The jobs run as usual (each with its own events, status and deck)
+    but share query results, and identical interpreter and architect calls are made once for the whole batch.
+    """
+    if not request.jobs:
+        raise HTTPException(status_code=400, detail="A batch needs at least one job")
+    for job in request.jobs:
+        if job.datasource is not None and job.datasource not in datasource_registry:
+            raise HTTPException(status_code=400, detail=f"Unknown datasource {job.datasource}")
+    batch_id = str(uuid.uuid4())
+    jobs, created = [], []
+    for job in request.jobs:
+        job_id = str(uuid.uuid4())
+        deadline_at = time.time() + job.deadlineSeconds if job.deadlineSeconds else None
+        await init_job(job_id, deadline_at, job.tokenBudget)
+        jobs.append({
+            "subject_id": job_id,
+            "prompt": job.prompt,
+            "audiences": job.audiences,
+            "deadline_at": deadline_at,
+            "variant_mode": job.variantMode,
+            "token_budget": job.tokenBudget,
+            "datasource": job.datasource,
+            "tenant": job.tenant or request.tenant,
+            "priority": (job.priority if "priority" in job.model_fields_set else request.priority).value,
+            "profile": job.profile,
+        })
+        response = {"jobId": job_id}
+        if job.variantMode:
+            response["variants"] = [
+                {"audience": audience, "jobId": variant_job_id(job_id, index)}
+                for index, audience in enumerate(job.audiences)
+            ]
+        created.append(response)
+    await init_batch(batch_id, [job["subject_id"] for job in jobs])
+    background_tasks.add_task(run_batch, batch_id, jobs)
+    return {"batchId": batch_id, "jobs": created, "events": f"/api/events/{batch_stream_id(batch_id)}"}
+
+
+@router.get("/batches/{batch_id}")
+async def batch_status(batch_id: str):
+    """
+    Return the jobs of a batch with their states and how many have finished.
+    """
+    status = await get_batch_status(batch_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Unknown batch {batch_id}")
+    return status
+
+
+@router.get("/jobs/{job_id}/status")
+async def job_status(job_id: str):
+    """
+    Return the state of a job: queued, running (with slide n of m), done, failed or cancelled.
+    """
+    status = await get_job_status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return status
+
+
+@router.get("/jobs/{job_id}/usage")
+async def job_usage(job_id: str):
+    """
+    Token usage of a job: prompt, completion and cached tokens, tool calls and model calls, in total and per agent and slide.
+    """
+    usage = await load_job_usage(job_id)
+    if usage is None:
+        raise HTTPException(status_code=404, detail=f"No usage recorded for job {job_id}")
+    status = await get_job_status(job_id)
+    if status and "tokenBudget" in status:
+        usage["tokenBudget"] = status["tokenBudget"]
+    return {"jobId": job_id, **usage}
+
+
+@router.get("/jobs/{job_id}/profile")
+async def job_profile(job_id: str):
+    """
+    Profile summary of a job created with profile=true: the slowest functions by cumulative time and, per stage,
+    duration, traced memory and the lines that allocated the most.
+    """
+    summary = await load_profile(job_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail=f"No profile recorded for job {job_id}")
+    return JSONResponse(json.loads(summary))
+
+
+@router.get("/jobs/{job_id}/profile.pstats")
+async def job_profile_stats(job_id: str):
+    """
+    The job's full profile as a pstats file, for `python -m pstats` or a viewer such as snakeviz.
+    """
+    stats = await load_profile(job_id, "pstats")
+    if stats is None:
+        raise HTTPException(status_code=404, detail=f"No profile recorded for job {job_id}")
+    headers = {"Content-Disposition": f'attachment; filename="{job_id}.pstats"'}
+    return Response(stats, media_type="application/octet-stream", headers=headers)
+
+
+@router.delete("/jobs/{job_id}", status_code=202)
+async def cancel_job(job_id: str):
+    """
+    Cancel a job. A queued job or slide is dropped at once; running work stops at its next agent event.
+    """
+    cancelled = await request_cancel(job_id)
+    if cancelled is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    if not cancelled:
+        status = await get_job_status(job_id)
+        raise HTTPException(status_code=409, detail=f"Job {job_id} already {status['state']}")
+    # Work of the job still waiting for a slot leaves the queues now instead of when it would have been admitted
+    error = JobCancelledError(f"Job {job_id} was cancelled")
+    job_scheduler.withdraw(job_id, error)
+    slide_scheduler.withdraw(job_id, error)
+    return {"jobId": job_id, "state": "cancelled"}
+
+
+@router.post("/jobs/{job_id}/retry", status_code=202)
+async def retry_job(job_id: str, background_tasks: BackgroundTasks, force: bool = False):
+    """
+    Re-run a failed or cancelled job. Stages (and slides) that already finished are restored from their
+    checkpoints instead of being regenerated.
+    """
+    inputs = await checkpoint_store.get(job_id, INPUTS_FIELD)
+    if inputs is None:
+        raise HTTPException(status_code=404, detail=f"No checkpoints for job {job_id}")
+    status = await get_job_status(job_id)
+    if status and status.get("state") in ("queued", "running") and not force:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is still {status['state']}")
+    if is_job_active(job_id):
+        # A cancelled run only stops at its next agent event; both runs must not share the job
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is still stopping, retry once it has finished")
+    deadline_at = inputs.get("deadline_at")
+    if deadline_at is not None and deadline_at <= time.time():
+        # The original budget is spent; a retry runs to completion
+        deadline_at = None
+    await init_job(job_id, deadline_at, inputs.get("token_budget"))
+    background_tasks.add_task(
+        run_agent_workflow,
+        job_id,
+        inputs["prompt"],
+        inputs["audiences"],
+        deadline_at,
+        inputs.get("variant_mode", False),
+        inputs.get("token_budget"),
+        inputs.get("datasource"),
+        inputs.get("tenant"),
+        inputs.get("priority", Priority.INTERACTIVE.value),
+        inputs.get("profile", False)
+    )
+    return {"jobId": job_id, "state": "queued"}
+
+
+@router.post("/jobs/{job_id}/slides/{slide_id}/regenerate", status_code=202)
+async def regenerate_job_slide(job_id: str, slide_id: str, background_tasks: BackgroundTasks):
+    """
+    Rebuild one slide of a finished job, reusing its interpreter plan, outline and cached query results.
+    The new slide is published to the job's event stream and replaces the old one in the stored deck.
+    """
+    status = await get_job_status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    if status.get("state") in ("queued", "running", "cancelled"):
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is {status['state']}")
+    if await find_slide_idea(job_id, slide_id) is None:
+        raise HTTPException(status_code=404, detail=f"No slide {slide_id} in the outline of job {job_id}")
+    background_tasks.add_task(regenerate_slide, job_id, slide_id)
+    return {"jobId": job_id, "slideId": slide_id}
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(request: Request, job_id: str):
+    """
+    Return the summary of a finished deck.
+    """
+    deck = await load_deck(job_id, with_body=False)
+    if deck is None:
+        raise HTTPException(status_code=404, detail=f"No finished deck for job {job_id}")
+    headers = {"ETag": deck.etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request, deck.etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse({**deck.summary, "status": "done"}, headers=headers)
+
+
+@router.get("/jobs/{job_id}/deck")
+async def get_job_deck(request: Request, job_id: str):
+    """
+    Return a finished deck (SlideIdeas plus slide XMLs) with one read. Supports conditional GET via ETag,
+    and serves the stored gzip body as is to clients that accept gzip.
+    """
+    deck = await load_deck(job_id)
+    if deck is None:
+        raise HTTPException(status_code=404, detail=f"No finished deck for job {job_id}")
+    gzipped = negotiate_encoding(request.headers.get("accept-encoding", "")) == "gzip"
+    # The gzip and identity bodies are different representations, so each gets its own strong ETag
+    etag = deck.etag[:-1] + '-gz"' if gzipped else deck.etag
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    if gzipped:
+        return Response(
+            content=deck.body,
+            media_type="application/json",
+            headers={**headers, "Content-Encoding": "gzip"},
+        )
+    return JSONResponse(deck.document(), headers=headers)
+
+
 @router.get("/events/{job_id}")
-async def events(request: Request, job_id: str):
+async def events(request: Request, job_id: str, format: str = "xml"):
     """
     Stream events from Redis for the given jobId via Server-Sent Events.
+
+    With format=json the outline and slides arrive as typed events instead of raw XML: `outline` (the slide ideas),
+    `slide` (the slide's JSON component tree) and `slide-patch` (a JSON patch against the slide sent before).
     """
+    if format not in ("xml", "json"):
+        raise HTTPException(status_code=400, detail=f"Unknown event format {format}")
     logger.info(f"Subscriber connected for job {job_id}")
+    encoding = negotiate_encoding(request.headers.get("accept-encoding", "")) if SSE_COMPRESSION else None
+
+    def frame(entry) -> str:
+        # Format as Server-Sent Events data frame
+        if format == "json" and entry.event:
+            return f"event: {entry.event}\ndata: {entry.data}\n\n"
+        return f"data: {entry.message}\n\n"
 
     async def event_generator():
-        print(f"Start SSE generator for job {job_id}")
+        logger.debug(f"Start SSE generator for job {job_id}")
+        encoder = SSEEncoder(encoding)
         # Send initial event to establish SSE connection
-        yield f"data: connected to job {job_id}\n\n"
-        async for msg in listen_stream(job_id):
-            if await request.is_disconnected():
-                logger.info(f"Client disconnected from /api/events/{job_id}")
-                break
-            # Format as Server-Sent Events data frame
-            yield f"data: {msg}\n\n"
+        yield encoder.encode(f"data: connected to job {job_id}\n\n")
+        # All viewers of a job share one Redis reader through the stream hub
+        async with stream_hub.subscribe(job_id) as subscription:
+            # Messages arriving close together go out as one (compressed, flushed) chunk
+            async for batch in batched(subscription.entries()):
+                if await request.is_disconnected():
+                    logger.info(f"Client disconnected from /api/events/{job_id}")
+                    break
+                yield encoder.encode("".join(frame(entry) for entry in batch), messages=len(batch))
+        yield encoder.close()
 
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
     # Stream back as text/event-stream
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+    return StreamingResponse(event_generator(), media_type="text/event-stream", headers=headers)
+
+
+@router.get("/datasources")
+async def list_datasources():
+    """
+    The databases jobs can be run against.
+    """
+    return {"datasources": datasource_registry.describe()}
+
+
+@router.get("/metrics")
+async def metrics():
+    """
+    In-process performance counters: latency and success rate per slide route and per agent, hedging outcomes,
+    queue depth and wait times of the job and slide schedulers, event loop lag with the stacks of recent stalls, and
+    how often agent prompts were trimmed to their context budgets.
+    """
+    return {
+        "slideRoutes": slide_route_metrics.snapshot(),
+        "agentCalls": agent_call_metrics.snapshot(),
+        "hedging": hedge_budget.snapshot(),
+        "tokenUsage": usage_tracker.agent_totals(),
+        "semanticCache": semantic_slide_cache.stats(),
+        "eventStreams": sse_metrics.snapshot(),
+        "scheduler": {"jobs": job_scheduler.snapshot(), "slides": slide_scheduler.snapshot()},
+        "eventLoop": loop_monitor.snapshot(),
+        "contextBudget": context_budget_metrics.snapshot(),
+    }
+
+
+class LoggingUpdateRequest(BaseModel):
+    # Logger name -> level, e.g. {"agent_utils.run_ai_agent": "DEBUG"}; "" is the root logger
+    levels: Optional[dict[str, str]] = None
+    # Log whole XML documents and agent events instead of truncated, hashed previews
+    fullPayloads: Optional[bool] = None
+
+
+@router.post("/logging")
+async def update_logging(body: LoggingUpdateRequest):
+    """
+    Change log levels and payload logging at runtime, e.g. to see full agent events of a misbehaving job.
+    """
+    try:
+        return set_logging(body.levels, body.fullPayloads)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 class PushDummyRequest(BaseModel):
@@ -75,6 +429,7 @@ async def push_dummy(body: PushDummyRequest):
     logger.info(f"POST /api/pushDummy called with jobId={body.jobId}, payload={body.payload}")
     try:
         await publish_message(body.jobId, json.dumps(body.payload))
+        await flush_messages(body.jobId)
         logger.info(f"Published dummy message to queue events:{body.jobId}")
         return {"status": "ok"}
     except Exception as e:
@@ -1,6 +1,13 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from agent_utils.log_config import configure_logging
+
+# Before the routers are imported, so every module logs through the queue from the start
+configure_logging()
+
 from jobs_router import router as jobs_router
+from agents.services.datasources import datasource_registry
+from agent_utils.loop_monitor import LOOP_MONITOR, loop_monitor
 
 app = FastAPI(
     title="FastAPI Backend",
@@ -20,6 +27,21 @@ app.add_middleware(
 # Include job creation and event streaming routes
 app.include_router(jobs_router)
 
+@app.on_event("startup")
+async def export_snapshots():
+    # Sources in snapshot mode export their tables in the background; queries use Postgres until it is ready
+    datasource_registry.prepare_snapshots()
+
+@app.on_event("startup")
+async def start_loop_monitor():
+    # Measures event loop lag and captures the stack of calls that block the loop (see /api/metrics)
+    if LOOP_MONITOR:
+        loop_monitor.start()
+
+@app.on_event("shutdown")
+async def stop_loop_monitor():
+    await loop_monitor.stop()
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to FastAPI Backend"}
@@ -0,0 +1,74 @@
+import gzip
+import hashlib
+import json
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from .redis_client import redis_binary_client
+
+DECK_TTL_SECONDS = 30 * 24 * 3600
+
+
+def deck_key(job_id: str) -> str:
+    return f"deck:{job_id}"
+
+
+@dataclass
+class StoredDeck:
+    etag: str
+    summary: dict
+    body: Optional[bytes] = None  # gzip-compressed JSON document
+
+    def document(self) -> dict:
+        return json.loads(gzip.decompress(self.body))
+
+
+def build_deck_record(job_id: str, slide_ideas_xml: str, slides: list[dict]) -> StoredDeck:
+    """
+    Assemble the final deck into one gzip-compressed JSON document plus a small summary.
+    """
+    document = {"jobId": job_id, "slideIdeas": slide_ideas_xml, "slides": slides}
+    raw = json.dumps(document, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    etag = '"' + hashlib.sha256(raw).hexdigest()[:32] + '"'
+    summary = {
+        "jobId": job_id,
+        "slideCount": len(slides),
+        "slideIds": [slide.get("slideId") for slide in slides],
+        "createdAt": time.time(),
+        "size": len(raw),
+    }
+    # mtime=0 keeps the compressed bytes deterministic for identical decks
+    return StoredDeck(etag=etag, summary=summary, body=gzip.compress(raw, compresslevel=6, mtime=0))
+
+
+async def save_deck(job_id: str, slide_ideas_xml: str, slides: list[dict]) -> StoredDeck:
+    """
+    Persist a finished deck under deck:{job_id} so it can be served with a single read.
+    """
+    record = build_deck_record(job_id, slide_ideas_xml, slides)
+    key = deck_key(job_id)
+    async with redis_binary_client.pipeline(transaction=True) as pipe:
+        pipe.hset(key, mapping={
+            "etag": record.etag,
+            "summary": json.dumps(record.summary),
+            "body": record.body,
+        })
+        pipe.expire(key, DECK_TTL_SECONDS)
+        await pipe.execute()
+    return record
+
+
+async def load_deck(job_id: str, with_body: bool = True) -> Optional[StoredDeck]:
+    """
+    Load a stored deck. With with_body=False only the ETag and summary are fetched.
+    """
+    fields = ["etag", "summary", "body"] if with_body else ["etag", "summary"]
+    values = await redis_binary_client.hmget(deck_key(job_id), fields)
+    if values[0] is None:
+        return None
+    return StoredDeck(
+        etag=values[0].decode(),
+        summary=json.loads(values[1]),
+        body=values[2] if with_body else None,
+    )
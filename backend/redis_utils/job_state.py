@@ -0,0 +1,181 @@
+import json
+import time
+from enum import Enum
+from typing import Optional
+
+from .redis_client import redis_client
+
+JOB_TTL_SECONDS = 7 * 24 * 3600
+# How often a running job re-reads its cancel flag from Redis
+CANCEL_POLL_INTERVAL = 1.0
+
+
+class JobState(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+TERMINAL_STATES = {JobState.DONE, JobState.FAILED, JobState.CANCELLED}
+
+
+class JobCancelledError(Exception):
+    """Raised inside a running workflow once its job has been cancelled."""
+
+
+def job_key(job_id: str) -> str:
+    return f"job:{job_id}"
+
+
+def batch_key(batch_id: str) -> str:
+    return f"batch:{batch_id}"
+
+
+# Only move a job forward if it is not already in a terminal state
+_TRANSITION_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], 'state')
+if current == 'done' or current == 'failed' or current == 'cancelled' then
+  return 0
+end
+redis.call('HSET', KEYS[1], unpack(ARGV))
+redis.call('EXPIRE', KEYS[1], %d)
+return 1
+""" % JOB_TTL_SECONDS
+_transition = redis_client.register_script(_TRANSITION_SCRIPT)
+
+_cancelled_jobs: set[str] = set()
+_last_cancel_check: dict[str, float] = {}
+# Jobs whose workflow is running in this process, from track_job until forget_job
+_active_jobs: set[str] = set()
+
+
+async def init_job(job_id: str, deadline_at: Optional[float] = None, token_budget: Optional[int] = None) -> None:
+    """
+    Register a new job in the queued state.
+    """
+    now = time.time()
+    fields = {"state": JobState.QUEUED.value, "createdAt": now, "updatedAt": now}
+    if deadline_at is not None:
+        fields["deadlineAt"] = deadline_at
+    if token_budget is not None:
+        fields["tokenBudget"] = token_budget
+    key = job_key(job_id)
+    await redis_client.hset(key, mapping=fields)
+    await redis_client.expire(key, JOB_TTL_SECONDS)
+    # A retried job starts uncancelled; a cancel seen by an earlier run must not stop the new one
+    _cancelled_jobs.discard(job_id)
+    _last_cancel_check.pop(job_id, None)
+
+
+async def init_batch(batch_id: str, job_ids: list[str]) -> None:
+    """Register a batch of jobs submitted together; each job keeps its own state."""
+    key = batch_key(batch_id)
+    await redis_client.hset(key, mapping={"jobIds": json.dumps(job_ids), "createdAt": time.time()})
+    await redis_client.expire(key, JOB_TTL_SECONDS)
+
+
+async def get_batch_status(batch_id: str) -> Optional[dict]:
+    """The batch's jobs with their states and how many jobs are in each state."""
+    fields = await redis_client.hgetall(batch_key(batch_id))
+    if not fields:
+        return None
+    jobs = [await get_job_status(job_id) or {"jobId": job_id} for job_id in json.loads(fields["jobIds"])]
+    counts: dict[str, int] = {}
+    for job in jobs:
+        state = job.get("state", JobState.QUEUED.value)
+        counts[state] = counts.get(state, 0) + 1
+    finished = sum(counts.get(state.value, 0) for state in TERMINAL_STATES)
+    return {
+        "batchId": batch_id,
+        "createdAt": float(fields["createdAt"]),
+        "total": len(jobs),
+        "finished": finished,
+        "states": counts,
+        "jobs": jobs,
+    }
+
+
+async def set_job_state(job_id: str, state: JobState, **fields) -> bool:
+    """
+    Move a job to a new state with optional extra fields. Terminal states are never left;
+    returns False when the job was already done, failed or cancelled.
+    """
+    args = ["state", state.value, "updatedAt", time.time()]
+    for name, value in fields.items():
+        args += [name, value]
+    changed = bool(await _transition(keys=[job_key(job_id)], args=args))
+    if changed and state in TERMINAL_STATES:
+        _last_cancel_check.pop(job_id, None)
+    return changed
+
+
+async def set_slide_progress(job_id: str, slide: int, slide_count: int) -> None:
+    await set_job_state(job_id, JobState.RUNNING, stage="slides", slide=slide, slideCount=slide_count)
+
+
+async def get_job_status(job_id: str) -> Optional[dict]:
+    fields = await redis_client.hgetall(job_key(job_id))
+    if not fields:
+        return None
+    status = {"jobId": job_id}
+    for name, value in fields.items():
+        if name in ("slide", "slideCount", "skippedSlides", "variantCount", "tokenBudget"):
+            status[name] = int(value)
+        elif name in ("createdAt", "updatedAt", "deadlineAt"):
+            status[name] = float(value)
+        else:
+            status[name] = value
+    return status
+
+
+async def request_cancel(job_id: str) -> Optional[bool]:
+    """
+    Mark a job as cancelled. Returns None for unknown jobs and False for jobs that already finished.
+    """
+    if not await redis_client.exists(job_key(job_id)):
+        return None
+    cancelled = await set_job_state(job_id, JobState.CANCELLED)
+    if cancelled:
+        _cancelled_jobs.add(job_id)
+    return cancelled
+
+
+async def is_cancelled(job_id: str) -> bool:
+    """
+    Cooperative cancellation check. Jobs cancelled in this process are seen immediately,
+    others within CANCEL_POLL_INTERVAL seconds.
+    """
+    if job_id in _cancelled_jobs:
+        return True
+    now = time.monotonic()
+    if now - _last_cancel_check.get(job_id, 0.0) < CANCEL_POLL_INTERVAL:
+        return False
+    _last_cancel_check[job_id] = now
+    if await redis_client.hget(job_key(job_id), "state") == JobState.CANCELLED.value:
+        _cancelled_jobs.add(job_id)
+        return True
+    return False
+
+
+def track_job(job_id: str) -> None:
+    """Record that a workflow of the job is running in this process, until forget_job."""
+    _active_jobs.add(job_id)
+
+
+def is_job_active(job_id: str) -> bool:
+    """Whether a workflow of the job is still running (or stopping after a cancel) in this process."""
+    return job_id in _active_jobs
+
+
+def forget_job(job_id: str) -> None:
+    """Drop the in-process cancellation bookkeeping of a finished workflow."""
+    _active_jobs.discard(job_id)
+    _cancelled_jobs.discard(job_id)
+    _last_cancel_check.pop(job_id, None)
+
+
+async def raise_if_cancelled(job_id: str) -> None:
+    if await is_cancelled(job_id):
+        raise JobCancelledError(f"Job {job_id} was cancelled")
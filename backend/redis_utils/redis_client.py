@@ -4,6 +4,28 @@ import redis.asyncio as redis
 # Read Redis connection URL from environment
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 
+# Connection pool tuning
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "64"))
+REDIS_SOCKET_KEEPALIVE = os.getenv("REDIS_SOCKET_KEEPALIVE", "true").lower() in ("1", "true", "yes")
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30"))
+REDIS_RETRY_ON_TIMEOUT = os.getenv("REDIS_RETRY_ON_TIMEOUT", "true").lower() in ("1", "true", "yes")
+
+
+def _create_client(decode_responses: bool) -> redis.Redis:
+    # No socket_timeout: blocking XREADs in the stream hub must be able to wait longer than any fixed timeout
+    return redis.from_url(
+        REDIS_URL,
+        decode_responses=decode_responses,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        socket_keepalive=REDIS_SOCKET_KEEPALIVE,
+        health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+        retry_on_timeout=REDIS_RETRY_ON_TIMEOUT,
+    )
+
+
 # Create a single async Redis client instance
 global redis_client
-redis_client = redis.from_url(REDIS_URL, decode_responses=True) 
\ No newline at end of file
+redis_client = _create_client(decode_responses=True)
+
+# Client for binary values (compressed records) that must not be decoded
+redis_binary_client = _create_client(decode_responses=False)
@@ -1,17 +1,86 @@
-from typing import AsyncGenerator
+import asyncio
+import logging
+import os
+from typing import AsyncGenerator, Optional
+
+from agent_utils.log_config import payload
 
 from .redis_client import redis_client
 
+logger = logging.getLogger(__name__)
+
+# Messages of a job are coalesced and written with one pipelined round trip per batch
+PUBLISH_FLUSH_INTERVAL = float(os.getenv("PUBLISH_FLUSH_INTERVAL", "0.05"))
+PUBLISH_BATCH_SIZE = int(os.getenv("PUBLISH_BATCH_SIZE", "50"))
+
+_pending: dict[str, list[dict]] = {}
+_flush_locks: dict[str, asyncio.Lock] = {}
+_flush_timers: dict[str, asyncio.Task] = {}
+
 
-async def publish_message(job_id: str, message: str) -> None:
+async def publish_message(job_id: str, message: str, event: Optional[str] = None, data: Optional[str] = None) -> None:
     """
     Publish a message to the Redis stream for the given job.
+
+    `event` and `data` add a typed form of the message (an SSE event name and its JSON payload) for clients
+    that ask for JSON events; the raw message is still stored for the others.
+
+    The message is buffered and written together with the job's other pending messages, either after
+    PUBLISH_FLUSH_INTERVAL seconds or once PUBLISH_BATCH_SIZE messages are waiting. Call flush_messages
+    to write immediately.
     """
-    stream_key = f"events:{job_id}"
     message = message.replace('\n', '')
-    # XADD to stream with automatic ID
-    print(f"Publishing message to {stream_key}: {message}")
-    await redis_client.xadd(stream_key, {"message": message})
+    logger.debug("Publishing message to events:%s: %s", job_id, payload(message))
+    fields = {"message": message}
+    if event is not None and data is not None:
+        fields.update(event=event, data=data)
+    pending = _pending.setdefault(job_id, [])
+    pending.append(fields)
+    if len(pending) >= PUBLISH_BATCH_SIZE:
+        await flush_messages(job_id)
+    elif job_id not in _flush_timers:
+        _flush_timers[job_id] = asyncio.create_task(_flush_later(job_id))
+
+
+async def _flush_later(job_id: str) -> None:
+    try:
+        await asyncio.sleep(PUBLISH_FLUSH_INTERVAL)
+    finally:
+        _flush_timers.pop(job_id, None)
+    try:
+        await flush_messages(job_id)
+    except Exception as e:
+        logger.error(f"Failed to flush messages for job {job_id}: {e}")
+
+
+async def flush_messages(job_id: str, final: bool = False) -> None:
+    """
+    Write all pending messages of a job to its stream with one pipelined batch of XADDs.
+    Pass final=True at the end of a job to also drop its bookkeeping.
+    """
+    lock = _flush_locks.setdefault(job_id, asyncio.Lock())
+    # The lock keeps batches of the same job in publish order
+    async with lock:
+        batch = _pending.pop(job_id, None)
+        if batch:
+            stream_key = f"events:{job_id}"
+            try:
+                async with redis_client.pipeline(transaction=False) as pipe:
+                    for fields in batch:
+                        # XADD to stream with automatic ID
+                        pipe.xadd(stream_key, fields)
+                    await pipe.execute()
+            except BaseException:
+                # Put the batch back ahead of anything published meanwhile so the next flush retries it
+                _pending[job_id] = batch + _pending.get(job_id, [])
+                raise
+        if final and _flush_locks.get(job_id) is lock:
+            # Dropped while held, so no flush of this job is running with it
+            _flush_locks.pop(job_id, None)
+    if final:
+        timer = _flush_timers.pop(job_id, None)
+        if timer is not None and timer is not asyncio.current_task():
+            timer.cancel()
 
 
 async def listen_stream(job_id: str) -> AsyncGenerator[str, None]:
@@ -33,4 +102,4 @@ async def listen_stream(job_id: str) -> AsyncGenerator[str, None]:
                 last_id = message_id
                 # Extract the 'message' field
                 raw = message.get("message")
-                yield raw 
\ No newline at end of file
+                yield raw
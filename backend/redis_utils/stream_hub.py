@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, NamedTuple, Optional
+
+from .redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class StreamEntry(NamedTuple):
+    message: str
+    event: Optional[str] = None
+    data: Optional[str] = None
+
+    @classmethod
+    def from_fields(cls, fields: dict) -> "StreamEntry":
+        return cls(fields.get("message"), fields.get("event"), fields.get("data"))
+
+
+class Subscription:
+    """
+    One SSE viewer of a job. Replays the job's history, then yields live messages from a bounded queue.
+    """
+
+    def __init__(self, channel: "_JobChannel", history: list[tuple[str, StreamEntry]], queue_size: int):
+        self._channel = channel
+        self._history = history
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.overflowed = False
+
+    def deliver(self, entry: StreamEntry, policy: str) -> bool:
+        """Queue a live message. Returns False when the subscriber has to be disconnected."""
+        try:
+            self.queue.put_nowait(entry)
+            return True
+        except asyncio.QueueFull:
+            if policy == "disconnect":
+                self.overflowed = True
+                return False
+            # Drop the oldest message to make room for the newest one
+            self.queue.get_nowait()
+            self.queue.put_nowait(entry)
+            self.dropped += 1
+            return True
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        async for entry in self.entries():
+            yield entry.message
+
+    async def entries(self) -> AsyncIterator[StreamEntry]:
+        """Like iterating the subscription, but with the typed event of each message."""
+        # History older than what the hub kept in memory is read once from Redis
+        if self._channel.truncated and self._history:
+            first_id = self._history[0][0]
+            for _id, fields in await self._channel.client.xrange(self._channel.stream_key, "-", f"({first_id}"):
+                yield StreamEntry.from_fields(fields)
+        for _id, entry in self._history:
+            yield entry
+        self._history = []
+        while True:
+            if self.overflowed and self.queue.empty():
+                logger.warning(f"Disconnecting slow subscriber of {self._channel.stream_key}")
+                return
+            yield await self.queue.get()
+
+
+class _JobChannel:
+    def __init__(self, hub: "StreamHub", job_id: str):
+        self.hub = hub
+        self.client = hub.client
+        self.job_id = job_id
+        self.stream_key = f"events:{job_id}"
+        self.history: list[tuple[str, StreamEntry]] = []
+        self.truncated = False
+        self.subscribers: set[Subscription] = set()
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(self._read(), name=f"stream-hub:{self.job_id}")
+
+    async def _read(self) -> None:
+        """Single XREAD loop for the job, fanning every message out to all subscribers."""
+        last_id = "0-0"
+        while True:
+            try:
+                results = await self.client.xread(
+                    {self.stream_key: last_id}, block=self.hub.block_ms, count=self.hub.read_count
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Stream hub read failed for {self.stream_key}: {e}")
+                await asyncio.sleep(1)
+                continue
+            for _key, messages in results or []:
+                for message_id, fields in messages:
+                    last_id = message_id
+                    self._publish(message_id, StreamEntry.from_fields(fields))
+
+    def _publish(self, message_id: str, entry: StreamEntry) -> None:
+        self.history.append((message_id, entry))
+        if len(self.history) > self.hub.history_limit:
+            del self.history[: len(self.history) - self.hub.history_limit]
+            self.truncated = True
+        for subscription in list(self.subscribers):
+            if not subscription.deliver(entry, self.hub.slow_policy):
+                self.subscribers.discard(subscription)
+
+    def add_subscriber(self) -> Subscription:
+        # Snapshot and registration happen without an await in between, so nothing is missed or duplicated
+        subscription = Subscription(self, list(self.history), self.hub.queue_size)
+        self.subscribers.add(subscription)
+        return subscription
+
+
+class StreamHub:
+    """
+    Per-process broadcast hub: one Redis reader task per active job shared by all of its SSE subscribers.
+
+    Each subscriber gets a bounded queue. A subscriber that falls behind either loses its oldest queued messages
+    (policy "drop") or is disconnected (policy "disconnect"). The reader task stops when the last subscriber leaves.
+    """
+
+    def __init__(
+        self,
+        client=redis_client,
+        queue_size: int = 1000,
+        slow_policy: str = "drop",
+        block_ms: int = 5000,
+        read_count: int = 100,
+        history_limit: int = 10000,
+    ):
+        if slow_policy not in ("drop", "disconnect"):
+            raise ValueError(f"Unknown slow subscriber policy '{slow_policy}'")
+        self.client = client
+        self.queue_size = queue_size
+        self.slow_policy = slow_policy
+        self.block_ms = block_ms
+        self.read_count = read_count
+        self.history_limit = history_limit
+        self._channels: dict[str, _JobChannel] = {}
+
+    @asynccontextmanager
+    async def subscribe(self, job_id: str) -> AsyncIterator[Subscription]:
+        channel = self._channels.get(job_id)
+        if channel is None:
+            channel = self._channels[job_id] = _JobChannel(self, job_id)
+            channel.start()
+        subscription = channel.add_subscriber()
+        try:
+            yield subscription
+        finally:
+            channel.subscribers.discard(subscription)
+            if not channel.subscribers and self._channels.get(job_id) is channel:
+                del self._channels[job_id]
+                channel.task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            job_id: {"subscribers": len(channel.subscribers), "history": len(channel.history)}
+            for job_id, channel in self._channels.items()
+        }
+
+
+stream_hub = StreamHub(
+    queue_size=int(os.getenv("STREAM_HUB_QUEUE_SIZE", "1000")),
+    slow_policy=os.getenv("STREAM_HUB_SLOW_POLICY", "drop"),
+)
@@ -1,6 +1,10 @@
+import asyncio
 import json
 import logging
+import os
 import re
+import time
+from typing import Callable, Optional
 
 import numpy as np
 
@@ -8,21 +12,45 @@ from agent_utils.run_ai_agent import run_ai_agent
 from agents.data_analyst_agent import get_data_analyst_instructions
 from agents.data_analyst_agent import get_analyst_agent
 from agents.data_analyst_agent import get_sequential_agent
-from redis_utils.redis_stream import publish_message
+from redis_utils.redis_stream import publish_message, flush_messages
+from redis_utils.deck_store import save_deck
+from redis_utils.job_state import JobState, JobCancelledError, get_job_status, set_job_state, set_slide_progress, forget_job, track_job
 from agents.interpreter_agent import job_interpreter_agent
 from agents.deck_architect_agent import deck_architect_agent
 from json import JSONDecodeError
 from lxml import etree
 from agents.data_analyst_agent20 import root_agent as data_analyst_agent20
+from agents.data_analyst_agent20 import light_agent as light_analyst_agent
+from agents.data_analyst_agent20 import expand_chart_markers
+from agents.slide_tree import outline_to_json, slide_event
+from agents.slide_router import ESCALATION, SlideRoute, classify_slide_idea, extract_valid_slide, render_template_slide
+from agent_utils.batch import batch_stream_id, forget_batch, memoized
+from agent_utils.log_config import payload
+from agent_utils.metrics import slide_route_metrics
+from agent_utils.profiling import profile_job
+from agents.services.datasources import get_datasource
+from agents.services.query_cache import query_cache_stats
+from agents.services.semantic_cache import retarget_slide, semantic_slide_cache
+from agent_utils.job_context import current_batch_id, current_datasource, current_job_id, current_priority, current_slide_id, current_tenant
+from agent_utils.scheduler import Priority, job_scheduler, slide_scheduler
+from agent_utils.usage import TokenBudgetExceeded, usage_tracker
+from agent_utils.workflow_dag import INPUTS_FIELD, Stage, StageContext, StageFailed, WorkflowDAG, checkpoint_store
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# Number of slides of one job that are built at the same time
+SLIDE_CONCURRENCY = int(os.getenv("SLIDE_CONCURRENCY", "3"))
+# Route simple slides to a template or a faster model instead of always using the full analyst
+SLIDE_ROUTING = os.getenv("SLIDE_ROUTING", "true").lower() in ("1", "true", "yes")
+# Reuse slides of identical ideas from earlier jobs and adapt those of near-duplicates; off unless enabled
+SEMANTIC_CACHE = os.getenv("SEMANTIC_CACHE", "false").lower() in ("1", "true", "yes")
+
 def safe_json_dumps(obj):
     try:
         return json.dumps(obj)
     except Exception as e:
-        print('Error serializing object to JSON:', obj)
+        logger.warning("Error serializing object to JSON: %s", payload(obj))
         return str(obj)
 
 def safe_parse_json(raw) -> dict:
@@ -56,15 +84,115 @@ async def run_agent_workflow(
     subject_id: str,
     prompt: str,
     audiences: list[str],
+    deadline_at: Optional[float] = None,
+    variant_mode: bool = False,
+    token_budget: Optional[int] = None,
+    datasource: Optional[str] = None,
+    tenant: Optional[str] = None,
+    priority: str = Priority.INTERACTIVE.value,
+    profile: bool = False,
 ):
+    token = current_job_id.set(subject_id)
+    datasource_token = current_datasource.set(datasource)
+    tenant_token = current_tenant.set(tenant)
+    priority_token = current_priority.set(priority)
+    track_job(subject_id)
+    usage_tracker.set_budget(subject_id, token_budget)
     try:
-        return await _run_agent_workflow(subject_id, prompt, audiences)
+        # The job stays queued until the scheduler admits it
+        async with job_scheduler.slot(tenant, priority, key=subject_id):
+            if not await set_job_state(subject_id, JobState.RUNNING):
+                logger.info(f"Job {subject_id} was cancelled before it started")
+                return None
+            # Flagged jobs are profiled; the profile is stored under the job ID
+            async with profile_job(subject_id, profile) as profiler:
+                result = await _run_agent_workflow(
+                    subject_id, prompt, audiences, deadline_at, variant_mode, token_budget, datasource, tenant,
+                    priority, profile, on_stage=profiler.on_stage if profiler is not None else None
+                )
+        if result is None:
+            await set_job_state(subject_id, JobState.FAILED, error="An agent produced no result")
+        return result
+    except JobCancelledError:
+        logger.info(f"Agent workflow for {subject_id} stopped after cancellation")
+        # Usually already cancelled by the request; never leave a stopped job running
+        await set_job_state(subject_id, JobState.CANCELLED)
+        return None
     except Exception as e:
         logger.error(f"Error running agent workflow for {subject_id}: {e}")
-        print(f"Error running agent workflow for {subject_id}: {e}")
+        await set_job_state(subject_id, JobState.FAILED, error=str(e))
         return None
+    finally:
+        current_priority.reset(priority_token)
+        current_tenant.reset(tenant_token)
+        current_datasource.reset(datasource_token)
+        current_job_id.reset(token)
+        forget_job(subject_id)
+        stream_ids = [subject_id]
+        if variant_mode:
+            stream_ids += [variant_job_id(subject_id, index) for index in range(len(audiences))]
+        for stream_id in stream_ids:
+            try:
+                await flush_messages(stream_id, final=True)
+            except Exception as e:
+                logger.error(f"Failed to flush remaining messages for {stream_id}: {e}")
+        try:
+            await usage_tracker.flush(subject_id)
+        except Exception as e:
+            logger.error(f"Failed to store token usage for {subject_id}: {e}")
+        logger.info(f"Token usage for {subject_id}: {usage_tracker.job_total(subject_id).as_dict()}")
+        usage_tracker.forget(subject_id)
+        stats = query_cache_stats(subject_id, datasource)
+        if stats:
+            logger.info(
+                f"Query cache for {subject_id}: {stats['saved']} of {stats['total']} queries saved "
+                f"({stats['exact_hits']} repeated, {stats['derived_hits']} derived from cached results)"
+            )
+
+
+async def run_batch(batch_id: str, jobs: list[dict]):
+    """
+    Run the workflows of a batch submitted together. Each entry of `jobs` holds the run_agent_workflow arguments
+    of one job. The jobs share one query cache, and identical interpreter and architect calls run once; the
+    schedulers decide how many of them run at a time. After every job a "batch-progress" event goes to the
+    batch stream.
+    """
+    stream_id = batch_stream_id(batch_id)
+    token = current_batch_id.set(batch_id)
+    finished = 0
+
+    async def run_one(job: dict):
+        nonlocal finished
+        await run_agent_workflow(**job)
+        finished += 1
+        status = await get_job_status(job["subject_id"]) or {}
+        progress = json.dumps({
+            "batchId": batch_id,
+            "jobId": job["subject_id"],
+            "state": status.get("state"),
+            "finished": finished,
+            "total": len(jobs),
+        })
+        await publish_message(stream_id, progress, event="batch-progress", data=progress)
+
+    try:
+        await asyncio.gather(*(run_one(job) for job in jobs))
+    finally:
+        current_batch_id.reset(token)
+        try:
+            await flush_messages(stream_id, final=True)
+        except Exception as e:
+            logger.error(f"Failed to flush remaining messages for {stream_id}: {e}")
+        memo = forget_batch(batch_id)
+        if memo is not None:
+            logger.info(f"Batch {batch_id}: {memo.hits} agent calls shared between {len(jobs)} jobs")
+        for datasource in {job.get("datasource") for job in jobs}:
+            stats = query_cache_stats(batch_id, datasource)
+            if stats:
+                logger.info(f"Query cache for batch {batch_id}: {stats['saved']} of {stats['total']} queries saved")
     
 
+
 placeholder_slop = lambda id: f'''<Slide id="{id}" classes="bg-gray-50 p-6">
     <Text mode="content" tag="h1" classes="text-4xl font-bold mb-8 text-center text-gray-800">
       <Content>Q4 Financial Performance</Content>
@@ -107,15 +235,136 @@ Customer Acquisition Cost: $240</Content>
   </Slide>'''
 
 
-async def _run_agent_workflow(
-    subject_id: str,
-    prompt: str,
-    audiences: list[str],
-):
+def parse_slide_ideas(subject_id: str, architect_result: str):
+    """
+    Parse the architect's SlideIdeas XML, tolerating markdown fences, stray ampersands and minor malformations.
+    """
+    # Log raw architect_result for debugging parsing errors
+    logger.debug("Raw architect_result for %s: %s", subject_id, payload(architect_result))
+    # Remove all markdown fences including ```xml or ```
+    architect_result = re.sub(r'```(?:xml)?', '', architect_result).strip()
+    # Use a recoverable parser to handle minor malformations
+    parser = etree.XMLParser(remove_blank_text=True, recover=True)
+    # Sanitize XML: escape unescaped ampersands to prevent XML parsing errors
+    sanitized_result = re.sub(r'&(?!amp;|lt;|gt;|apos;|quot;|#\d+;)', '&amp;', architect_result)
+    logger.debug("Sanitized architect_result for %s: %s", subject_id, payload(sanitized_result))
+    # Try parsing, wrap in a root tag on failure to ensure well-formedness
+    try:
+        ideas_root = etree.fromstring(sanitized_result.encode('utf-8'), parser)
+    except etree.XMLSyntaxError:
+        wrapped = f"<root>{sanitized_result}</root>"
+        logger.warning(f"Wrapping XML content in <root> for recovery for {subject_id}")
+        ideas_root = etree.fromstring(wrapped.encode('utf-8'), parser)
+    if ideas_root is None:
+        raise StageFailed(f"Architect result XML for {subject_id} could not be parsed: {architect_result}")
+    if logger.isEnabledFor(logging.DEBUG):
+        # Serialized now: the tree is still modified later
+        pretty = etree.tostring(ideas_root, encoding='unicode', pretty_print=True)
+        logger.debug("Parsed Slide Ideas XML for %s: %s", subject_id, payload(pretty))
+    return ideas_root
+
+
+def slide_id_of(slide_idea, index: int) -> str:
+    return slide_idea.findtext("{*}SlideId") or f"slide-{index + 1}"
+
+
+def outline_slide_ideas(slide_ideas_xml: str) -> list:
+    parser = etree.XMLParser(remove_blank_text=True, recover=True)
+    return list(etree.fromstring(slide_ideas_xml.encode('utf-8'), parser))
+
+
+async def run_slide(subject_id: str, slide_idea, slide_id: str) -> Optional[str]:
     """
-    Main workflow to run one or more AI agents in sequence, using only the initial request inputs.
+    Transform one SlideIdea element into final Slide XML. The slide router picks the cheapest route that fits the
+    idea (template, light model, full analyst); a route whose output does not validate escalates to the next one.
     """
-    # 1) Run interpreter agent
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Processing slide idea: %s", payload(etree.tostring(slide_idea, encoding='unicode')))
+    route = classify_slide_idea(slide_idea) if SLIDE_ROUTING else SlideRoute.FULL
+    reference_xml = None
+    if SEMANTIC_CACHE and route != SlideRoute.TEMPLATE:
+        started = time.perf_counter()
+        match = await _lookup_cached_slide(slide_idea)
+        if match is not None and match.exact:
+            slide_xml = extract_valid_slide(retarget_slide(match.slide_xml, slide_id))
+            slide_route_metrics.record("cache", time.perf_counter() - started, slide_xml is not None)
+            if slide_xml is not None:
+                logger.info(f"Reusing cached slide {match.entry_id} for the identical idea in {subject_id}")
+                return slide_xml
+        if match is not None:
+            # Adapting a near-duplicate slide is light work; the full analyst remains the fallback
+            reference_xml = match.slide_xml
+            route = SlideRoute.LIGHT
+    while True:
+        started = time.perf_counter()
+        slide_result = await _run_slide_route(route, subject_id, slide_idea, slide_id, reference_xml)
+        if slide_result is not None:
+            # Charts prepared by chart_data_tool are left as markers by the analyst and filled in here
+            slide_result = expand_chart_markers(slide_result)
+        slide_xml = extract_valid_slide(slide_result)
+        next_route = ESCALATION[route] if slide_xml is None else None
+        slide_route_metrics.record(route.value, time.perf_counter() - started, slide_xml is not None, next_route is not None)
+        if slide_xml is not None:
+            logger.info("Slide result (%s route): %s", route.value, payload(slide_xml))
+            if SEMANTIC_CACHE and route != SlideRoute.TEMPLATE:
+                await _store_cached_slide(slide_idea, slide_xml)
+            return slide_xml
+        if next_route is None:
+            # The strongest route keeps the old behaviour: its result is used even when it does not validate
+            if slide_result is None:
+                logger.error(f"No result from the analyst for slide idea in {subject_id}")
+            return slide_result
+        logger.warning(f"Slide from the {route.value} route did not validate for {subject_id}, escalating to {next_route.value}")
+        route = next_route
+
+
+async def _lookup_cached_slide(slide_idea):
+    try:
+        return await semantic_slide_cache.lookup(slide_idea, get_datasource().name)
+    except Exception as e:
+        logger.error(f"Semantic slide cache lookup failed: {e}")
+        return None
+
+
+async def _store_cached_slide(slide_idea, slide_xml: str) -> None:
+    try:
+        await semantic_slide_cache.add(slide_idea, slide_xml, get_datasource().name)
+    except Exception as e:
+        logger.error(f"Failed to store slide in the semantic cache: {e}")
+
+
+async def _run_slide_route(
+    route: SlideRoute,
+    subject_id: str,
+    slide_idea,
+    slide_id: str,
+    reference_xml: Optional[str] = None,
+) -> Optional[str]:
+    if route == SlideRoute.TEMPLATE:
+        return render_template_slide(slide_idea, slide_id)
+    analyst_message = etree.tostring(slide_idea, encoding='unicode', pretty_print=True)
+    message_parts = [analyst_message]
+    if reference_xml is not None:
+        message_parts.append(
+            "A slide built earlier for a very similar idea is given below. Adapt it to this idea instead of starting "
+            "from scratch: keep what still fits, re-run queries only where the figures must change, and use this "
+            f"idea's SlideId as the slide id.\n{reference_xml}"
+        )
+    slide_app = "ai_slop"
+    analyst_agent = light_analyst_agent if route == SlideRoute.LIGHT else data_analyst_agent20
+    slide_result = await run_ai_agent(
+        analyst_agent,
+        subject_id=subject_id,
+        initial_state={"slide_xml": analyst_message},
+        message_parts=message_parts,
+        app_name=slide_app,
+        output_key="script_output")
+    return slide_result
+
+
+async def interpret_stage(ctx: StageContext, prompt: str, audiences: list[str]) -> dict:
+    subject_id = ctx.job_id
+    await set_job_state(subject_id, JobState.RUNNING, stage="interpreting")
     interpreter_state = {"prompt": prompt, "audiences": audiences}
     interpreter_message_parts = [
         "Interpret the job request",
@@ -123,101 +372,320 @@ async def _run_agent_workflow(
         f"Audiences: {audiences}"
     ]
     interpreter_app = "job_interpreter_app"
-    interpreter_result = await run_ai_agent(
+    # Jobs of a batch with the same request share one interpreter run
+    interpreter_result = await memoized("interpret", interpreter_state, lambda: run_ai_agent(
         job_interpreter_agent,
         subject_id=subject_id,
         initial_state=interpreter_state,
         message_parts=interpreter_message_parts,
         app_name=interpreter_app,
-    )
+    ), stream_id=subject_id)
     if interpreter_result is None:
-        logger.error(f"No result from agent {job_interpreter_agent.name} for {subject_id}")
-        return None
+        raise StageFailed(f"No result from agent {job_interpreter_agent.name} for {subject_id}")
 
     # Parse and publish interpreter output
-    print(f"Interpreter result: {interpreter_result}")
+    logger.info("Interpreter result for %s: %s", subject_id, payload(interpreter_result))
     parsed_interp = safe_parse_json(interpreter_result)
     await publish_message(subject_id, str(parsed_interp))
-    print(f"Interpreter result: {parsed_interp}")
+    return {"job_plan": parsed_interp}
 
-    # 2) Run simple deck architect agent
+
+async def architect_outline(stream_id: str, job_plan: dict, audiences: Optional[list[str]] = None) -> str:
+    """
+    Run the deck architect on the interpreter plan and return the parsed SlideIdeas XML.
+    With `audiences`, only the strategies of those audiences are passed on as context.
+    """
+    strategies = job_plan.get("audience_strategies", {})
+    if audiences is not None and isinstance(strategies, dict):
+        strategies = {audience: strategies.get(audience) for audience in audiences}
     architect_state = {
-        "goal": parsed_interp.get("interpretation"),
-        "context": json.dumps(parsed_interp.get("audience_strategies", {}))
+        "goal": job_plan.get("interpretation"),
+        "context": json.dumps(strategies)
     }
     architect_message = f"Generate presentation outline with the following state: {json.dumps(architect_state)}"
     architect_app = "simple_deck_architect_app"
-    architect_result = await run_ai_agent(
+    architect_result = await memoized("architect", [architect_state, current_datasource.get()], lambda: run_ai_agent(
         deck_architect_agent,
-        subject_id=subject_id,
+        subject_id=stream_id,
         initial_state=architect_state,
         message_parts=[architect_message],
         app_name=architect_app
-    )
+    ), stream_id=stream_id)
     if architect_result is None:
-        logger.error(f"No result from agent {deck_architect_agent.name} for {subject_id}")
-        return None
+        raise StageFailed(f"No result from agent {deck_architect_agent.name} for {stream_id}")
 
-    # Publish architect output
-    print(f"Architect result: {architect_result}")  # xml string
-    
-    logger.info(f"Architect result through logger")
-    await publish_message(subject_id, str(architect_result))
-    
-    # 3) Slide idea iteration
+    # Publish architect output, with the parsed outline for JSON clients
+    logger.info("Architect result for %s: %s", stream_id, payload(architect_result))
+    ideas_root = parse_slide_ideas(stream_id, architect_result)
+    outline = json.dumps({"slides": outline_to_json(ideas_root, slide_id_of)}, ensure_ascii=False)
+    await publish_message(stream_id, str(architect_result), event="outline", data=outline)
+    return etree.tostring(ideas_root, encoding='unicode')
+
+
+async def build_slides(
+    ctx: StageContext,
+    stream_id: str,
+    slide_ideas_xml: str,
+    deadline_at: Optional[float],
+) -> list[dict]:
+    """
+    Build every slide of the outline, up to SLIDE_CONCURRENCY at a time, publishing them to `stream_id`.
+    Each finished slide is checkpointed on its own, so a resumed job only rebuilds the slides that were not done yet.
+    """
+    slide_ideas = outline_slide_ideas(slide_ideas_xml)
+    semaphore = asyncio.Semaphore(SLIDE_CONCURRENCY)
+    # Variants share the parent job's status, which only tracks the progress of a single deck
+    report_progress = stream_id == ctx.job_id
+    started = 0
+    skipped = 0
+
+    async def process(index: int, slide_idea) -> Optional[dict]:
+        nonlocal started, skipped
+        slide_id = slide_id_of(slide_idea, index)
+        done = ctx.get_checkpoint(slide_id)
+        if done is not None:
+            return done
+        async with semaphore:
+            if deadline_at is not None and time.time() >= deadline_at:
+                skipped += 1
+                return None
+            if usage_tracker.over_budget(ctx.job_id):
+                skipped += 1
+                return None
+            started += 1
+            if report_progress:
+                await set_slide_progress(ctx.job_id, started, len(slide_ideas))
+            current_slide_id.set(slide_id)
+            # The deadline also bounds a slide that is already waiting for a slot or being built
+            deadline = asyncio.timeout(deadline_at - time.time() if deadline_at is not None else None)
+            try:
+                async with deadline:
+                    # Slides of all running jobs share the slide slots, by priority and tenant
+                    async with slide_scheduler.slot(
+                        current_tenant.get(), current_priority.get() or Priority.INTERACTIVE, key=ctx.job_id
+                    ):
+                        slide_result = await run_slide(stream_id, slide_idea, slide_id)
+            except JobCancelledError:
+                raise
+            except TimeoutError as e:
+                if not deadline.expired():
+                    logger.error(f"Error while building slide {slide_id} for {stream_id}: {e}")
+                    return None
+                logger.warning(f"Slide {slide_id} for {stream_id} stopped at the job deadline")
+                skipped += 1
+                return None
+            except TokenBudgetExceeded as e:
+                logger.warning(f"Slide {slide_id} for {stream_id} stopped: {e}")
+                skipped += 1
+                return None
+            except Exception as e:
+                logger.error(f"Error while building slide {slide_id} for {stream_id}: {e}")
+                logger.exception("Exception stack trace for slide idea iteration")
+                return None
+        if slide_result is None:
+            return None
+        # Publish each slide result, parsed once into the component tree for JSON clients
+        event, data = slide_event(slide_result, slide_id)
+        await publish_message(stream_id, slide_result, event=event, data=data)
+        slide = {"slideId": slide_id, "xml": slide_result}
+        await ctx.save_checkpoint(slide_id, slide)
+        return slide
+
+    tasks = [asyncio.create_task(process(index, idea)) for index, idea in enumerate(slide_ideas)]
     try:
-        # Log raw architect_result for debugging parsing errors
-        logger.info(f"Raw architect_result for {subject_id}: {architect_result}")
-        # Remove all markdown fences including ```xml or ```
-        architect_result = re.sub(r'```(?:xml)?', '', architect_result).strip()
-        print(f"Raw architect_result for {subject_id}: {architect_result}")
-        # Use a recoverable parser to handle minor malformations
-        parser = etree.XMLParser(remove_blank_text=True, recover=True)
-        # Sanitize XML: escape unescaped ampersands to prevent XML parsing errors
-        sanitized_result = re.sub(r'&(?!amp;|lt;|gt;|apos;|quot;|#\d+;)', '&amp;', architect_result)
-        logger.info(f"Sanitized architect_result for {subject_id}: {sanitized_result}")
-        print(f"Sanitized architect_result for {subject_id}: {sanitized_result}")
-        # Try parsing, wrap in a root tag on failure to ensure well-formedness
-        try:
-            ideas_root = etree.fromstring(sanitized_result.encode('utf-8'), parser)
-        except etree.XMLSyntaxError:
-            wrapped = f"<root>{sanitized_result}</root>"
-            logger.warning(f"Wrapping XML content in <root> for recovery for {subject_id}")
-            ideas_root = etree.fromstring(wrapped.encode('utf-8'), parser)
-        logger.info(f"Parsed Slide Ideas XML for {subject_id}: {etree.tostring(ideas_root, encoding='unicode', pretty_print=True)}")
-        print(f"Parsed Slide Ideas XML for {subject_id}: {etree.tostring(ideas_root, encoding='unicode', pretty_print=True)}")
-        for slide_idea in ideas_root:  # todo replace with xpath or findall
-            # Transform slide idea into final Slide XML using naive analyst
-            print('Processing slide idea:', etree.tostring(slide_idea, encoding='unicode', pretty_print=True))
-            #slide_elem = analyze_slide_idea(slide_idea)
-            # Serialize Slide element to string
-            #slide_xml = etree.tostring(slide_elem, encoding='unicode', pretty_print=True)
-            
-            analyst_message = etree.tostring(slide_idea, encoding='unicode', pretty_print=True)
-            slide_app = "ai_slop"
-            analyst_agent = data_analyst_agent20
-            slide_result = await run_ai_agent(
-                analyst_agent,  # Using the new data_analyst_agent20
-                subject_id=subject_id,
-                initial_state={"slide_xml": analyst_message},
-                message_parts=[analyst_message],
-                app_name=slide_app,
-                output_key="script_output")
-            print(f"-----------------------\n")
-            print(f"Slide result: {slide_result}")
-            print(f"-----------------------\n")
-            if slide_result is None:
-                logger.error(f"No result from agent {analyst_agent.name} for slide idea in {subject_id}")
-                continue
-            logger.info(f"Slide result: {slide_result}")
-            # Publish each slide result
-            await publish_message(subject_id, slide_result)
-    except Exception as e:
-        logger.error(f"Error during slide idea iteration for {subject_id}: {e}")
-        # Log the failing XML string for further inspection
-        logger.error(f"Architect result XML that failed parsing: {architect_result}")
-        # Log full exception stack trace
-        logger.exception("Exception stack trace for slide idea iteration")
+        results = await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+    if skipped:
+        logger.warning(f"Deadline or token budget reached for {stream_id}, skipped {skipped} slides")
+        await set_job_state(ctx.job_id, JobState.RUNNING, skippedSlides=skipped)
+    return [slide for slide in results if slide is not None]
+
+
+async def persist_deck(stream_id: str, slide_ideas_xml: str, slides: list[dict]) -> str:
+    # Persist the assembled deck so it can be reloaded without replaying the event stream
+    deck = await save_deck(stream_id, slide_ideas_xml, slides)
+    logger.info(f"Stored deck for {stream_id} with {len(slides)} slides (etag {deck.etag})")
+    return deck.etag
+
+
+async def architect_stage(ctx: StageContext, job_plan: dict) -> dict:
+    await set_job_state(ctx.job_id, JobState.RUNNING, stage="architecting")
+    return {"slide_ideas_xml": await architect_outline(ctx.job_id, job_plan)}
+
+
+async def slides_stage(ctx: StageContext, slide_ideas_xml: str, deadline_at: Optional[float]) -> dict:
+    return {"slides": await build_slides(ctx, ctx.job_id, slide_ideas_xml, deadline_at)}
+
+
+async def persist_stage(ctx: StageContext, slide_ideas_xml: str, slides: list[dict]) -> dict:
+    return {"deck_etag": await persist_deck(ctx.job_id, slide_ideas_xml, slides)}
+
+
+# interpreter -> architect -> slides -> persist
+agent_workflow = WorkflowDAG([
+    Stage("interpret", interpret_stage, inputs=("prompt", "audiences"), outputs=("job_plan",)),
+    Stage("architect", architect_stage, inputs=("job_plan",), outputs=("slide_ideas_xml",)),
+    # Not checkpointed as a whole: a retry rebuilds the slides that failed or were skipped, the others are restored
+    Stage("slides", slides_stage, inputs=("slide_ideas_xml", "deadline_at"), outputs=("slides",), checkpoint=False),
+    Stage("persist", persist_stage, inputs=("slide_ideas_xml", "slides"), outputs=("deck_etag",)),
+])
+
+
+def variant_job_id(job_id: str, index: int) -> str:
+    """ID of the sub-stream (events:{id}) and stored deck of one audience variant."""
+    return f"{job_id}-v{index}"
+
+
+def variant_stages(index: int, audience: str) -> list[Stage]:
+    """
+    Architect, slides and persist stages of one audience variant, all keyed by the variant's suffix.
+    """
+    suffix = f"v{index}"
+    outline, slides, etag = f"slide_ideas_xml_{suffix}", f"slides_{suffix}", f"deck_etag_{suffix}"
+
+    async def architect(ctx: StageContext, job_plan: dict) -> dict:
+        stream_id = variant_job_id(ctx.job_id, index)
+        return {outline: await architect_outline(stream_id, job_plan, [audience])}
+
+    async def build(ctx: StageContext, deadline_at: Optional[float], **values) -> dict:
+        stream_id = variant_job_id(ctx.job_id, index)
+        return {slides: await build_slides(ctx, stream_id, values[outline], deadline_at)}
+
+    async def persist(ctx: StageContext, **values) -> dict:
+        stream_id = variant_job_id(ctx.job_id, index)
+        return {etag: await persist_deck(stream_id, values[outline], values[slides])}
+
+    return [
+        Stage(f"architect-{suffix}", architect, inputs=("job_plan",), outputs=(outline,)),
+        Stage(f"slides-{suffix}", build, inputs=(outline, "deadline_at"), outputs=(slides,), checkpoint=False),
+        Stage(f"persist-{suffix}", persist, inputs=(outline, slides), outputs=(etag,)),
+    ]
 
 
-    return architect_result
+def build_variant_workflow(audiences: list[str]) -> WorkflowDAG:
+    """
+    One shared interpreter stage, then an independent architect -> slides -> persist chain per audience.
+    The chains run concurrently and, since they all run under the parent job ID, share its query cache.
+    """
+    stages = [Stage("interpret", interpret_stage, inputs=("prompt", "audiences"), outputs=("job_plan",))]
+    for index, audience in enumerate(audiences):
+        stages += variant_stages(index, audience)
+    return WorkflowDAG(stages)
+
+
+async def _run_agent_workflow(
+    subject_id: str,
+    prompt: str,
+    audiences: list[str],
+    deadline_at: Optional[float] = None,
+    variant_mode: bool = False,
+    token_budget: Optional[int] = None,
+    datasource: Optional[str] = None,
+    tenant: Optional[str] = None,
+    priority: str = Priority.INTERACTIVE.value,
+    profile: bool = False,
+    on_stage: Optional[Callable[[str, bool], None]] = None,
+):
+    """
+    Main workflow: run the agent pipeline as a DAG, resuming from the last checkpointed stage of this job.
+    In variant mode one deck per audience is produced, each on its own sub-stream.
+    """
+    inputs = {
+        "prompt": prompt,
+        "audiences": audiences,
+        "deadline_at": deadline_at,
+        "variant_mode": variant_mode,
+        "token_budget": token_budget,
+        "datasource": datasource,
+        "tenant": tenant,
+        "priority": priority,
+        "profile": profile,
+        # Slide regeneration reuses the batch's shared query cache
+        "batch_id": current_batch_id.get(),
+    }
+    if variant_mode:
+        await set_job_state(subject_id, JobState.RUNNING, variantCount=len(audiences))
+        values = await build_variant_workflow(audiences).run(subject_id, inputs, checkpoint_store, on_stage)
+        await set_job_state(subject_id, JobState.DONE, stage="done")
+        return [values[f"slide_ideas_xml_v{index}"] for index in range(len(audiences))]
+    values = await agent_workflow.run(subject_id, inputs, checkpoint_store, on_stage)
+    await set_job_state(subject_id, JobState.DONE, stage="done")
+    return values["slide_ideas_xml"]
+
+
+async def find_slide_idea(subject_id: str, slide_id: str):
+    """
+    Look up one SlideIdea of a job's checkpointed outline. Returns None when the job has no outline or no such slide.
+    """
+    architect = await checkpoint_store.get(subject_id, "architect")
+    if architect is None:
+        return None
+    for index, slide_idea in enumerate(outline_slide_ideas(architect["slide_ideas_xml"])):
+        if slide_id_of(slide_idea, index) == slide_id:
+            return slide_idea
+    return None
+
+
+async def regenerate_slide(subject_id: str, slide_id: str) -> Optional[dict]:
+    """
+    Rebuild a single slide of an existing job. The interpreter and architect are not re-run: the outline comes
+    from the job's checkpoints and the job's query cache is reused. The new slide is published to the job's stream,
+    checkpointed, and the stored deck is rebuilt around it.
+    """
+    token = current_job_id.set(subject_id)
+    slide_token = current_slide_id.set(slide_id)
+    datasource_token = current_datasource.set(None)
+    batch_token = current_batch_id.set(None)
+    try:
+        inputs = await checkpoint_store.get(subject_id, INPUTS_FIELD) or {}
+        current_datasource.set(inputs.get("datasource"))
+        current_batch_id.set(inputs.get("batch_id"))
+        slide_idea = await find_slide_idea(subject_id, slide_id)
+        if slide_idea is None:
+            logger.error(f"Slide {slide_id} not found in the outline of {subject_id}")
+            return None
+        # Someone is waiting on this single slide, so it is interactive whatever the job's class was
+        async with slide_scheduler.slot(inputs.get("tenant"), Priority.INTERACTIVE):
+            slide_result = await run_slide(subject_id, slide_idea, slide_id)
+        if slide_result is None:
+            return None
+        # Clients already holding the slide get a JSON patch against the version they were sent
+        previous = await checkpoint_store.get(subject_id, f"slides/{slide_id}")
+        event, data = slide_event(slide_result, slide_id, previous["xml"] if previous else None)
+        await publish_message(subject_id, slide_result, event=event, data=data)
+        slide = {"slideId": slide_id, "xml": slide_result}
+        await checkpoint_store.save(subject_id, f"slides/{slide_id}", slide)
+
+        # Re-read the checkpoints so slides regenerated concurrently are all kept
+        checkpoints = await checkpoint_store.load(subject_id)
+        slide_ideas_xml = checkpoints["architect"]["slide_ideas_xml"]
+        slides = []
+        for index, idea in enumerate(outline_slide_ideas(slide_ideas_xml)):
+            done = checkpoints.get(f"slides/{slide_id_of(idea, index)}")
+            if done is not None:
+                slides.append(done)
+        await checkpoint_store.save(subject_id, "slides", {"slides": slides})
+        deck = await save_deck(subject_id, slide_ideas_xml, slides)
+        await checkpoint_store.save(subject_id, "persist", {"deck_etag": deck.etag})
+        logger.info(f"Regenerated slide {slide_id} of {subject_id} (deck etag {deck.etag})")
+        return slide
+    except JobCancelledError:
+        logger.info(f"Regeneration of slide {slide_id} in {subject_id} stopped after cancellation")
+        return None
+    except Exception as e:
+        logger.error(f"Error regenerating slide {slide_id} for {subject_id}: {e}")
+        logger.exception("Exception stack trace for slide regeneration")
+        return None
+    finally:
+        current_batch_id.reset(batch_token)
+        current_datasource.reset(datasource_token)
+        current_slide_id.reset(slide_token)
+        current_job_id.reset(token)
+        try:
+            await flush_messages(subject_id, final=True)
+        except Exception as e:
+            logger.error(f"Failed to flush remaining messages for {subject_id}: {e}")
+        usage_tracker.forget(subject_id)
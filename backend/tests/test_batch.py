@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+from agent_utils.batch import StageMemo, forget_batch, memoized
+from agent_utils.job_context import current_batch_id
+
+
+def counting_agent(result, delay=0.01):
+    calls = []
+
+    async def agent():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return result
+
+    return agent, calls
+
+
+def test_identical_calls_run_once():
+    memo = StageMemo()
+    agent, calls = counting_agent("<SlideIdeas/>")
+
+    async def run():
+        return await asyncio.gather(*(memo.run("architect", {"goal": "q4"}, agent) for _ in range(5)))
+
+    assert asyncio.run(run()) == ["<SlideIdeas/>"] * 5
+    assert len(calls) == 1
+    assert memo.stats() == {"hits": 4, "misses": 1}
+
+
+def test_different_keys_are_not_shared():
+    memo = StageMemo()
+    agent, calls = counting_agent("plan")
+
+    async def run():
+        await memo.run("interpret", {"prompt": "a"}, agent)
+        await memo.run("interpret", {"prompt": "b"}, agent)
+        await memo.run("architect", {"prompt": "a"}, agent)
+
+    asyncio.run(run())
+    assert len(calls) == 3
+
+
+def test_failed_call_is_not_shared():
+    memo = StageMemo()
+    calls = []
+
+    async def flaky():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        if len(calls) == 1:
+            raise RuntimeError("model unavailable")
+        return "plan"
+
+    async def run():
+        return await asyncio.gather(
+            memo.run("interpret", "p", flaky), memo.run("interpret", "p", flaky), return_exceptions=True
+        )
+
+    first, second = asyncio.run(run())
+    assert isinstance(first, RuntimeError)
+    # The waiting job ran the agent itself
+    assert second == "plan"
+    assert len(calls) == 2
+
+
+def test_empty_result_is_not_kept():
+    memo = StageMemo()
+    agent, calls = counting_agent(None, delay=0)
+
+    async def run():
+        await memo.run("interpret", "p", agent)
+        await memo.run("interpret", "p", agent)
+
+    asyncio.run(run())
+    assert len(calls) == 2
+
+
+@pytest.mark.parametrize("batch_id", [None, "batch-1"])
+def test_memoized_only_shares_within_a_batch(batch_id):
+    agent, calls = counting_agent("plan", delay=0)
+
+    async def run():
+        token = current_batch_id.set(batch_id)
+        try:
+            await memoized("interpret", "p", agent)
+            await memoized("interpret", "p", agent)
+        finally:
+            current_batch_id.reset(token)
+
+    asyncio.run(run())
+    forget_batch("batch-1")
+    assert len(calls) == (2 if batch_id is None else 1)
+
+
+def test_reusing_job_is_told_where_the_result_came_from(monkeypatch):
+    import agent_utils.batch as batch
+
+    published = []
+
+    async def publish_message(job_id, message, event=None, data=None):
+        published.append((job_id, event, data))
+
+    monkeypatch.setattr(batch, "publish_message", publish_message)
+    agent, calls = counting_agent("plan")
+
+    async def run():
+        token = current_batch_id.set("batch-2")
+        try:
+            await asyncio.gather(*(memoized("interpret", "p", agent, stream_id=job) for job in ("job-a", "job-b")))
+        finally:
+            current_batch_id.reset(token)
+
+    asyncio.run(run())
+    forget_batch("batch-2")
+    assert len(calls) == 1
+    assert published == [("job-b", "shared", '{"stage": "interpret", "sharedFrom": "job-a"}')]
@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+from agent_utils import call_policy
+from agent_utils.call_policy import AgentCallPolicy, HedgeBudget, call_with_policy
+from agent_utils.metrics import RouteMetrics
+from redis_utils.job_state import JobCancelledError
+
+FAST = AgentCallPolicy(timeout=0.5, retries=2, backoff_base=0.001, backoff_max=0.001)
+
+
+def run(attempt, policy=FAST, metrics=None, budget=None):
+    return asyncio.run(call_with_policy(
+        "agent", attempt, policy, metrics or RouteMetrics(), budget or HedgeBudget(1.0)
+    ))
+
+
+def test_transient_errors_are_retried():
+    calls = []
+
+    async def attempt(primary):
+        calls.append(primary)
+        if len(calls) < 3:
+            raise ConnectionError("reset")
+        return "ok"
+
+    assert run(attempt) == "ok"
+    assert len(calls) == 3
+
+
+def test_permanent_errors_and_cancellation_are_not_retried():
+    for error in (ValueError("bad request"), JobCancelledError("job")):
+        calls = []
+
+        async def attempt(primary):
+            calls.append(primary)
+            raise error
+
+        with pytest.raises(type(error)):
+            run(attempt)
+        assert len(calls) == 1
+
+
+def test_timeout_per_attempt():
+    calls = []
+
+    async def attempt(primary):
+        calls.append(primary)
+        await asyncio.sleep(1)
+
+    with pytest.raises(TimeoutError):
+        run(attempt, AgentCallPolicy(timeout=0.05, retries=1, backoff_base=0.001))
+    assert len(calls) == 2
+
+
+def warm_metrics(latency=0.01):
+    metrics = RouteMetrics()
+    for _ in range(call_policy.HEDGE_MIN_SAMPLES):
+        metrics.record("agent", latency, success=True)
+    return metrics
+
+
+def test_hedge_wins_over_slow_primary():
+    budget = HedgeBudget(1.0)
+
+    async def attempt(primary):
+        await asyncio.sleep(0.3 if primary else 0.01)
+        return "primary" if primary else "hedge"
+
+    policy = AgentCallPolicy(timeout=1, retries=0, hedge=True)
+    assert run(attempt, policy, warm_metrics(), budget) == "hedge"
+    assert budget.snapshot()["hedgeWins"] == 1
+
+
+def test_hedging_respects_budget():
+    budget = HedgeBudget(0.0)
+    started = []
+
+    async def attempt(primary):
+        started.append(primary)
+        await asyncio.sleep(0.05)
+        return primary
+
+    assert run(attempt, AgentCallPolicy(timeout=1, retries=0, hedge=True), warm_metrics(), budget) is True
+    assert started == [True]
+    assert budget.snapshot()["denied"] == 1
+
+
+def test_losing_attempt_is_awaited_after_cancellation():
+    unwound = []
+
+    async def attempt(primary):
+        try:
+            await asyncio.sleep(0.3 if primary else 0.01)
+        except asyncio.CancelledError:
+            await asyncio.sleep(0)
+            unwound.append(primary)
+            raise
+        return "primary" if primary else "hedge"
+
+    async def scenario():
+        policy = AgentCallPolicy(timeout=1, retries=0, hedge=True)
+        result = await call_with_policy("agent", attempt, policy, warm_metrics(), HedgeBudget(1.0))
+        # The cancelled primary finished unwinding before call_with_policy returned
+        return result, list(unwound)
+
+    assert asyncio.run(scenario()) == ("hedge", [True])
@@ -0,0 +1,66 @@
+import importlib
+import pathlib
+
+import numpy as np
+import pandas as pd
+from lxml import etree
+
+from agents.chart_data import aggregate_top_n, lttb_indices, prepare_chart
+
+SCHEMA_PATH = pathlib.Path(__file__).resolve().parent.parent.parent / "schemas" / "single_slide_schema.xsd"
+
+
+def validate_chart(chart: str):
+    schema = etree.XMLSchema(etree.parse(str(SCHEMA_PATH)))
+    slide = f'<Slide xmlns="http://www.complonkers-hackathon/slidedeck" id="s1">{chart}</Slide>'
+    schema.assertValid(etree.fromstring(slide))
+
+
+def test_top_n_folds_rest_into_other():
+    df = pd.DataFrame({"genre": list("abcde"), "sales": [50, 40, 30, 20, 10]})
+    result = aggregate_top_n(df, "genre", "sales", "sum", top_n=2)
+    assert result["genre"].tolist() == ["a", "b", "Other"]
+    assert result["sales"].tolist() == [50, 40, 60]
+
+
+def test_prepare_chart_from_sql_rows_is_schema_valid():
+    rows = [{"country": f"c{i % 1000}", "total": i} for i in range(5000)]
+    chart = prepare_chart(rows, "country", "total", top_n=5)
+    validate_chart(chart)
+    assert chart.count("<Row>") == 6
+    assert 'value="Other"' in chart
+
+
+def test_lttb_keeps_endpoints_and_peaks():
+    x = np.arange(1000, dtype=float)
+    y = np.zeros(1000)
+    y[500] = 100
+    keep = lttb_indices(x, y, 20)
+    assert len(keep) == 20
+    assert keep[0] == 0 and keep[-1] == 999
+    assert 500 in keep
+
+
+def test_time_series_downsampled():
+    dates = pd.date_range("2020-01-01", periods=2000, freq="D")
+    df = pd.DataFrame({"day": dates, "revenue": np.sin(np.arange(2000) / 50.0) + 2})
+    chart = prepare_chart(df, "day", "revenue", time_series=True, max_points=40)
+    validate_chart(chart)
+    assert chart.count("<Row>") == 40
+
+
+def test_chart_tool_returns_a_marker_that_is_expanded_afterwards(monkeypatch):
+    # The agents package exports the agent object under the module's name
+    analyst = importlib.import_module("agents.data_analyst_agent20")
+
+    rows = [("Rock", 10.0), ("Jazz", 4.0)]
+    monkeypatch.setattr(analyst, "run_job_query", lambda query: (["genre", "sales"], rows))
+    tool_output = analyst.chart_data_tool("select genre, sales from genre_sales", "genre", "sales")
+    # Only the marker goes back to the model, never the data points
+    assert "Rock" not in tool_output
+    chart_id = tool_output.split("[[")[1].split("]]")[0]
+
+    answer = f'<Slide id="s1"><Chart ref="{chart_id}"/></Slide>'
+    expanded = analyst.expand_chart_markers(answer)
+    assert "ref=" not in expanded
+    assert expanded.count("<Row>") == 2 and "Rock" in expanded
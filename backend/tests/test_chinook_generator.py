@@ -0,0 +1,55 @@
+from benchmarks.chinook_generator import (
+    Cardinalities,
+    ChinookGenerator,
+    CopyStream,
+    format_copy_row,
+    load_seed,
+)
+
+SEED = load_seed()
+
+
+def generate(cardinalities, seed_value=0):
+    return {table: (columns, list(rows)) for table, columns, rows in ChinookGenerator(SEED, cardinalities, seed_value).tables()}
+
+
+def test_seed_is_parsed_with_deferred_keys():
+    assert len(SEED.tables["track"].rows) == 3503
+    assert len(SEED.tables["invoice_line"].rows) == 2240
+    assert ("Guns N' Roses",) == SEED.tables["artist"].rows[87][1:]
+    assert not any("PRIMARY KEY" in statement for statement in SEED.create_statements)
+    assert "ALTER TABLE track ADD CONSTRAINT track_pkey PRIMARY KEY (track_id);" in SEED.post_load_statements
+    assert "CREATE INDEX track_album_id_idx ON track (album_id);" in SEED.post_load_statements
+
+
+def test_scaled_tables_have_requested_cardinalities_and_valid_keys():
+    cardinalities = Cardinalities(tracks=5000, customers=120, invoices=900)
+    tables = generate(cardinalities)
+    assert len(tables["track"][1]) == 5000
+    assert len(tables["customer"][1]) == 120
+    assert len(tables["invoice"][1]) == 900
+
+    track_prices = {row[0]: round(row[8] * 100) for row in tables["track"][1]}
+    customer_ids = {row[0] for row in tables["customer"][1]}
+    assert len(track_prices) == 5000 and len(customer_ids) == 120
+    line_totals = {}
+    for _, invoice_id, track_id, unit_price, quantity in tables["invoice_line"][1]:
+        assert round(float(unit_price) * 100) == track_prices[track_id]
+        line_totals[invoice_id] = line_totals.get(invoice_id, 0) + round(float(unit_price) * 100) * quantity
+    for invoice_id, customer_id, *_, total in tables["invoice"][1]:
+        assert customer_id in customer_ids
+        assert round(float(total) * 100) == line_totals[invoice_id]
+
+
+def test_output_is_reproducible():
+    cardinalities = Cardinalities(tracks=4000, customers=80, invoices=200)
+    assert generate(cardinalities)["invoice_line"] == generate(cardinalities)["invoice_line"]
+    assert generate(cardinalities)["invoice"] != generate(cardinalities, seed_value=1)["invoice"]
+
+
+def test_copy_rows_are_escaped_and_streamed():
+    assert format_copy_row((1, None, "a\tb\\c\nd")) == "1\t\\N\ta\\tb\\\\c\\nd\n"
+    stream = CopyStream(((i, f"row {i}") for i in range(1000)), batch=100)
+    data = b"".join(iter(lambda: stream.read(64), b""))
+    assert data.decode().splitlines()[999] == "999\trow 999"
+    assert stream.rows == 1000
@@ -0,0 +1,68 @@
+from decimal import Decimal
+
+from agent_utils.context_budget import (
+    MESSAGE_SHARE,
+    context_budget_metrics,
+    estimate_tokens,
+    fit_prompt,
+    fit_records,
+    fit_sections,
+    trim_text,
+)
+
+
+def test_estimate_counts_words_numbers_and_markup():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("total revenue") == 4
+    assert estimate_tokens('<Field name="q" value="1920000"/>') > estimate_tokens("Field name q value 1920000")
+
+
+def test_trim_keeps_head_and_tail():
+    text = "\n".join(f"- column_{i}: integer" for i in range(500))
+    trimmed = trim_text(text, 200)
+    assert estimate_tokens(trimmed) <= 220
+    assert trimmed.startswith("- column_0: integer")
+    assert trimmed.endswith("- column_499: integer")
+    assert "tokens omitted to fit the context budget" in trimmed
+    assert trim_text("short", 200) == "short"
+
+
+def test_largest_section_is_trimmed_first():
+    context_budget_metrics.reset()
+    sections = {"prompt": "Make a Q4 deck " * 20, "schema": "## invoice\n- total: numeric\n" * 400}
+    fitted = fit_sections(sections, 1500, "agent")
+    assert fitted["prompt"] == sections["prompt"]
+    assert sum(estimate_tokens(text) for text in fitted.values()) <= 1500
+    assert context_budget_metrics.snapshot()["agent"]["sections"] == {"schema": 1}
+
+
+def test_untrimmable_sections_stay_whole():
+    sections = {"schema": "<xs:element/>" * 300, "text": "word " * 1000}
+    fitted = fit_sections(sections, 2000, "format_text_to_xml", trimmable=("text",))
+    assert fitted["schema"] == sections["schema"]
+    assert len(fitted["text"]) < len(sections["text"])
+
+
+def test_prompt_within_budget_is_unchanged():
+    parts, state = ["Interpret the job request"], {"prompt": "Q4", "audiences": ["CFO"]}
+    assert fit_prompt("JobInterpreterAgent", parts, state) == (parts, state)
+
+
+def test_state_repeating_a_message_is_counted_once(monkeypatch):
+    slide_xml = "<SlideIdea>" + "<DataInsights>revenue by genre and country</DataInsights>" * 300 + "</SlideIdea>"
+    # Room for one copy of the slide XML, not for two
+    monkeypatch.setenv("AGENT_CONTEXT_BUDGET_SLIDE_AGENT", str(int(estimate_tokens(slide_xml) * 1.5 / MESSAGE_SHARE)))
+    parts, state = fit_prompt("slide_agent", [slide_xml], {"slide_xml": slide_xml})
+    assert parts == [slide_xml]
+    assert state == {"slide_xml": slide_xml}
+
+
+def test_large_results_are_cut_and_summarized():
+    records = [{"genre": f"genre {i}", "total": Decimal(i)} for i in range(2000)]
+    fitted = fit_records(records, "postgres_query_tool", max_tokens=500)
+    assert estimate_tokens(fitted) <= 500
+    assert fitted.startswith("[{'genre': 'genre 0'")
+    assert "rows omitted to fit the context budget, 2000 rows in total" in fitted
+    assert "total: min 0, max 1999, sum 1999000" in fitted
+    small = [{"genre": "Rock", "total": 1}]
+    assert fit_records(small, "postgres_query_tool") == str(small)
@@ -0,0 +1,52 @@
+import pytest
+
+from agent_utils.job_context import current_datasource
+from agents.services.datasources import DataSource, DataSourceRegistry, UnknownDataSource
+
+
+def test_env_adds_and_overrides_sources(monkeypatch):
+    monkeypatch.setenv("DATASOURCES", '{"sales": {"dbname": "sales", "host": "warehouse"}, "chinook": {"pool_size": 2}}')
+    registry = DataSourceRegistry.from_env()
+
+    assert "sales" in registry and "nordic_startups" in registry
+    assert registry.get("sales").host == "warehouse"
+    chinook = registry.get("chinook")
+    assert chinook.pool_size == 2 and chinook.dbname == "chinook"
+    assert {source["name"] for source in registry.describe()} == {"chinook", "nordic_startups", "sales"}
+
+
+def test_get_falls_back_to_job_source_then_default():
+    registry = DataSourceRegistry({"a": {"dbname": "a"}, "b": {"dbname": "b"}}, default="a")
+    assert registry.get().name == "a"
+    token = current_datasource.set("b")
+    try:
+        assert registry.get().name == "b"
+        assert registry.get("a").name == "a"
+    finally:
+        current_datasource.reset(token)
+    with pytest.raises(UnknownDataSource):
+        registry.get("missing")
+
+
+def test_password_is_not_in_repr():
+    assert "secret" not in repr(DataSource(name="a", dbname="a", password="secret"))
+
+
+def test_schema_doc_is_introspected_once(monkeypatch):
+    source = DataSource(name="shop", dbname="shop", description="A small shop.")
+    calls = []
+
+    def query(sql, params=None):
+        calls.append(sql)
+        return ["table_name", "column_name", "data_type"], [
+            ("customer", "id", "integer"),
+            ("customer", "name", "text"),
+            ("orders", "total", "numeric"),
+        ]
+
+    monkeypatch.setattr(source, "_query_postgres", query)
+    doc = source.get_schema_doc()
+    assert doc.startswith("# shop database schema\n\nA small shop.")
+    assert "## customer\n- id: integer\n- name: text\n\n## orders\n- total: numeric" in doc
+    assert source.get_schema_doc() == doc
+    assert len(calls) == 1
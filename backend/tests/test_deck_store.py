@@ -0,0 +1,20 @@
+from redis_utils.deck_store import build_deck_record
+
+
+SLIDES = [{"slideId": "s1", "xml": "<Slide id=\"s1\"><Text mode=\"content\"><Content>Hi</Content></Text></Slide>"}]
+
+
+def test_deck_record_round_trip():
+    record = build_deck_record("job-1", "<SlideIdeas/>", SLIDES)
+    assert record.document() == {"jobId": "job-1", "slideIdeas": "<SlideIdeas/>", "slides": SLIDES}
+    assert record.summary["slideCount"] == 1
+    assert record.summary["slideIds"] == ["s1"]
+
+
+def test_etag_and_body_are_deterministic():
+    first = build_deck_record("job-1", "<SlideIdeas/>", SLIDES)
+    second = build_deck_record("job-1", "<SlideIdeas/>", SLIDES)
+    changed = build_deck_record("job-1", "<SlideIdeas/>", SLIDES + SLIDES)
+    assert first.etag == second.etag
+    assert first.body == second.body
+    assert first.etag != changed.etag
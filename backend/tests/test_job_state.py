@@ -0,0 +1,37 @@
+import asyncio
+
+from redis_utils import job_state
+
+
+class FakeRedis:
+    def __init__(self):
+        self.hashes = {}
+
+    async def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update({k: str(v) for k, v in mapping.items()})
+
+    async def expire(self, key, seconds):
+        pass
+
+    async def hget(self, key, field):
+        return self.hashes.get(key, {}).get(field)
+
+
+def test_retried_job_is_not_stopped_by_an_earlier_cancel(monkeypatch):
+    monkeypatch.setattr(job_state, "redis_client", FakeRedis())
+
+    async def scenario():
+        await job_state.init_job("job-1")
+        job_state.track_job("job-1")
+        # The cancelled run is still unwinding in this process
+        job_state._cancelled_jobs.add("job-1")
+        assert job_state.is_job_active("job-1")
+        assert await job_state.is_cancelled("job-1")
+
+        job_state.forget_job("job-1")
+        assert not job_state.is_job_active("job-1")
+        job_state._cancelled_jobs.add("job-1")
+        await job_state.init_job("job-1")
+        return await job_state.is_cancelled("job-1")
+
+    assert asyncio.run(scenario()) is False
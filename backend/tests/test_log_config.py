@@ -0,0 +1,72 @@
+import io
+import json
+import logging
+
+from agent_utils.job_context import current_job_id
+from agent_utils.log_config import ContextFilter, Payload, configure_logging, payload, set_logging, stop_logging
+
+
+def record(name="agent_utils.run_ai_agent", level=logging.INFO):
+    return logging.LogRecord(name, level, __file__, 1, "message", (), None)
+
+
+def test_long_payloads_are_truncated_with_length_and_hash():
+    text = "<Slide>" + "x" * 1000 + "</Slide>"
+    short = str(payload(text, limit=20))
+    assert short.startswith("<Slide>xxxxxxxxxxxxx...")
+    assert "[1015 chars, sha1 " in short
+    assert str(payload(text, limit=20)) == short
+    assert str(payload("<Slide/>", limit=20)) == "<Slide/>"
+
+
+def test_full_payloads_on_demand():
+    text = "y" * 100
+    try:
+        set_logging(full_payloads=True)
+        assert str(payload(text, limit=10)) == text
+    finally:
+        set_logging(full_payloads=False)
+    assert Payload.full is False
+
+
+def test_payloads_are_rendered_lazily():
+    calls = []
+
+    def render():
+        calls.append(1)
+        return "<SlideIdeas/>"
+
+    logger = logging.getLogger("test_log_config.lazy")
+    logger.setLevel(logging.INFO)
+    logger.debug("Outline: %s", payload(render))
+    assert calls == []
+
+
+def test_sampling_keeps_warnings_and_unlisted_loggers():
+    sampler = ContextFilter({"agent_utils.run_ai_agent": 0.0, "agent_utils": 1.0})
+    assert not sampler.filter(record())
+    assert sampler.filter(record(level=logging.WARNING))
+    assert sampler.filter(record(name="agent_utils.scheduler"))
+    assert sampler.filter(record(name="jobs_router"))
+
+
+def test_json_records_carry_the_job_id():
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    out = io.StringIO()
+    token = current_job_id.set("job-7")
+    try:
+        configure_logging(level="INFO", fmt="json", stream=out)
+        logging.getLogger("run_agent_workflow").info("Architect result: %s", payload("z" * 50, limit=5))
+        stop_logging()
+    finally:
+        current_job_id.reset(token)
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        for handler in handlers:
+            root.addHandler(handler)
+        root.setLevel(level)
+    entry = json.loads(out.getvalue().strip())
+    assert entry["jobId"] == "job-7"
+    assert entry["logger"] == "run_agent_workflow"
+    assert entry["message"].startswith("Architect result: zzzzz... [50 chars")
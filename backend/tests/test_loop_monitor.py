@@ -0,0 +1,49 @@
+import asyncio
+import time
+
+from agent_utils.loop_monitor import LagHistogram, LoopMonitor
+
+
+def blocking_report():
+    time.sleep(0.3)
+
+
+def test_histogram_is_cumulative():
+    histogram = LagHistogram(buckets=(0.01, 0.1, 1.0))
+    for lag in (0.001, 0.05, 0.05, 2.0):
+        histogram.record(lag)
+    snapshot = histogram.snapshot()
+    assert snapshot["buckets"] == {"0.01": 1, "0.1": 3, "1.0": 3, "+Inf": 4}
+    assert snapshot["count"] == 4
+    assert snapshot["max"] == 2.0
+
+
+def test_blocking_call_is_captured():
+    monitor = LoopMonitor(interval=0.02, threshold=0.1)
+
+    async def run():
+        monitor.start()
+        await asyncio.sleep(0.1)
+        blocking_report()
+        await asyncio.sleep(0.1)
+        await monitor.stop()
+
+    asyncio.run(run())
+    assert len(monitor.stalls) == 1
+    stall = monitor.stalls[0]
+    assert "blocking_report" in stall["stack"]
+    assert stall["lagSeconds"] >= 0.25
+    assert monitor.lag.snapshot()["max"] >= 0.25
+
+
+def test_idle_loop_has_no_stalls():
+    monitor = LoopMonitor(interval=0.02, threshold=0.1)
+
+    async def run():
+        monitor.start()
+        await asyncio.sleep(0.2)
+        await monitor.stop()
+
+    asyncio.run(run())
+    assert not monitor.stalls
+    assert monitor.lag.snapshot()["count"] > 0
@@ -0,0 +1,37 @@
+import pstats
+
+from agent_utils.profiling import JobProfiler
+
+
+def build_rows(n):
+    return [{"index": i, "label": str(i) * 10} for i in range(n)]
+
+
+def test_profile_covers_stages_and_functions(tmp_path):
+    profiler = JobProfiler("job-1")
+    assert profiler.start()
+    profiler.on_stage("slides", False)
+    rows = build_rows(20000)
+    profiler.on_stage("slides", True)
+    summary, stats = profiler.stop()
+    assert len(rows) == 20000
+
+    assert any("build_rows" in entry["function"] for entry in summary["topFunctions"])
+    stage = summary["stages"]["slides"]
+    assert stage["tracedBytes"] > 0
+    assert stage["topAllocations"][0]["sizeDiff"] > 0
+    assert "test_profiling.py" in stage["topAllocations"][0]["location"]
+    # The raw stats are a regular pstats dump file
+    path = tmp_path / "job-1.pstats"
+    path.write_bytes(stats)
+    loaded = pstats.Stats(str(path))
+    assert any(name == "build_rows" for (_, _, name) in loaded.stats)
+
+
+def test_one_job_profiled_at_a_time():
+    first, second = JobProfiler("job-1"), JobProfiler("job-2")
+    assert first.start()
+    assert not second.start()
+    first.stop()
+    assert second.start()
+    second.stop()
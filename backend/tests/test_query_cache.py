@@ -0,0 +1,134 @@
+import datetime
+from decimal import Decimal
+
+from agents.services.query_cache import JobQueryCache, normalize_sql
+
+
+class FakeDatabase:
+    def __init__(self, results):
+        self.results = results
+        self.calls = []
+
+    def __call__(self, query):
+        self.calls.append(query)
+        return self.results[normalize_sql(query)]
+
+
+GENRE_SALES = "select g.name, count(*) as sales from invoice_line il join track t on il.track_id = t.track_id join genre g on t.genre_id = g.genre_id group by g.name"
+GENRE_ROWS = [("Rock", 835), ("Latin", 386), ("Metal", 264), ("Jazz", 80)]
+
+
+def test_repeated_query_served_from_cache():
+    db = FakeDatabase({GENRE_SALES: (["name", "sales"], GENRE_ROWS)})
+    cache = JobQueryCache("job")
+    first = cache.execute(GENRE_SALES, db)
+    second = cache.execute(GENRE_SALES.upper().replace("ROCK", "Rock") + ";", db)
+    assert first == second
+    assert len(db.calls) == 1
+    assert cache.stats()["saved"] == 1
+
+
+def test_filtered_aggregate_derived_from_broader_result():
+    db = FakeDatabase({GENRE_SALES: (["name", "sales"], GENRE_ROWS)})
+    cache = JobQueryCache("job")
+    cache.execute(GENRE_SALES, db)
+
+    query = GENRE_SALES.replace("group by", "where g.name in ('Rock', 'Jazz') group by") + " order by sales asc limit 1"
+    colnames, rows = cache.execute(query, db)
+    assert colnames == ["name", "sales"]
+    assert rows == [("Jazz", 80)]
+    assert len(db.calls) == 1
+    assert cache.stats()["derived_hits"] == 1
+
+
+def test_filter_on_aggregate_is_not_derived():
+    having = GENRE_SALES.replace("count(*) as sales from invoice_line il", "count(*) as sales from invoice_line il")
+    db = FakeDatabase({
+        GENRE_SALES: (["name", "sales"], GENRE_ROWS),
+        normalize_sql(having.replace("group by", "where il.quantity > 1 group by")): (["name", "sales"], []),
+    })
+    cache = JobQueryCache("job")
+    cache.execute(GENRE_SALES, db)
+    cache.execute(having.replace("group by", "where il.quantity > 1 group by"), db)
+    assert len(db.calls) == 2
+
+
+def test_date_filter_on_plain_select():
+    base = "select invoice_id, invoice_date, total from invoice"
+    rows = [(1, datetime.datetime(2021, 1, 1), 5), (2, datetime.datetime(2022, 6, 1), 8)]
+    db = FakeDatabase({base: (["invoice_id", "invoice_date", "total"], rows)})
+    cache = JobQueryCache("job")
+    cache.execute(base, db)
+    _, derived = cache.execute(base + " where invoice_date >= '2022-01-01' and total > 1", db)
+    assert derived == [rows[1]]
+    assert len(db.calls) == 1
+
+
+def test_window_functions_are_not_derived():
+    base = "select name, row_number() over (order by sales desc) as rn from genre_sales"
+    narrowed = base + " where name = 'Jazz'"
+    db = FakeDatabase({
+        base: (["name", "rn"], [("Rock", 1), ("Latin", 2), ("Jazz", 3)]),
+        normalize_sql(narrowed): (["name", "rn"], [("Jazz", 1)]),
+    })
+    cache = JobQueryCache("job")
+    cache.execute(base, db)
+    assert cache.execute(narrowed, db) == (["name", "rn"], [("Jazz", 1)])
+    assert len(db.calls) == 2
+
+
+def test_order_by_follows_postgres_null_order():
+    base = "select invoice_id, total from invoice"
+    rows = [(1, 5), (2, None), (3, 8)]
+    db = FakeDatabase({base: (["invoice_id", "total"], rows)})
+    cache = JobQueryCache("job")
+    cache.execute(base, db)
+    # Descending puts NULLs first on Postgres
+    assert cache.execute(base + " order by total desc", db)[1] == [(2, None), (3, 8), (1, 5)]
+    assert cache.execute(base + " order by total asc", db)[1] == [(1, 5), (3, 8), (2, None)]
+    assert len(db.calls) == 1
+
+
+def test_order_by_text_is_left_to_the_database():
+    db = FakeDatabase({
+        GENRE_SALES: (["name", "sales"], GENRE_ROWS),
+        normalize_sql(GENRE_SALES + " order by g.name"): (["name", "sales"], sorted(GENRE_ROWS)),
+    })
+    cache = JobQueryCache("job")
+    cache.execute(GENRE_SALES, db)
+    cache.execute(GENRE_SALES + " order by g.name", db)
+    assert len(db.calls) == 2
+
+
+TRACKS = "select name, unit_price from track"
+TRACK_ROWS = [("Balls to the Wall", Decimal("0.99")), ("Fast As a Shark", Decimal("0.99")), ("Hero", Decimal("1.99"))]
+
+
+def test_numeric_equality_filter_matches_decimal_values():
+    db = FakeDatabase({TRACKS: (["name", "unit_price"], TRACK_ROWS)})
+    cache = JobQueryCache("job")
+    cache.execute(TRACKS, db)
+    assert cache.execute(TRACKS + " where unit_price = 0.99", db)[1] == TRACK_ROWS[:2]
+    assert cache.execute(TRACKS + " where unit_price <> 0.99", db)[1] == TRACK_ROWS[2:]
+    assert len(db.calls) == 1
+
+
+def test_numeric_range_filter_is_exact():
+    db = FakeDatabase({TRACKS: (["name", "unit_price"], TRACK_ROWS)})
+    cache = JobQueryCache("job")
+    cache.execute(TRACKS, db)
+    assert cache.execute(TRACKS + " where unit_price > 0.99", db)[1] == TRACK_ROWS[2:]
+    assert cache.execute(TRACKS + " where unit_price >= 1", db)[1] == TRACK_ROWS[2:]
+    assert len(db.calls) == 1
+
+
+def test_range_filter_on_text_is_left_to_the_database():
+    narrowed = GENRE_SALES.replace("group by", "where g.name > 'Latin' group by")
+    db = FakeDatabase({
+        GENRE_SALES: (["name", "sales"], GENRE_ROWS),
+        normalize_sql(narrowed): (["name", "sales"], [("Rock", 835), ("Metal", 264)]),
+    })
+    cache = JobQueryCache("job")
+    cache.execute(GENRE_SALES, db)
+    cache.execute(narrowed, db)
+    assert len(db.calls) == 2
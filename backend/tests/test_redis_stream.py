@@ -0,0 +1,77 @@
+import asyncio
+
+import redis_utils.redis_stream as redis_stream
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def xadd(self, key, fields):
+        self.commands.append((key, fields["message"]))
+
+    async def execute(self):
+        self.client.round_trips += 1
+        self.client.streams.extend(self.commands)
+
+
+class FakeClient:
+    def __init__(self):
+        self.round_trips = 0
+        self.streams = []
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+def test_messages_are_batched_in_order(monkeypatch):
+    client = FakeClient()
+    monkeypatch.setattr(redis_stream, "redis_client", client)
+    monkeypatch.setattr(redis_stream, "PUBLISH_BATCH_SIZE", 10)
+
+    async def scenario():
+        for i in range(25):
+            await redis_stream.publish_message("job", f"m{i}\n")
+        await asyncio.sleep(redis_stream.PUBLISH_FLUSH_INTERVAL * 2)
+        await redis_stream.publish_message("job", "last")
+        await redis_stream.flush_messages("job", final=True)
+
+    asyncio.run(scenario())
+    assert [message for _, message in client.streams] == [f"m{i}" for i in range(25)] + ["last"]
+    assert {key for key, _ in client.streams} == {"events:job"}
+    assert client.round_trips == 4
+
+
+def test_failed_flush_keeps_messages_for_the_next_one(monkeypatch):
+    client = FakeClient()
+    monkeypatch.setattr(redis_stream, "redis_client", client)
+    failures = [ConnectionError("redis went away")]
+    execute = FakePipeline.execute
+
+    async def flaky_execute(self):
+        if failures:
+            raise failures.pop()
+        await execute(self)
+
+    monkeypatch.setattr(FakePipeline, "execute", flaky_execute)
+
+    async def scenario():
+        await redis_stream.publish_message("flaky", "first")
+        try:
+            await redis_stream.flush_messages("flaky")
+        except ConnectionError:
+            pass
+        await redis_stream.publish_message("flaky", "second")
+        await redis_stream.flush_messages("flaky", final=True)
+
+    asyncio.run(scenario())
+    assert [message for _, message in client.streams] == ["first", "second"]
+    assert "flaky" not in redis_stream._pending
+    assert "flaky" not in redis_stream._flush_locks
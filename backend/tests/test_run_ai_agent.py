@@ -0,0 +1,82 @@
+import asyncio
+from types import SimpleNamespace
+
+from agent_utils import run_ai_agent as module
+from agent_utils.call_policy import AgentCallPolicy
+
+
+class FakeEvent:
+    usage_metadata = None
+    actions = None
+
+    def __init__(self, text, final=False):
+        self.text = text
+        self.final = final
+        self.content = SimpleNamespace(parts=[SimpleNamespace(text=text)])
+
+    def __str__(self):
+        return self.text
+
+    def get_function_calls(self):
+        return []
+
+    def is_final_response(self):
+        return self.final
+
+
+def install_fakes(monkeypatch, run_async):
+    published = []
+
+    async def publish_message(job_id, message, event=None, data=None):
+        published.append(message)
+
+    async def not_cancelled(job_id):
+        return None
+
+    class FakeRunner:
+        def __init__(self, **kwargs):
+            pass
+
+        def run_async(self, **kwargs):
+            return run_async(published)
+
+    monkeypatch.setattr(module, "publish_message", publish_message)
+    monkeypatch.setattr(module, "raise_if_cancelled", not_cancelled)
+    monkeypatch.setattr(module, "Runner", FakeRunner)
+    return published
+
+
+def call(policy):
+    agent = SimpleNamespace(name="TestAgent")
+    return asyncio.run(module.run_ai_agent(agent, "job-1", {}, ["hello"], "test_app", policy=policy))
+
+
+def test_first_attempt_streams_events_live(monkeypatch):
+    seen_before_final = []
+
+    async def run_async(published):
+        yield FakeEvent("thinking")
+        seen_before_final.extend(published)
+        yield FakeEvent("answer", final=True)
+
+    published = install_fakes(monkeypatch, run_async)
+    assert call(AgentCallPolicy(timeout=5, retries=0)) == "answer"
+    assert seen_before_final == ["thinking"]
+    assert published == ["thinking", "answer"]
+
+
+def test_retry_publishes_its_events_once_it_succeeds(monkeypatch):
+    attempts = []
+
+    async def run_async(published):
+        attempts.append(list(published))
+        yield FakeEvent(f"step {len(attempts)}")
+        if len(attempts) == 1:
+            raise ConnectionError("reset")
+        yield FakeEvent("answer", final=True)
+
+    published = install_fakes(monkeypatch, run_async)
+    assert call(AgentCallPolicy(timeout=5, retries=1, backoff_base=0.001, backoff_max=0.001)) == "answer"
+    # The retry ran silently and its events followed the failed attempt's live ones
+    assert attempts == [[], ["step 1"]]
+    assert published == ["step 1", "step 2", "answer"]
@@ -0,0 +1,87 @@
+import pytest
+
+from agent_utils.sandbox_pool import SandboxPool
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = SandboxPool(size=1, max_runs=2, cpu_seconds=5, memory_mb=256, timeout=5)
+    yield pool
+    pool.close()
+
+
+def test_runs_code_with_preloaded_modules(pool):
+    result = pool.run("print(int(np.arange(4).sum()), len(pd.DataFrame({'a': [1, 2]})))")
+    assert result.ok
+    assert result.stdout.strip() == "6 2"
+
+
+def test_reports_errors(pool):
+    result = pool.run("raise ValueError('boom')")
+    assert not result.ok
+    assert "ValueError: boom" in result.error
+
+
+def test_timeout_replaces_worker(pool):
+    result = pool.run("while True: pass", timeout=0.5)
+    assert not result.ok
+    assert "timed out" in result.error
+    assert pool.run("print('alive')").stdout.strip() == "alive"
+
+
+def test_memory_limit(pool):
+    result = pool.run("x = bytearray(1024 * 1024 * 1024)", memory_mb=64)
+    assert not result.ok
+    assert "Memory" in result.error
+
+
+def test_worker_recycled_after_max_runs(pool):
+    pids = [pool.run("import os; print(os.getpid())").stdout.strip() for _ in range(3)]
+    assert pids[0] == pids[1]
+    assert pids[2] != pids[1]
+
+
+def test_backend_secrets_are_not_inherited(pool, monkeypatch):
+    monkeypatch.setenv("GOOGLE_API_KEY", "secret-key")
+    replacement = SandboxPool(size=1, timeout=5)
+    try:
+        result = replacement.run("import os; print(sorted(os.environ))")
+        assert result.ok
+        assert "GOOGLE_API_KEY" not in result.stdout
+        assert "secret-key" not in pool.run("print(open('/proc/self/environ').read())").stdout
+    finally:
+        replacement.close()
+
+
+@pytest.mark.parametrize(
+    "code",
+    [
+        "import socket; socket.create_connection(('127.0.0.1', 5432), timeout=1)",
+        "import urllib.request; urllib.request.urlopen('http://example.com', timeout=1)",
+        "import subprocess; subprocess.run(['cat', '/etc/passwd'])",
+        "print(open('/etc/passwd').read())",
+        "open('/tmp/escaped.txt', 'w').write('x')",
+    ],
+)
+def test_network_processes_and_files_outside_scratch_are_blocked(pool, code):
+    result = pool.run(code)
+    assert not result.ok
+    assert "not allowed" in result.error
+
+
+def test_scratch_directory_is_writable(pool):
+    result = pool.run("pd.DataFrame({'a': [1, 2]}).to_csv('out.csv'); print(open('out.csv').read().count('\\n'))")
+    assert result.ok, result.error
+    assert result.stdout.strip() == "3"
+
+
+def test_waiting_for_a_worker_times_out():
+    busy = SandboxPool(size=1, timeout=5, acquire_timeout=0.2)
+    try:
+        worker = busy._idle.get()
+        result = busy.run("print('never')")
+        assert not result.ok
+        assert "No sandbox worker available" in result.error
+        busy._idle.put(worker)
+    finally:
+        busy.close()
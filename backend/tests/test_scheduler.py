@@ -0,0 +1,121 @@
+import asyncio
+
+from agent_utils.scheduler import FairScheduler, Priority
+
+
+async def run_all(scheduler, requests, hold=0.01):
+    """Submit (tenant, priority) requests in order; return the order in which they got a slot."""
+    order = []
+
+    async def request(index, tenant, priority):
+        async with scheduler.slot(tenant, priority):
+            order.append(index)
+            await asyncio.sleep(hold)
+
+    blocker = asyncio.Event()
+
+    async def occupy():
+        async with scheduler.slot("setup", Priority.INTERACTIVE):
+            await blocker.wait()
+
+    # Keep every slot busy while the requests queue up, so the order is decided by the scheduler alone
+    holders = [asyncio.create_task(occupy()) for _ in range(scheduler.capacity)]
+    await asyncio.sleep(0)
+    tasks = [asyncio.create_task(request(i, tenant, priority)) for i, (tenant, priority) in enumerate(requests)]
+    await asyncio.sleep(0)
+    blocker.set()
+    await asyncio.gather(*holders, *tasks)
+    return order
+
+
+def test_tenants_alternate_instead_of_first_come_first_served():
+    scheduler = FairScheduler("test", capacity=1, interactive_reserve=0, weights={})
+    requests = [("heavy", Priority.BATCH)] * 4 + [("light", Priority.BATCH)] * 2
+    order = asyncio.run(run_all(scheduler, requests))
+    assert order[:4] == [0, 4, 1, 5]
+
+
+def test_weights_give_a_larger_share():
+    scheduler = FairScheduler("test", capacity=1, interactive_reserve=0, weights={"gold": 2})
+    requests = [("gold", Priority.BATCH)] * 4 + [("basic", Priority.BATCH)] * 2
+    order = asyncio.run(run_all(scheduler, requests))
+    assert order[:3].count(4) + order[:3].count(5) == 1
+
+
+def test_interactive_goes_first_and_batch_keeps_off_the_reserve():
+    scheduler = FairScheduler("test", capacity=2, interactive_reserve=1, weights={})
+    requests = [("a", Priority.BATCH)] * 3 + [("b", Priority.INTERACTIVE)]
+    order = asyncio.run(run_all(scheduler, requests))
+    assert order[0] == 3
+
+    async def spike():
+        running = []
+
+        async def batch():
+            async with scheduler.slot("a", Priority.BATCH):
+                running.append(scheduler.snapshot()["running"]["batch"])
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(batch() for _ in range(5)))
+        return max(running)
+
+    assert asyncio.run(spike()) == 1
+
+
+def test_starving_batch_work_is_promoted():
+    scheduler = FairScheduler("test", capacity=1, interactive_reserve=0, batch_max_wait=0.0, weights={})
+    order = asyncio.run(run_all(scheduler, [("a", Priority.BATCH), ("b", Priority.INTERACTIVE)]))
+    assert order == [0, 1]
+
+
+def test_cancelled_waiter_gives_up_its_place():
+    async def scenario():
+        scheduler = FairScheduler("test", capacity=1, interactive_reserve=0, weights={})
+        release = asyncio.Event()
+
+        async def hold():
+            async with scheduler.slot("a"):
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        assert scheduler.snapshot()["queued"]["interactive"] == 1
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        release.set()
+        await holder
+        snapshot = scheduler.snapshot()
+        assert snapshot["running"] == {"interactive": 0, "batch": 0}
+        assert snapshot["queued"]["interactive"] == 0
+        assert snapshot["wait"]["interactive"]["calls"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_withdrawn_requests_leave_the_queue():
+    scheduler = FairScheduler("test", capacity=1, interactive_reserve=0, weights={})
+    order = []
+
+    async def request(index, key):
+        try:
+            async with scheduler.slot("tenant", Priority.BATCH, key=key):
+                order.append(index)
+                await asyncio.sleep(0.01)
+        except LookupError as e:
+            order.append(str(e))
+
+    async def scenario():
+        tasks = [asyncio.create_task(request(i, key)) for i, key in enumerate(["a", "b", "c", "b"])]
+        await asyncio.sleep(0)
+        assert scheduler.snapshot()["queued"]["batch"] == 3
+        # "a" already holds the slot and keeps it; both queued "b" requests are dropped
+        assert scheduler.withdraw("b", LookupError("cancelled")) == 2
+        assert scheduler.withdraw("a", LookupError("cancelled")) == 0
+        assert scheduler.snapshot()["queued"]["batch"] == 1
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    assert order == [0, "cancelled", "cancelled", 2]
+    assert scheduler._keyed == {}
@@ -0,0 +1,151 @@
+import asyncio
+
+import numpy as np
+from lxml import etree
+
+from agents.services import semantic_cache
+from agents.services.semantic_cache import HashingEmbedder, SemanticSlideCache, retarget_slide
+
+NS = "{http://www.complonkers-hackathon/slide_ideas}"
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    async def execute(self):
+        return [await getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+class FakeRedis:
+    def __init__(self):
+        self.hash = {}
+        self.zset = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def hset(self, key, field, value):
+        self.hash[field] = value
+
+    async def hmget(self, key, fields):
+        return [self.hash.get(field) for field in fields]
+
+    async def hdel(self, key, *fields):
+        for field in fields:
+            self.hash.pop(field, None)
+
+    async def zadd(self, key, mapping):
+        self.zset.update(mapping)
+
+    async def zcard(self, key):
+        return len(self.zset)
+
+    async def zpopmin(self, key, count):
+        popped = sorted(self.zset.items(), key=lambda item: item[1])[:count]
+        for member, _ in popped:
+            del self.zset[member]
+        return popped
+
+    async def zrem(self, key, *members):
+        for member in members:
+            self.zset.pop(member, None)
+
+    async def zrangebyscore(self, key, low, high, withscores=False):
+        # Only the forms the cache uses: "(low" to "+inf" and "-inf" to "(high"
+        low, high = float(low.lstrip("(")), float(high.lstrip("("))
+        return sorted(((m, s) for m, s in self.zset.items() if low < s < high), key=lambda item: item[1])
+
+
+def idea(title, description, insights, slide_id="new-slide"):
+    element = etree.Element(NS + "SlideIdea")
+    for name, text in [("SlideId", slide_id), ("Title", title), ("ContentDescription", description), ("DataInsights", insights)]:
+        etree.SubElement(element, NS + name).text = text
+    return element
+
+
+GENRES = idea("Top genres by revenue", "Which music genres earn the most", "Total revenue per genre, top 10")
+SLIDE = '<Slide id="old-slide"><Text mode="content"><Content>Rock leads</Content></Text></Slide>'
+
+
+def test_embedder_ranks_near_duplicates_higher():
+    embedder = HashingEmbedder()
+    base = embedder.embed("Top genres by revenue. Total revenue per genre, top 10")
+    close = embedder.embed("Top genres by total revenue. Revenue per genre, top 10 genres")
+    other = embedder.embed("Employee headcount by office location")
+    assert np.isclose(np.linalg.norm(base), 1.0)
+    assert base @ close > base @ other
+
+
+def test_lookup_reuses_exact_and_misses_unrelated(monkeypatch):
+    monkeypatch.setattr(semantic_cache, "SYNC_INTERVAL", 0)
+    cache = SemanticSlideCache(FakeRedis(), max_entries=10)
+    asyncio.run(cache.add(GENRES, SLIDE))
+
+    match = asyncio.run(cache.lookup(idea("Top genres by revenue", "Which music genres earn the most", "Total revenue per genre, top 10")))
+    assert match is not None and match.similarity > 0.99 and match.exact
+    assert 'id="new-slide"' in retarget_slide(match.slide_xml, "new-slide")
+    assert asyncio.run(cache.lookup(idea("Staff", "Employees per office", "Headcount by city"))) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_entries_are_bounded_and_shared_between_processes(monkeypatch):
+    monkeypatch.setattr(semantic_cache, "SYNC_INTERVAL", 0)
+    client = FakeRedis()
+    writer = SemanticSlideCache(client, max_entries=2)
+    ideas = [idea(f"Topic {name}", f"About {name}", f"Count of {name}") for name in ("albums", "tracks", "invoices")]
+    for slide_idea in ideas:
+        asyncio.run(writer.add(slide_idea, SLIDE))
+    assert len(client.hash) == 2
+    assert writer.stats()["entries"] == 2
+
+    reader = SemanticSlideCache(client, max_entries=2)
+    assert asyncio.run(reader.lookup(ideas[2])) is not None
+    assert asyncio.run(reader.lookup(ideas[0])) is None
+
+
+def test_lookup_is_scoped_to_the_datasource(monkeypatch):
+    monkeypatch.setattr(semantic_cache, "SYNC_INTERVAL", 0)
+    cache = SemanticSlideCache(FakeRedis(), max_entries=10)
+    asyncio.run(cache.add(GENRES, SLIDE, "chinook"))
+
+    assert asyncio.run(cache.lookup(GENRES, "nordic_startups")) is None
+    assert asyncio.run(cache.lookup(GENRES, "chinook")) is not None
+
+
+def test_near_duplicates_are_adapted_not_reused(monkeypatch):
+    monkeypatch.setattr(semantic_cache, "SYNC_INTERVAL", 0)
+    cache = SemanticSlideCache(FakeRedis(), max_entries=10)
+    revenue = idea("Top artists by revenue", "Which artists earn the most", "Total revenue per artist, top 5")
+    asyncio.run(cache.add(revenue, SLIDE))
+
+    units = idea("Top artists by units sold", "Which artists sell the most", "Units sold per artist, top 10")
+    match = asyncio.run(cache.lookup(units))
+    # Similar wording, different metric and row count: only a reference for the analyst
+    assert match is None or not match.exact
+    reworded = idea("Top Artists by Revenue.", "Which artists earn the most", "Total revenue per artist - top 5")
+    assert asyncio.run(cache.lookup(reworded)).exact
+
+
+def test_entries_expire(monkeypatch):
+    monkeypatch.setattr(semantic_cache, "SYNC_INTERVAL", 0)
+    client = FakeRedis()
+    cache = SemanticSlideCache(client, max_entries=10, ttl=60)
+    asyncio.run(cache.add(GENRES, SLIDE))
+    now = semantic_cache.time.time()
+    monkeypatch.setattr(semantic_cache.time, "time", lambda: now + 120)
+    assert asyncio.run(cache.lookup(GENRES)) is None
+
+    asyncio.run(cache.add(idea("Topic albums", "About albums", "Count of albums"), SLIDE))
+    # The expired entry is dropped from Redis by the next add
+    assert len(client.hash) == 1 and len(client.zset) == 1
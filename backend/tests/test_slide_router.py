@@ -0,0 +1,54 @@
+from lxml import etree
+
+from agent_utils.metrics import RouteMetrics
+from agents.slide_router import SlideRoute, classify_slide_idea, extract_valid_slide, render_template_slide
+
+
+def slide_idea(insights, title="Revenue & growth", description="How the business is doing"):
+    idea = etree.Element("{http://www.complonkers-hackathon/slide_ideas}SlideIdea")
+    for name, text in [("SlideId", "s1"), ("Title", title), ("ContentDescription", description), ("DataInsights", insights)]:
+        etree.SubElement(idea, "{http://www.complonkers-hackathon/slide_ideas}" + name).text = text
+    return idea
+
+
+def test_classification():
+    assert classify_slide_idea(slide_idea("None")) == SlideRoute.TEMPLATE
+    assert classify_slide_idea(slide_idea("")) == SlideRoute.TEMPLATE
+    assert classify_slide_idea(slide_idea("Total number of customers")) == SlideRoute.LIGHT
+    assert classify_slide_idea(slide_idea("Revenue by genre compared to last year")) == SlideRoute.FULL
+    assert classify_slide_idea(slide_idea("Total revenue, average invoice and customer count")) == SlideRoute.FULL
+
+
+def test_template_slide_is_valid():
+    xml = render_template_slide(slide_idea("None"), "s1")
+    assert extract_valid_slide(xml) == xml.strip()
+    assert "Revenue &amp; growth" in xml
+
+
+def test_template_slide_without_slide_id_uses_the_given_id():
+    idea = slide_idea("None")
+    idea.remove(idea.find("{*}SlideId"))
+    xml = render_template_slide(idea, "slide-3")
+    assert etree.fromstring(xml).get("id") == "slide-3"
+    assert extract_valid_slide(xml) is not None
+
+
+def test_invalid_results_are_rejected():
+    assert extract_valid_slide(None) is None
+    assert extract_valid_slide("Error during XML formatting: quota") is None
+    assert extract_valid_slide('<Slide id="s1"><Chart ref="chart-1a2b3c4d"/></Slide>') is None
+    assert extract_valid_slide('<Slide id="s1"><Text mode="content"><Content>x</Content>') is None
+    assert extract_valid_slide('<Slide id="s1"><Text mode="bold"><Content>x</Content></Text></Slide>') is None
+    fenced = '```xml\n<Slide id="s1"><Text mode="content"><Content>x</Content></Text></Slide>\n```'
+    assert extract_valid_slide(fenced) == '<Slide id="s1"><Text mode="content"><Content>x</Content></Text></Slide>'
+
+
+def test_route_metrics():
+    metrics = RouteMetrics()
+    metrics.record("light", 1.0, success=True)
+    metrics.record("light", 3.0, success=False, escalated=True)
+    light = metrics.snapshot()["light"]
+    assert light["calls"] == 2
+    assert light["successRate"] == 0.5
+    assert light["escalations"] == 1
+    assert light["latencyMean"] == 2.0
@@ -0,0 +1,67 @@
+import json
+
+from lxml import etree
+
+from agents.slide_tree import apply_patch, json_patch, outline_to_json, slide_event, slide_to_tree
+
+SLIDE = (
+    '<Slide xmlns="http://www.complonkers-hackathon/slidedeck" id="genres" classes="p-6">'
+    '<Text mode="content" tag="h1"><Content>Top genres</Content></Text>'
+    '<Container classes="grid">'
+    '<List mode="content" ordered="true"><Content>Rock leads</Content></List>'
+    '<Chart type="bar"><Data>'
+    '<Row><Field name="genre" value="Rock"/><Field name="revenue" value="826.65"/></Row>'
+    '<Row><Field name="genre" value="Latin"/><Field name="revenue" value="382"/></Row>'
+    '</Data></Chart>'
+    '</Container>'
+    '</Slide>'
+)
+
+
+def test_slide_becomes_typed_component_tree():
+    tree = slide_to_tree(SLIDE, "slide-uuid")
+    assert tree["type"] == "Slide" and tree["id"] == "genres" and tree["slideId"] == "slide-uuid"
+    title, container = tree["children"]
+    assert title == {"type": "Text", "tag": "h1", "content": "Top genres"}
+    listing, chart = container["children"]
+    assert listing == {"type": "List", "ordered": True, "content": "Rock leads"}
+    assert chart == {
+        "type": "Chart",
+        "chartType": "bar",
+        "data": [{"genre": "Rock", "revenue": 826.65}, {"genre": "Latin", "revenue": 382}],
+    }
+
+
+def test_patch_round_trips():
+    old = slide_to_tree(SLIDE)
+    new = slide_to_tree(SLIDE.replace("Top genres", "Genres by revenue").replace(
+        '<Row><Field name="genre" value="Latin"/><Field name="revenue" value="382"/></Row>', ""
+    ))
+    patch = json_patch(old, new)
+    assert {"op": "replace", "path": "/children/0/content", "value": "Genres by revenue"} in patch
+    assert {"op": "remove", "path": "/children/1/children/1/data/1"} in patch
+    assert apply_patch(old, patch) == new
+    assert json_patch(new, new) == []
+
+
+def test_regenerated_slide_is_sent_as_patch_when_smaller():
+    event, data = slide_event(SLIDE, "s1")
+    assert event == "slide" and json.loads(data)["slideId"] == "s1"
+
+    edited = SLIDE.replace("Rock leads", "Rock leads by far")
+    event, data = slide_event(edited, "s1", previous_xml=SLIDE)
+    assert event == "slide-patch"
+    assert apply_patch(slide_to_tree(SLIDE, "s1"), json.loads(data)["patch"]) == slide_to_tree(edited, "s1")
+
+    assert slide_event("not xml", "s1") == ("slide", None)
+
+
+def test_outline_to_json():
+    ideas = etree.fromstring(
+        '<SlideIdeas xmlns="http://www.complonkers-hackathon/slide_ideas">'
+        "<SlideIdea><SlideId>a</SlideId><Title>Intro</Title></SlideIdea>"
+        "<SlideIdea><Title>Sales</Title><DataInsights>Revenue</DataInsights></SlideIdea>"
+        "</SlideIdeas>"
+    )
+    outline = outline_to_json(ideas, lambda idea, index: idea.findtext("{*}SlideId") or f"slide-{index + 1}")
+    assert [(o["slideId"], o["title"], o["dataInsights"]) for o in outline] == [("a", "Intro", None), ("slide-2", "Sales", "Revenue")]
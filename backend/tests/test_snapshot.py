@@ -0,0 +1,112 @@
+from contextlib import contextmanager
+from decimal import Decimal
+
+import psycopg2
+import pytest
+
+duckdb = pytest.importorskip("duckdb")
+
+from agents.services.snapshot import COLUMNS_QUERY, TABLES_QUERY, DataSnapshot, SnapshotUnsupported
+
+TABLES = {
+    "invoice": (
+        [("invoice_id", "integer", 32, 0), ("billing_country", "character varying", None, None), ("total", "numeric", 10, 2)],
+        [(1, "Norway", Decimal("1.98")), (2, "Norway", Decimal("3.96")), (3, "Finland", Decimal("5.94"))],
+    ),
+}
+
+
+def query_postgres(sql, params=None):
+    if sql == TABLES_QUERY:
+        return ["table_name"], [(name,) for name in TABLES]
+    if sql == COLUMNS_QUERY:
+        return ["column_name", "data_type", "numeric_precision", "numeric_scale"], TABLES[params[0]][0]
+    raise AssertionError(sql)
+
+
+class FakeCursor:
+    def __init__(self):
+        self.rows = []
+        self.itersize = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql):
+        table = sql.rsplit("FROM ", 1)[1].strip('"')
+        self.rows = list(TABLES[table][1])
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+
+class FakeConnection:
+    """Like psycopg2: pooled connections are in autocommit mode, where named cursors are refused."""
+
+    def __init__(self):
+        self.autocommit = True
+        self.rollbacks = 0
+
+    def cursor(self, name=None):
+        if name is not None and self.autocommit:
+            raise psycopg2.ProgrammingError("can't use a named cursor outside of transactions")
+        return FakeCursor()
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+connections = []
+
+
+@contextmanager
+def connection():
+    conn = FakeConnection()
+    connections.append(conn)
+    yield conn
+
+
+def test_snapshot_answers_queries_in_process(tmp_path):
+    snapshot = DataSnapshot("shop", str(tmp_path / "shop"))
+    snapshot.export(query_postgres, connection)
+    assert snapshot.is_fresh()
+    # The transaction opened for the named cursor is ended and the pooled connection handed back in autocommit mode
+    assert all(conn.autocommit and conn.rollbacks == 1 for conn in connections)
+    snapshot.open()
+
+    colnames, rows = snapshot.query(
+        "SELECT billing_country, SUM(total) AS revenue, COUNT(*) / 2 AS half FROM invoice GROUP BY 1 ORDER BY 1"
+    )
+    assert colnames == ["billing_country", "revenue", "half"]
+    # NUMERIC stays exact and integer division truncates, as on Postgres
+    assert rows == [("Finland", Decimal("5.94"), 0), ("Norway", Decimal("5.94"), 1)]
+    snapshot.close()
+
+
+def test_unsupported_sql_is_reported_for_fallback(tmp_path):
+    snapshot = DataSnapshot("shop", str(tmp_path / "shop"))
+    snapshot.export(query_postgres, connection)
+    snapshot.open()
+    with pytest.raises(SnapshotUnsupported):
+        snapshot.query("SELECT total::money FROM invoice")
+    with pytest.raises(SnapshotUnsupported):
+        snapshot.query("DELETE FROM invoice")
+    # Errors raised while the query runs fall back too, not only parse and bind errors
+    with pytest.raises(SnapshotUnsupported):
+        snapshot.query("SELECT CAST(billing_country AS INTEGER) FROM invoice")
+    with pytest.raises(SnapshotUnsupported):
+        snapshot.query("SELECT regexp_matches(billing_country, '(') FROM invoice")
+    snapshot.close()
+
+
+def test_fresh_export_is_reused(tmp_path):
+    DataSnapshot("shop", str(tmp_path / "shop")).export(query_postgres, connection)
+
+    def fail(*args):
+        raise AssertionError("exported twice")
+
+    DataSnapshot("shop", str(tmp_path / "shop")).export(fail, connection)
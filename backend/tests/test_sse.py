@@ -0,0 +1,45 @@
+import asyncio
+import zlib
+
+from agent_utils.sse import SSEEncoder, TransportMetrics, batched, negotiate_encoding
+
+
+def test_negotiate_encoding():
+    assert negotiate_encoding("gzip, deflate, br") == "gzip"
+    assert negotiate_encoding("deflate;q=0.5, gzip;q=0") == "deflate"
+    assert negotiate_encoding("br") is None
+    assert negotiate_encoding("") is None
+    assert negotiate_encoding("*") == "gzip"
+
+
+def test_every_chunk_decodes_on_arrival_and_repetition_compresses():
+    metrics = TransportMetrics()
+    encoder = SSEEncoder("gzip", metrics=metrics)
+    decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    frame = 'data: <Slide id="s"><Text mode="content" tag="p"><Content>Revenue by genre</Content></Text></Slide>\n\n'
+    for _ in range(20):
+        # A sync flush ends every chunk, so it decodes completely without waiting for the next one
+        assert decoder.decompress(encoder.encode(frame)) == frame.encode()
+    decoder.decompress(encoder.close())
+    assert decoder.eof
+    stats = metrics.snapshot()
+    assert stats["chunks"] == 20 and stats["compressionRatio"] < 0.3
+
+
+def test_identity_encoder_passes_text_through():
+    encoder = SSEEncoder(None, metrics=TransportMetrics())
+    assert encoder.encode("data: x\n\n") == b"data: x\n\n"
+    assert encoder.close() == b""
+
+
+def test_messages_arriving_together_are_batched():
+    async def source():
+        for item in "abc":
+            yield item
+        await asyncio.sleep(0.05)
+        yield "d"
+
+    async def collect():
+        return [batch async for batch in batched(source(), window=0.02, max_batch=2)]
+
+    assert asyncio.run(collect()) == [["a", "b"], ["c"], ["d"]]
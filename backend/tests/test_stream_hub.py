@@ -0,0 +1,114 @@
+import asyncio
+
+from redis_utils.stream_hub import StreamHub
+
+
+class FakeStreamClient:
+    """Minimal in-memory stand-in for the XREAD/XRANGE calls the hub makes."""
+
+    def __init__(self):
+        self.entries = []
+        self.reads = 0
+        self._event = asyncio.Event()
+
+    def add(self, message):
+        self.entries.append((f"{len(self.entries) + 1}-0", {"message": message}))
+        self._event.set()
+
+    async def xread(self, streams, block, count):
+        self.reads += 1
+        (key, last_id), = streams.items()
+        while True:
+            last = int(last_id.split("-")[0])
+            new = self.entries[last:last + count]
+            if new:
+                return [(key, new)]
+            self._event.clear()
+            await asyncio.wait_for(self._event.wait(), block / 1000)
+
+    async def xrange(self, key, start, end):
+        stop = int(end.strip("(").split("-")[0]) - 1
+        return self.entries[:stop]
+
+
+async def collect(subscription, n):
+    out = []
+    async for message in subscription:
+        out.append(message)
+        if len(out) == n:
+            return out
+
+
+def test_many_subscribers_share_one_reader():
+    async def scenario():
+        client = FakeStreamClient()
+        hub = StreamHub(client, block_ms=1000)
+        client.add("a")
+        async with hub.subscribe("job") as first, hub.subscribe("job") as second:
+            tasks = [asyncio.create_task(collect(s, 3)) for s in (first, second)]
+            await asyncio.sleep(0.01)
+            client.add("b")
+            client.add("c")
+            results = await asyncio.gather(*tasks)
+            assert hub.stats() == {"job": {"subscribers": 2, "history": 3}}
+        assert results == [["a", "b", "c"], ["a", "b", "c"]]
+        assert hub.stats() == {}
+        return client.reads
+
+    reads = asyncio.run(scenario())
+    assert reads <= 4
+
+
+def test_late_subscriber_catches_up_from_redis_after_truncation():
+    async def scenario():
+        client = FakeStreamClient()
+        hub = StreamHub(client, history_limit=2, block_ms=1000)
+        for message in "abcd":
+            client.add(message)
+        async with hub.subscribe("job") as first:
+            await collect(first, 4)
+            async with hub.subscribe("job") as late:
+                return await collect(late, 4)
+
+    assert asyncio.run(scenario()) == list("abcd")
+
+
+def test_slow_subscriber_drops_oldest_or_disconnects():
+    async def scenario(policy):
+        client = FakeStreamClient()
+        hub = StreamHub(client, queue_size=2, slow_policy=policy, block_ms=1000)
+        async with hub.subscribe("job") as slow:
+            for message in "abcd":
+                client.add(message)
+            await asyncio.sleep(0.05)
+            received = []
+            async def drain():
+                async for message in slow:
+                    received.append(message)
+            try:
+                await asyncio.wait_for(drain(), 0.1)
+            except asyncio.TimeoutError:
+                pass
+            return received, slow.dropped
+
+    assert asyncio.run(scenario("drop")) == (["c", "d"], 2)
+    assert asyncio.run(scenario("disconnect")) == (["a", "b"], 0)
+
+
+def test_entries_carry_typed_events():
+    async def scenario():
+        client = FakeStreamClient()
+        hub = StreamHub(client, block_ms=1000)
+        client.add("<Slide/>")
+        client.entries[-1][1].update(event="slide", data='{"type":"Slide"}')
+        client.add("log line")
+        async with hub.subscribe("job") as subscription:
+            out = []
+            async for entry in subscription.entries():
+                out.append(entry)
+                if len(out) == 2:
+                    return out
+
+    slide, log = asyncio.run(scenario())
+    assert (slide.message, slide.event, slide.data) == ("<Slide/>", "slide", '{"type":"Slide"}')
+    assert (log.message, log.event) == ("log line", None)
@@ -0,0 +1,74 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from agent_utils.usage import TokenBudgetExceeded, UsageTracker, load_job_usage, usage_from_metadata
+
+
+class FakePipeline:
+    def __init__(self, store):
+        self.store = store
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def hincrby(self, key, field, value):
+        bucket = self.store.setdefault(key, {})
+        bucket[field] = bucket.get(field, 0) + value
+
+    def expire(self, key, ttl):
+        pass
+
+    async def execute(self):
+        pass
+
+
+class FakeRedis:
+    def __init__(self):
+        self.store = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self.store)
+
+    async def hgetall(self, key):
+        return {field: str(value) for field, value in self.store.get(key, {}).items()}
+
+
+def metadata(prompt, completion, cached=0):
+    return SimpleNamespace(prompt_token_count=prompt, candidates_token_count=completion, cached_content_token_count=cached)
+
+
+def test_usage_is_aggregated_per_agent_and_slide():
+    client = FakeRedis()
+    tracker = UsageTracker(client)
+    tracker.record("job", "analyst", "s1", usage_from_metadata(metadata(100, 20, 50), tool_calls=2))
+    tracker.record("job", "analyst", "s2", usage_from_metadata(metadata(80, 10)))
+    tracker.record("job", "interpreter", None, usage_from_metadata(metadata(30, 5)))
+    asyncio.run(tracker.flush("job"))
+
+    usage = asyncio.run(load_job_usage("job", client))
+    assert usage["total"] == {"promptTokens": 210, "completionTokens": 35, "cachedTokens": 50, "toolCalls": 2, "calls": 3}
+    assert usage["agents"]["analyst"]["promptTokens"] == 180
+    assert usage["slides"]["s1"]["toolCalls"] == 2
+    assert "interpreter" not in usage["slides"]
+
+    # A second flush only writes what was recorded since the first one
+    tracker.record("job", "analyst", "s1", usage_from_metadata(metadata(1, 1)))
+    asyncio.run(tracker.flush("job"))
+    assert asyncio.run(load_job_usage("job", client))["total"]["promptTokens"] == 211
+
+
+def test_budget_enforcement():
+    tracker = UsageTracker(FakeRedis())
+    tracker.set_budget("job", 100)
+    tracker.record("job", "analyst", None, usage_from_metadata(metadata(60, 30)))
+    tracker.check_budget("job")
+    tracker.record("job", "analyst", None, usage_from_metadata(metadata(10, 0)))
+    assert tracker.over_budget("job")
+    with pytest.raises(TokenBudgetExceeded):
+        tracker.check_budget("job")
+    assert not tracker.over_budget("other-job")
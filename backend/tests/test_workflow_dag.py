@@ -0,0 +1,143 @@
+import asyncio
+
+import pytest
+
+from agent_utils.workflow_dag import INPUTS_FIELD, Stage, StageFailed, WorkflowDAG
+
+
+class MemoryStore:
+    def __init__(self):
+        self.data = {}
+
+    async def load(self, job_id):
+        return dict(self.data.get(job_id, {}))
+
+    async def get(self, job_id, name):
+        return self.data.get(job_id, {}).get(name)
+
+    async def save(self, job_id, name, value):
+        self.data.setdefault(job_id, {})[name] = value
+
+    async def delete(self, job_id, *names):
+        for name in names:
+            self.data.get(job_id, {}).pop(name, None)
+
+
+def build_dag(calls, fail_in=None):
+    async def double(ctx, x):
+        calls.append("double")
+        return {"doubled": x * 2}
+
+    async def square(ctx, x):
+        calls.append("square")
+        return {"squared": x * x}
+
+    async def combine(ctx, doubled, squared):
+        calls.append("combine")
+        if fail_in == "combine":
+            raise RuntimeError("boom")
+        return {"total": doubled + squared}
+
+    return WorkflowDAG([
+        Stage("combine", combine, inputs=("doubled", "squared"), outputs=("total",)),
+        Stage("double", double, inputs=("x",), outputs=("doubled",)),
+        Stage("square", square, inputs=("x",), outputs=("squared",)),
+    ])
+
+
+def test_stages_run_in_dependency_order():
+    calls = []
+    values = asyncio.run(build_dag(calls).run("job", {"x": 3}))
+    assert values["total"] == 15
+    assert calls[-1] == "combine"
+
+
+def test_stage_listener_sees_start_and_finish():
+    events = []
+    asyncio.run(build_dag([]).run("job", {"x": 3}, on_stage=lambda name, finished: events.append((name, finished))))
+    assert set(events[:2]) == {("double", False), ("square", False)}
+    assert events[-2:] == [("combine", False), ("combine", True)]
+    assert len(events) == 6
+
+
+def test_rerun_resumes_from_checkpoints():
+    store = MemoryStore()
+    calls = []
+    with pytest.raises(RuntimeError):
+        asyncio.run(build_dag(calls, fail_in="combine").run("job", {"x": 3}, store))
+    assert store.data["job"][INPUTS_FIELD] == {"x": 3}
+    assert "combine" not in store.data["job"]
+
+    calls.clear()
+    values = asyncio.run(build_dag(calls).run("job", {"x": 3}, store))
+    assert values["total"] == 15
+    assert calls == ["combine"]
+
+
+def test_stage_checkpoints_survive_failures():
+    store = MemoryStore()
+    attempts = []
+
+    async def items(ctx, n):
+        out = []
+        for i in range(n):
+            done = ctx.get_checkpoint(str(i))
+            if done is None:
+                attempts.append(i)
+                if i == 2 and len(attempts) == 3:
+                    raise RuntimeError("flaky")
+                done = i * 10
+                await ctx.save_checkpoint(str(i), done)
+            out.append(done)
+        return {"items": out}
+
+    dag = WorkflowDAG([Stage("items", items, inputs=("n",), outputs=("items",))])
+    with pytest.raises(RuntimeError):
+        asyncio.run(dag.run("job", {"n": 4}, store))
+    values = asyncio.run(dag.run("job", {"n": 4}, store))
+    assert values["items"] == [0, 10, 20, 30]
+    assert attempts == [0, 1, 2, 2, 3]
+
+
+def test_invalid_graphs_are_rejected():
+    async def noop(ctx, **kwargs):
+        return {}
+
+    with pytest.raises(ValueError):
+        WorkflowDAG([Stage("a", noop, inputs=("b_out",), outputs=("a_out",)),
+                     Stage("b", noop, inputs=("a_out",), outputs=("b_out",))])
+    with pytest.raises(StageFailed):
+        asyncio.run(WorkflowDAG([Stage("a", noop, inputs=("missing",))]).run("job", {}))
+
+
+def test_retry_rebuilds_only_the_item_that_failed():
+    store = MemoryStore()
+    built, persisted = [], []
+
+    async def slides(ctx, n):
+        out = []
+        for i in range(n):
+            done = ctx.get_checkpoint(str(i))
+            if done is None:
+                built.append(i)
+                # Slide 1 fails on the first run; the stage still finishes with the others, like build_slides
+                if i == 1 and built.count(1) == 1:
+                    continue
+                done = f"slide {i}"
+                await ctx.save_checkpoint(str(i), done)
+            out.append(done)
+        return {"slides": out}
+
+    async def persist(ctx, slides):
+        persisted.append(slides)
+        return {"deck": len(slides)}
+
+    dag = WorkflowDAG([
+        Stage("slides", slides, inputs=("n",), outputs=("slides",), checkpoint=False),
+        Stage("persist", persist, inputs=("slides",), outputs=("deck",)),
+    ])
+    assert asyncio.run(dag.run("job", {"n": 3}, store))["deck"] == 2
+    # The retry builds the missing slide only, and the deck is stored again with all of them
+    assert asyncio.run(dag.run("job", {"n": 3}, store))["deck"] == 3
+    assert built == [0, 1, 2, 1]
+    assert persisted[-1] == ["slide 0", "slide 1", "slide 2"]